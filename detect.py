@@ -1,8 +1,6 @@
 import functools
 import numpy as np
 
-print('detect values > 0.0')
-
 def arrayize(type):
     def decorator(func):
         def wrapper(*args, **kwargs):
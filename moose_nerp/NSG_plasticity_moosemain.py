@@ -82,6 +82,7 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
         util,
         standard_options,
         ttables,
+        profiling,
     )
     #from moose_nerp import d1opt as model
     #from moose_nerp import D1MatrixSample2 as model
@@ -194,6 +195,7 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
             param_sim.plotdt,
             param_sim.hsolve,
             model.param_cond.NAME_SOMA,
+            clock_dt=clocks.clock_dt(param_sim, net),
         )
     if model.synYN and (param_sim.plot_synapse or net.single):
         # overwrite plastab above, since it is empty
@@ -218,13 +220,21 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
     def run_simulation(injection_current, simtime):
         print(u"◢◤◢◤◢◤◢◤ injection_current = {} ◢◤◢◤◢◤◢◤".format(injection_current))
         pg.firstLevel = injection_current
-        moose.reinit()
-        moose.start(simtime, True)
+        if getattr(param_sim, 'warm_start', False):
+            from moose_nerp.prototypes import warm_start
+            with profiling.phase('warm_start'):
+                warm_start.run(model, simtime)
+        else:
+            with profiling.phase('reinit'):
+                moose.reinit()
+            with profiling.phase('run'):
+                moose.start(simtime, True)
 
     print('does outfile {} exist before sim: {}'.format(streamer.outfile,os.path.exists(streamer.outfile)))
     traces, names = [], []
     for inj in param_sim.injection_current:
         run_simulation(injection_current=inj, simtime=param_sim.simtime)
+    profiling.write_report()
     print('does outfile {} exist AFTER sim: {}'.format(streamer.outfile,os.path.exists(streamer.outfile)))
     #weights = [w.value for w in moose.wildcardFind("/##/plas##[TYPE=Function]")]
     #import matplotlib.pyplot as plt
@@ -239,25 +249,39 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
     #return weights
 
 def randomize_input_trains(timetable,ran=1, maxtime=2):
-    for tt in timetable.stimtab:
-        v = tt[0].vector # copies time table vector to v (doesn't reference it)
-        v = v[v<=maxtime] # Use only first trial, i.e. spike times less than 2
-        if ran:
-            diff = np.diff(v,prepend=0) # compute ISIs using diff
-            np.random.shuffle(diff) # Shuffle ISIs to randomize timing pattern
-            v = np.cumsum(diff) # create new spike train from shuffle differences
+    from moose_nerp.prototypes import spike_trains
+    # Use only first trial, i.e. spike times less than maxtime; shuffle ISIs of all trains at once to randomize timing pattern
+    if ran:
+        trains = spike_trains.shuffle_isis(timetable.trains, maxtime)
+    else:
+        trains = spike_trains.truncate(timetable.trains, maxtime)
+    for tt, v in zip(timetable.stimtab, trains):
         tt[0].vector = v # Replace timetable vector with new values
     ##import pdb;pdb.set_trace()
     return timetable
 
 
 
-def subprocess_main(function, corticalinput,kwds,time_limit):
+def subprocess_main(function, corticalinput,kwds,time_limit,cache_dir=None):
     print('enter subprocess_main')
     from multiprocessing import Process, Queue
     import time
+    target, args = function, (corticalinput,)
+    if cache_dir is not None:
+        #skip simulations whose streamer output is in the result cache (output file is restored)
+        from moose_nerp.prototypes import result_cache, spike_trains
+        cache = result_cache.ResultCache(cache_dir)
+        key = cache.key(function, (corticalinput,), kwds, modules=['moose_nerp.D1PatchSample5', 'moose_nerp.str_net'],
+                        input_files=spike_trains.train_files(corticalinput))
+        found, _ = cache.lookup(key)
+        if found:
+            print('found in cache', key)
+            return
+        outputs = 'testdata/plas_sim*_{}_glu{}_ran*_seed_{}.npy'.format(corticalinput, kwds.get('randomize', 1), kwds.get('seed', 42))
+        target, args = cache.call(function), ((key, (corticalinput,), kwds, outputs),)
+        kwds = {}
     # q = Queue()
-    p = Process(target=function, args=(corticalinput,), kwargs=kwds)
+    p = Process(target=target, args=args, kwargs=kwds)
     p.start()
     
     # result = q.get()
@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 
 def do_random_forest(X_train,y_train,X_test,y_test,n_est=100,feat=''):
     from sklearn.ensemble import RandomForestRegressor
@@ -208,6 +207,7 @@ def runClusterAnalysis(param_values, labels, num_features, class_labels,epoch):
     return feature_order[0:max_feat],predict_dict,train_test
     
 def cluster_analysis(y,X,adjX,numbins,weight_change_event_df,all_cor,epochs,num_events,cs,max_feat=2 ):
+    import pandas as pd
     import operator
     from sklearn.metrics import confusion_matrix
     from plas_sim_plots import plotPredictions
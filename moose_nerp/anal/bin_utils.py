@@ -0,0 +1,42 @@
+"""
+Vectorized binning of ragged spike trains, using searchsorted on sorted spike arrays
+instead of list comprehensions over spikes for each bin
+"""
+import numpy as np
+
+def sorted_spikes(trains):
+    '''all spikes of a list of spike trains as one sorted array'''
+    if len(trains)==0:
+        return np.zeros(0)
+    return np.sort(np.concatenate([np.asarray(st,dtype=float).ravel() for st in trains]))
+
+def bin_counts(spikes,bins):
+    '''number of spikes with bl<=spike<bh for each (bl,bh) in bins; spikes must be sorted.
+    bins may overlap'''
+    bins=np.asarray(bins,dtype=float).reshape(-1,2)
+    return np.searchsorted(spikes,bins[:,1],'left')-np.searchsorted(spikes,bins[:,0],'left')
+
+def isi_in_bins(neur_spikes,bins):
+    '''for each (bmin,bmax) in bins, the ISIs (neur_spikes[i+1]-neur_spikes[i])
+    of spikes with bmin<=neur_spikes[i]<bmax'''
+    neur_spikes=np.asarray(neur_spikes,dtype=float)
+    isis=np.diff(neur_spikes)
+    starts=neur_spikes[:-1]
+    if np.all(isis>=0):
+        bins=np.asarray(bins,dtype=float).reshape(-1,2)
+        lo=np.searchsorted(starts,bins[:,0],'left')
+        hi=np.searchsorted(starts,bins[:,1],'left')
+        return [isis[l:h] for l,h in zip(lo,hi)]
+    #unsorted spike train, use a mask per bin
+    return [isis[(starts>=bmin)&(starts<bmax)] for bmin,bmax in bins]
+
+def next_spike_latency(neurspikes,times,max_latency):
+    '''time from each of times to the next spike, nan if no spike within max_latency'''
+    neurspikes=np.sort(np.asarray(neurspikes,dtype=float))
+    times=np.asarray(times,dtype=float)
+    idx=np.searchsorted(neurspikes,times,'right')
+    next_spike=np.full(len(times),np.inf)
+    has_next=idx<len(neurspikes)
+    next_spike[has_next]=neurspikes[idx[has_next]]
+    within=next_spike<(times+max_latency)
+    return np.where(within,next_spike-times,np.nan)
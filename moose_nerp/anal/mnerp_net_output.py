@@ -1,25 +1,23 @@
 import numpy as np
 from scipy import fftpack, signal,stats
+import sta_utils
+import bin_utils
 #from synth_trains import sig_filter as filt  - look into this if want to use butterworth filer
 #
 def flatten(isiarray):
     return [item for sublist in isiarray for item in sublist]
 
 def calc_one_sta(spiketrain,window,vm_or_spikerate,dt):
-    samplesize=window[-1]-window[0]
-    numspikes=len(spiketrain)
-    sta_array=np.zeros((numspikes,samplesize))
-    for i,st in enumerate(spiketrain):
-        endpt=int(st/dt)+window[1]
-        if endpt<len(vm_or_spikerate) and st>0:
-            startpt=endpt-samplesize
-            if startpt<0:
-                sta_start=-startpt
-                startpt=0
-            else:
-                sta_start=0
-            sta_array[i,sta_start:]=vm_or_spikerate[startpt:endpt]
-    return np.mean(sta_array,axis=0)
+    #mean over spikes of vm_or_spikerate in window preceding each spike, see sta_utils
+    return sta_utils.calc_sta(spiketrain,window,vm_or_spikerate,dt)
+
+def load_output(fname,numbins,overlap,table_index=None,sta_start=0,sta_end=0):
+    #create network_output for one file, with spike rate and sta. Use with sta_utils.parallel_files
+    dat=network_output(fname,numbins,overlap,table_index)
+    dat.spikerate_func()
+    if len(dat.vmdat) and sta_end>sta_start:
+        dat.calc_sta(sta_start,sta_end)
+    return dat
 
 class network_output():
     def __init__(self,fname,numbins,overlap,table_index=None):
@@ -117,18 +115,15 @@ class network_output():
                 self.spike_rate_elph[ntype][i,:]=elph.statistics.instantaneous_rate(train,binsize*q.s,kernel=kernel).magnitude[:,0]
             self.spike_rate_mean[ntype]=np.mean(self.spike_rate_elph[ntype],axis=0)
             #Compare spike_rate_mean (from elephant) with spike_rate 
-            for bb,(bl,bh) in enumerate(ratebins):
-                self.spike_rate[ntype][bb]=len([st for st in  flatten(self.spiketime_dict[ntype])
-                                                if st>=bl and st<bh])/binsize/self.num_neurs[ntype]
+            all_spikes=bin_utils.sorted_spikes(self.spiketime_dict[ntype])
+            self.spike_rate[ntype]=bin_utils.bin_counts(all_spikes,ratebins)/binsize/self.num_neurs[ntype]
         #separate into pre,post,stim epochs?  Or separate function - only do that if stim
     
     def calc_sta(self,sta_start,sta_end):
         self.sta={}
         window=(int(sta_start/self.dt),int(sta_end/self.dt))
         for ntype in self.vmdat.keys():
-            sta_set=[]
-            for i,spiketrain in enumerate(self.spiketime_dict[ntype]):
-                sta_set.append(calc_one_sta(spiketrain,window,self.vmdat[ntype],self.dt)) #mean over spikes
+            sta_set=sta_utils.calc_sta_many(self.spiketime_dict[ntype],window,self.vmdat[ntype],self.dt) #mean over spikes
             self.sta[ntype]=np.mean(sta_set,axis=0) #mean over neurons
         self.sta_xvals=np.arange(sta_start,sta_end,self.dt)
         #net_anal:calculate mean and std over trials
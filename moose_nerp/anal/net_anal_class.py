@@ -1,8 +1,21 @@
 import numpy as np
 from scipy import fftpack, signal,stats
 from net_anal_utils import calc_mean_std, flatten
+import bin_utils
 #from synth_trains import sig_filter as filt  - look into this if want to use butterworth filer
 #
+def load_fileset(files,numbins,overlap,table_index=None,sta_start=0,sta_end=0,processes=None):
+    #read and analyze files in parallel, then combine into network_fileset
+    import mnerp_net_output as mno
+    import sta_utils
+    data=sta_utils.parallel_files(mno.load_output,files,numbins,overlap,table_index,sta_start,sta_end,processes=processes)
+    alldata=network_fileset(files,data[0].neurtypes)
+    for dat in data:
+        alldata.st_arrays(dat)
+        if len(dat.vmdat) and sta_end>sta_start:
+            alldata.sta_array(dat)
+    return data,alldata
+
 class network_fileset(): #set of files, same condition, different trials
     def __init__(self,fileset,neurtypes):
         self.fileset=fileset
@@ -73,12 +86,12 @@ class network_fileset(): #set of files, same condition, different trials
         self.isi_hist_std={neur:{} for neur in self.num_neurs.keys()}
         self.isihist_bins={neur:{} for neur in self.num_neurs.keys()}
         for neur in self.spiketimes.keys():
+            epochs=list(self.timebins[neur].keys())
+            epoch_bins=[(binlist[0][0],binlist[-1][1]) for binlist in self.timebins[neur].values()]
             for fil,spike_set in enumerate(self.spiketimes[neur]): #loop over files  
                 for neur_spikes in spike_set: #loop over neurons in file 
-                    for pre_post,binlist in self.timebins[neur].items():
-                        bmin=binlist[0][0]
-                        bmax=binlist[-1][1]
-                        self.isi_epoch[neur][pre_post][fil].append([neur_spikes[i+1]-st for i,st in enumerate(neur_spikes[0:-1]) if st>=bmin and st<bmax])
+                    for pre_post,isis in zip(epochs,bin_utils.isi_in_bins(neur_spikes,epoch_bins)):
+                        self.isi_epoch[neur][pre_post][fil].append(isis)
         for neur in self.isi_epoch.keys():
             mins=[np.min(flatten(isis)) for isiset in self.isi_epoch[neur].values() for isis in isiset] 
             maxs=[np.max(flatten(isis)) for isiset in self.isi_epoch[neur].values() for isis in isiset]
@@ -99,23 +112,20 @@ class network_fileset(): #set of files, same condition, different trials
         for spike_set in self.spiketimes[neurtype]: #loop over files
             for neur_spikes in spike_set: #loop over neurons in file
                 for pre_post,binlist in self.timebins[neurtype].items():
-                    for bmin,bmax in binlist:
-                        self.isi_time_epoch[pre_post][bmin].append([neur_spikes[i+1]-st for i,st in enumerate(neur_spikes[0:-1]) if st>=bmin and st<bmax])
+                    for (bmin,bmax),isis in zip(binlist,bin_utils.isi_in_bins(neur_spikes,binlist)):
+                        self.isi_time_epoch[pre_post][bmin].append(isis)
         
     def latency(self,neurtype):
         self.latency={epoch:np.zeros((len(self.pre_post_stim[neurtype][epoch]),len(self.spiketimes[neurtype]))) for epoch in self.pre_post_stim[neurtype].keys()}
         for setnum,spikeset in enumerate(self.spiketimes[neurtype]): #loop over files
             for pre_post in self.pre_post_stim[neurtype].keys(): 
                 isi=self.pre_post_stim[neurtype][pre_post][1]-self.pre_post_stim[neurtype][pre_post][0]
-                for i,time in enumerate(self.pre_post_stim[neurtype][pre_post]):
-                    next_spike=[]
-                    for neurspikes in spikeset:#could be more than one neuron of each neurtype
-                        ns=np.min(neurspikes[np.where(neurspikes>time)])
-                        next_spike.append((ns-time) if ns<(time+isi) else np.nan)
-                    if np.all(np.isnan(next_spike)):
-                        self.latency[pre_post][i,setnum]=np.nan
-                    else:
-                        self.latency[pre_post][i,setnum]=np.nanmean(next_spike)
+                stim_times=self.pre_post_stim[neurtype][pre_post]
+                #rows are neurons, could be more than one neuron of each neurtype; columns are stim times
+                next_spike=np.array([bin_utils.next_spike_latency(neurspikes,stim_times,isi) for neurspikes in spikeset]).reshape(-1,len(stim_times))
+                responded=~np.all(np.isnan(next_spike),axis=0)
+                self.latency[pre_post][:,setnum]=np.nan
+                self.latency[pre_post][responded,setnum]=np.nanmean(next_spike[:,responded],axis=0)
 
     def lat_isi_mean(self):
         self.lat_mean={}
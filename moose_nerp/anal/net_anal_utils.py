@@ -1,5 +1,6 @@
 import numpy as np
 from mnerp_net_output import calc_one_sta
+from sta_utils import calc_sta
 
 def flatten(isiarray):
     return [item for sublist in isiarray for item in sublist]
@@ -36,15 +37,18 @@ def sta_fire_freq(input_spike_rate,spike_list,sta_start,sta_end,xbins,weights=No
     window=(int(sta_start/binsize),int(sta_end/binsize))
     if weights is None:
         weights={syn:-1 if syn.startswith('gaba') else 1 for syn in input_spike_rate.keys()}
-    weighted_input_spike_rate=[np.zeros(len(xbins)) for trial in range(len(spike_list))]
-    prespike_sta={syn:[] for syn in list(input_spike_rate.keys())+['sum']}
+    syns=list(input_spike_rate.keys())
+    syn_weights=np.array([weights[syn] for syn in syns])
+    prespike_sta={syn:[] for syn in syns+['sum']}
     for trial in range(len(spike_list)):
         spike_times=spike_list[trial][0] #THIS ASSUMES ONLY A SINGLE NEURON - NEED TO FIX WITH NETWORK SIMULATIONS
-        for syn in input_spike_rate.keys():
-            weighted_input_spike_rate[trial]+=weights[syn]*input_spike_rate[syn][trial] 
-            prespike_sta[syn].append(calc_one_sta(spike_times,window,input_spike_rate[syn][trial],binsize))
-        prespike_sta['sum'].append(calc_one_sta(spike_times,window,weighted_input_spike_rate[trial],binsize))
-        xvals=np.arange(sta_start,sta_end,binsize)
+        #one gather for all synapse types plus the weighted sum
+        rates=np.array([input_spike_rate[syn][trial] for syn in syns])
+        rates=np.vstack((rates,np.dot(syn_weights,rates)))
+        trial_sta=calc_sta(spike_times,window,rates,binsize)
+        for syn,sta in zip(syns+['sum'],trial_sta):
+            prespike_sta[syn].append(sta)
+    xvals=np.arange(sta_start,sta_end,binsize)
     prespike_sta_mean={};prespike_sta_std={}
     for key in prespike_sta.keys():
         prespike_sta_mean[key],prespike_sta_std[key]=calc_mean_std(prespike_sta[key],axisnum=0)
@@ -66,37 +70,25 @@ def choose_xvals(xvals):
     return x
 
 def cross_corr(pre_spikes,post_spikes,t_end,binsize):
-    import elephant
-    from neo.core import AnalogSignal,SpikeTrain
-    from elephant.conversion import BinnedSpikeTrain
-    import quantities as q
-    #
-    def elph_train(spike_set,t_end,binsize):
+    #shuffle corrected mean cross-correlogram between pre (input) and post spike trains of the same trial
+    #all trials are binned once and correlograms computed together by FFT, see synchrony.py
+    import synchrony as sync
+    def merge_trains(spike_set):
         if isinstance(spike_set, list):
-            spikes = np.sort(np.concatenate([st for st in spike_set])) #1D array, spikes of all input synapses
-        else:
-            spikes=spike_set
-        train=SpikeTrain(spikes*q.s,t_stop=np.ceil(spikes[-1])*q.s)
-        return BinnedSpikeTrain(train,t_start=0*q.s,t_stop=t_end*q.s,binsize=binsize*q.s)
+            return np.concatenate([np.ravel(st) for st in spike_set]) #1D array, spikes of all input synapses
+        return spike_set
     #
     numtrials=len(post_spikes)
-    cc_hist={k:[[] for t in range(numtrials)] for k in pre_spikes[0].keys()}
-    for trial_in in range(len(pre_spikes)): 
-        for pre,spike_set in pre_spikes[trial_in].items():
-            in_train=elph_train(spike_set,t_end,binsize)
-            for trial_out in range(numtrials):
-                out_train=elph_train(post_spikes[trial_out],t_end,binsize)
-                #print('trial_in,trial_out', trial_in, trial_out)
-                cc_hist[pre][trial_in].append(elephant.spike_train_correlation.cross_correlation_histogram(in_train,out_train)[0].magnitude[:,0])
+    out_trains=sync.bin_trains([merge_trains(post_spikes[t]) for t in range(numtrials)],t_end,binsize)
     mean_cc={};mean_cc_shuffle={};cc_shuffle_corrected={}
-    for pre in cc_hist.keys():
-        #shuffle corrected mean cross-correlogram
-        cc_same=[cc_hist[pre][a][a] for a in range(numtrials)]
+    for pre in pre_spikes[0].keys():
+        in_trains=sync.bin_trains([merge_trains(pre_spikes[t][pre]) for t in range(numtrials)],t_end,binsize)
+        cc_same=sync.cross_correlograms(in_trains,out_trains)
         mean_cc[pre]=np.mean(cc_same,axis=0)
-        cc_diff=[cc_hist[pre][a][b] for a in range(numtrials) for b in range(numtrials) if b != a ]
-        mean_cc_shuffle[pre]=np.mean(cc_diff,axis=0)
+        #mean over all pairs of different trials, computed analytically
+        mean_cc_shuffle[pre]=sync.shift_predictor(in_trains,out_trains,same_trial_ccg=cc_same)
         cc_shuffle_corrected[pre]=mean_cc[pre]-mean_cc_shuffle[pre]
-    xbins=elephant.spike_train_correlation.cross_correlation_histogram(in_train,out_train)[0].times
+    xbins=sync.lags(out_trains.shape[1],binsize)
     return mean_cc,mean_cc_shuffle,cc_shuffle_corrected,xbins
 ############
 def write_data_header(fname,header,outputdata):
@@ -1,9 +1,7 @@
 import numpy as np
-import neo
-import elephant
-from quantities import Hz,s
-import pandas as pd
 from scipy.signal import find_peaks
+#pandas, neo, elephant and quantities are imported in the functions that use them,
+#so that pool workers importing this module do not load them
 
 #naming convention for calcium compartments from spine names
 #may need to be changed if table names change in moose_nerp
@@ -56,102 +54,159 @@ def dW(data,syn,dt,spiketimes,tr,inst_weightchange,peaktimes,nochangedW):
     iwc_cols=['trial','synapse','dW','dWt','post_spike_dt','pre_spike_dt','isi','pre_spike2_dt','pre_interval','isi2']
     return inst_weightchange,iwc_cols
 
-def weight_change_events_spikes_calcium(files,params,warnings):
-    #### This loops over every data file ######
-    from elephant import kernels
-    neighbors=params['neighbors']
+EXTRACT_PARAMS=['samp_rate','simtime','ITI','ca_downsamp','nochangedW'] #params that affect extract_file
+
+def extract_file(trial,f,params,warnings):
+    import pandas as pd
+    #### extract weight changes, spikes and calcium from one data file ######
+    samp_rate=params['samp_rate']
+    simtime=params['simtime']
+    weight_at_times = np.arange(0.,simtime,params['ITI']) #first trial starts at time=0.0
+    weight_at_index = (weight_at_times*samp_rate).astype(np.int64)
+    weightchangelist=[]; dframelist = []
+    inst_weightchange=[];iwc_cols=None
+    peaktimes_list=[];train_index=[];ca_arrays=[];ca_index=[]
+    missing=0
+    d= np.load(f,mmap_mode='r')
+    names=set(d.dtype.names) #look up names in set rather than scanning list
+    print('analyzing',trial)
+    index_for_weight = (np.abs(d['time'] - 2)).argmin() #1st trial ending weight = weight just prior to next trial; 2 = ITI? 
+    #plas names may differ for each file if using different seeds
+    all_plas_names=[n for n in d.dtype.names if 'plas' in n]
+    t1weight = [d[n][index_for_weight] for n in all_plas_names]
+    t1weight_dist={'mean':np.mean(t1weight),'std':np.std(t1weight),'no change':t1weight.count(1.0),'files':trial}
+    #extract post-syn spikes
+    somaVm=d['/data/VmD1_0']
+    spikes,_=find_peaks(somaVm,height=0.0,distance=200) #index of time of post-syn spikes
+    spiketimes= spikes*(1.0/samp_rate)
+    plas_names=[nm for nm in all_plas_names if 'head' in nm] #includes synaptic inputs directly onto dendrites
+    extern_names=[nm for nm in plas_names if 'extern1' in nm]
+    input_peaks={} #peaks of presynaptic input, used for both spikecount and trains
+    def find_input_peaks(name):
+        if name not in input_peaks:
+            input_peaks[name]=find_peaks(d[name])[0]
+        return input_peaks[name]
+    for n in plas_names:
+        endweight = d[n][-1]
+        if '_to_' in n:
+            spine = n.split('_to_')[-1].replace('-','_').strip('plas')
+            stim=True
+            spikecount = len(find_input_peaks(n.rstrip('plas')))
+        elif 'ampa' in n:
+            spine = '_'.join(n.split('/')[-1].split('_')[1:-1])
+            stim=False
+            spikecount = 0
+        weight_change_variance = np.var(np.diff(d[n]))
+        spinedist = np.nan
+        dframelist.append((spine,endweight,trial,spinedist,stim,spikecount,weight_change_variance))
+    for jj,syn in enumerate(extern_names):        
+        weightchange=np.diff(d[syn][weight_at_index])
+        startingweight = d[syn][weight_at_index]
+        for k,w in enumerate(weightchange):
+            weightchangelist.append((trial,syn,weight_at_times[k+1],startingweight[k],w))                
+        peaktimes = d['time'][find_input_peaks(syn.rpartition('plas')[0])]
+        peaktimes_list.append(np.array(peaktimes))
+        train_index.append((trial,syn))
+        #extract calcium traces.  Must edit to match naming convention
+        shell=get_shellname(syn)
+        if shell in names:
+            ca_index.append((trial,shell))
+            ca_arrays.append(np.array(d[shell][::params['ca_downsamp']]))
+        else:
+            missing+=1
+            if missing<warnings:
+                print(missing,syn,shell,' NOT IN FILE',trial)
+        inst_weightchange,iwc_cols=dW(d,syn,(1.0/samp_rate),spiketimes,trial,inst_weightchange,peaktimes,params['nochangedW'])
+        if missing>warnings-1:
+            print(missing, 'extern_names have no calcium conc')
+    df=pd.DataFrame(dframelist,columns = ['spine','endweight','trial','spinedist','stim','spikecount','weight_change_variance'])
+    wce_df=pd.DataFrame(weightchangelist,columns = ['trial','synapse','time','startingweight','weightchange'])
+    return df,wce_df,peaktimes_list,train_index,ca_arrays,ca_index,t1weight_dist,inst_weightchange,iwc_cols
+
+def cached_extract(trial,f,params,warnings):
+    #extract_file results are cached, keyed by file name, modification time and size and the params used by extract_file
+    #changing other (e.g. plotting) params does not require extraction to be repeated
+    import os,pickle,hashlib
+    cache_dir=params.get('cache_dir','plas_anal_cache')
+    stat=os.stat(f)
+    key=repr((os.path.abspath(f),stat.st_mtime,stat.st_size,trial,[params[k] for k in EXTRACT_PARAMS]))
+    cache_file=os.path.join(cache_dir,hashlib.sha1(key.encode()).hexdigest()+'.pickle')
+    if os.path.exists(cache_file):
+        with open(cache_file,'rb') as cf:
+            return pickle.load(cf)
+    result=extract_file(trial,f,params,warnings)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with open(cache_file,'wb') as cf:
+        pickle.dump(result,cf)
+    return result
+
+def _cached_extract_star(args):
+    return cached_extract(*args)
+
+def kernel_rate(spiketrains,simtime,samp_rate,sigma=100e-3,down_samp=1,cutoff=5.0,batch=64):
+    #Gaussian kernel firing rate of many spike trains (arrays of spike times, sec), as elephant.statistics.instantaneous_rate.
+    #Spikes are binned at samp_rate and convolved with the kernel by FFT, all trains of a batch at once
+    from scipy.signal import fftconvolve
+    dt=1.0/samp_rate
+    numpoints=int(round(simtime*samp_rate))
+    t_kernel=np.arange(-int(cutoff*sigma/dt),int(cutoff*sigma/dt)+1)*dt
+    kernel=np.exp(-0.5*(t_kernel/sigma)**2)/(np.sqrt(2*np.pi)*sigma)
+    rate=np.zeros((len(spiketrains),len(range(0,numpoints,down_samp))))
+    for start in range(0,len(spiketrains),batch):
+        trains=spiketrains[start:start+batch]
+        counts=np.zeros((len(trains),numpoints))
+        for row,st in enumerate(trains):
+            idx=(np.asarray(st,dtype=float)*samp_rate).astype(int)
+            np.add.at(counts[row],idx[(idx>=0)&(idx<numpoints)],1)
+        rate[start:start+len(trains)]=fftconvolve(counts,kernel[None,:],mode='same',axes=1)[:,::down_samp]
+    return rate
+
+def weight_change_events_spikes_calcium(files,params,warnings,processes=None):
+    #### Extract data from every data file in a process pool (map step), results are cached ######
+    from multiprocessing import Pool
+    import pandas as pd
+    import neo
+    from quantities import Hz,s
     bins_per_sec=params['bins_per_sec']
     samp_rate=params['samp_rate']
     simtime=params['simtime']
-    length_of_firing_rate_vector=params['length_of_firing_rate_vector']
-    ca_downsamp=params['ca_downsamp']
-    ITI=params['ITI']
     down_samp=int(samp_rate/bins_per_sec)
-    
+    jobs=[(trial,f,params,warnings) for trial,f in files.items()]
+    if processes==1 or len(jobs)<2:
+        results=[_cached_extract_star(job) for job in jobs]
+    else:
+        with Pool(processes) as pool:
+            results=pool.map(_cached_extract_star,jobs)
+    #### combine results in order of files
     binned_trains_index=[]
-    trains = []
+    trains = [];peaktimes_list=[]
     all_ca_array=[];ca_index=[]
-
-    # dt = 0.1e-3 (.1 ms) so a stepsize of 100 data points is equivalent to 10 ms, step size of 1000 datapoints = 100 ms
     t1weight_dist={'mean':[],'std':[],'no change':[],'files':[]}
-    # ## Detect weight change events
-    #stepsize = 1000
-    weight_at_times = np.arange(0.,simtime,ITI) #first trial starts at time=0.0
-    weight_at_index = (weight_at_times*samp_rate).astype(np.int64)
     df=[];wce_df=[]
-    inst_weightchange=[]
-    for i,(trial,f) in enumerate(files.items()):  
-        weightchangelist=[]; dframelist = []
-        missing=0
-        d= np.load(f,mmap_mode='r')  
-        print(i, 'analyzing',trial)
-        index_for_weight = (np.abs(d['time'] - 2)).argmin() #1st trial ending weight = weight just prior to next trial; 2 = ITI? 
-        t1weight = [d[n][index_for_weight] for n in d.dtype.names if 'plas' in n]
-        t1weight_dist['mean'].append(np.mean(t1weight))
-        t1weight_dist['std'].append(np.std(t1weight))
-        t1weight_dist['no change'].append(t1weight.count(1.0))
-        t1weight_dist['files'].append(trial)
-        #extract post-syn spikes
-        somaVm=d['/data/VmD1_0']
-        spikes,_=find_peaks(somaVm,height=0.0,distance=200) #index of time of post-syn spikes
-        spiketimes= spikes*(1.0/samp_rate)
-        #plas_names=[nm for nm in d.dtype.names if 'plas' in nm ] #includes synaptic inputs directly onto dendrites
-        plas_names=[nm for nm in d.dtype.names if 'plas' in nm and 'head' in nm] #plas names may differ for each file if using different seeds
-        extern_names=[nm for nm in plas_names if 'extern1' in nm]
-        for n in plas_names:
-            #print(n,d[n][-1])
-            endweight = d[n][-1]
-            if '_to_' in n:
-                spine = n.split('_to_')[-1].replace('-','_').strip('plas')
-                stim=True
-                spikecount = len(find_peaks(d[n.rstrip('plas')])[0])
-            elif 'ampa' in n:
-                spine = '_'.join(n.split('/')[-1].split('_')[1:-1])
-                stim=False
-                spikecount = 0
-            weight_change_variance = np.var(np.diff(d[n]))
-            spinedist = np.nan#[v for k2,v in spinedistdict.items() if spine in '_'.join(k2.split('/')[-2:]).replace('[0]','')][0]
-            #print(n,spine,endweight,stimvariability,spinedist)
-            dframelist.append((spine,endweight,trial,spinedist,stim,spikecount,weight_change_variance))
-        for jj,syn in enumerate(extern_names):        
-            weightchange=np.diff(d[syn][weight_at_index])
-            startingweight = d[syn][weight_at_index]
-            for k,w in enumerate(weightchange):
-                weightchangelist.append((trial,syn,weight_at_times[k+1],startingweight[k],w))                
-            peaks,_ = find_peaks(d[syn.rpartition('plas')[0]]) 
-            peaktimes = d['time'][peaks]
-            ### create SpikeTrain for every trial/synapse
-            train = neo.SpikeTrain(peaktimes,t_stop=simtime*s,units=s)
-            trains.append(train)
-            binned_trains_index.append((trial,syn))
-            #extract calcium traces.  Must edit to match naming convention
-            shell=get_shellname(syn)
-            if shell in d.dtype.names:
-                ca_index.append((trial,shell))
-                #jj=i*len(ca_names)+j
-                all_ca_array.append(d[shell][::ca_downsamp])
-            else:
-                missing+=1
-                if missing<warnings:
-                    print(missing,syn,shell,' NOT IN FILE',trial)
-            inst_weightchange,iwc_cols=dW(d,syn,(1.0/samp_rate),spiketimes,trial,inst_weightchange,peaktimes,params['nochangedW'])
-            if missing>warnings-1:
-                print(missing, 'extern_names have no calcium conc')
-        df.append(pd.DataFrame(dframelist,columns = ['spine','endweight','trial','spinedist','stim','spikecount','weight_change_variance']))
-        wce_df.append(pd.DataFrame(weightchangelist,columns = ['trial','synapse','time','startingweight','weightchange']))
+    inst_weightchange=[];iwc_cols=['trial','synapse','dW','dWt','post_spike_dt','pre_spike_dt','isi','pre_spike2_dt','pre_interval','isi2']
+    for (fdf,fwce,fpeaks,ftrain_index,fca,fca_index,ft1,fiwc,_) in results:
+        df.append(fdf);wce_df.append(fwce)
+        peaktimes_list.extend(fpeaks)
+        binned_trains_index.extend(ftrain_index)
+        all_ca_array.extend(fca);ca_index.extend(fca_index)
+        for k in t1weight_dist.keys():
+            t1weight_dist[k].append(ft1[k])
+        inst_weightchange.extend(fiwc)
+    ### create SpikeTrain for every trial/synapse
+    for peaktimes in peaktimes_list:
+        train = neo.SpikeTrain(peaktimes,t_stop=simtime*s,units=s)
+        train.sampling_rate=samp_rate*Hz
+        trains.append(train)
     alldf = pd.concat(df).reset_index()
     weight_change_event_df = pd.concat(wce_df).reset_index()
     inst_weight_change_df=pd.DataFrame(inst_weightchange,columns=iwc_cols)
-    ### instantaneous weight array - created from spikeTrains
-    kernel = kernels.GaussianKernel(sigma=100e-3*s)
-    numtrains=len(trains) #use extern_names
-    inst_rate_array = np.zeros((numtrains,int(simtime*bins_per_sec)))
-    for jj,train in enumerate(trains):
-        train.sampling_rate=samp_rate*Hz
-        inst_rate_array[jj,:] = elephant.statistics.instantaneous_rate(train,train.sampling_period,kernel=kernel)[::down_samp,0].flatten()
+    ### instantaneous firing rate array - created from spike times of all trains at once
+    inst_rate_array = kernel_rate(peaktimes_list,simtime,samp_rate,sigma=100e-3,down_samp=down_samp)[:,0:int(simtime*bins_per_sec)]
     return alldf,weight_change_event_df,inst_rate_array,trains,binned_trains_index,np.array(all_ca_array),ca_index,t1weight_dist,inst_weight_change_df
 
 def add_spine_soma_dist(wce_df,df, spine_soma_dist_file,warnings=5):
+    import pandas as pd
     if isinstance(spine_soma_dist_file,pd.core.series.Series):
         spine_soma_dist=spine_soma_dist_file
     else:
@@ -189,7 +244,10 @@ def add_spine_soma_dist(wce_df,df, spine_soma_dist_file,warnings=5):
     return wce_df,df
 
 def weight_changed_aligned_array(params,weight_change_event_df,ca_index,sorted_other_stim_spines,binned_trains_index,ca_trace_array,sp2sp,inst_rate_array,trains):
+    import neo
+    import elephant.statistics
     from elephant import kernels
+    from quantities import s
     cabins_per_sec=int(params['samp_rate']/params['ca_downsamp'])
     weight_change_alligned_array = np.zeros((params['neighbors'],params['length_of_firing_rate_vector'],len(weight_change_event_df.index)))
     weight_change_weighted_array = np.zeros((params['neighbors'],params['length_of_firing_rate_vector'],len(weight_change_event_df.index)))
@@ -266,6 +324,7 @@ def mean_std(weight_change_alligned_array,indices):
 
 def add_cluster_info(wce_df,df, inst_df,cluster_file):
     import pickle
+    import pandas as pd
     f=open(cluster_file,'rb')
     mydata=pickle.load(f)
     clusterlist=[[str(m['seed']),m['ClusteringParams']['cluster_length'],m['ClusteringParams']['n_spines_per_cluster']] for m in mydata]
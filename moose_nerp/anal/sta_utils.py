@@ -0,0 +1,77 @@
+"""
+Spike triggered averages computed by a vectorized gather of strided windows.
+Same results as the original per-spike loop in calc_one_sta:
+  window ends at int(spiketime/dt)+window[1] and has window[1]-window[0] points
+  windows running past the beginning of the signal are zero padded
+  spikes at t<=0 or whose window runs past the end contribute zeros
+  average is over all spikes, including those contributing zeros
+parallel_files applies an analysis function to a set of files using a process pool
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+def _windows(signal,samplesize):
+    '''2D read-only view of signal: row j holds the samplesize points ending at j-1,
+    zero padded at the beginning'''
+    signal=np.asarray(signal,dtype=float)
+    padded=np.concatenate((np.zeros(signal.shape[:-1]+(samplesize,)),signal),axis=-1)
+    nrows=padded.shape[-1]-samplesize+1
+    shape=padded.shape[:-1]+(nrows,samplesize)
+    strides=padded.strides+(padded.strides[-1],)
+    return as_strided(padded,shape=shape,strides=strides,writeable=False)
+
+def _endpoints(spikes,window,dt,length):
+    spikes=np.asarray(spikes,dtype=float)
+    endpt=(spikes/dt).astype(int)+window[1]
+    valid=(endpt<length)&(endpt>=0)&(spikes>0)
+    return endpt,valid
+
+def sta_sum(spiketrain,window,signal,dt):
+    '''sum of windows and number of spikes; signal can be 1D or 2D (multiple signals, same time base)'''
+    samplesize=window[-1]-window[0]
+    signal=np.asarray(signal,dtype=float)
+    endpt,valid=_endpoints(spiketrain,window,dt,signal.shape[-1])
+    total=_windows(signal,samplesize)[...,endpt[valid],:].sum(axis=-2)
+    return total,len(endpt)
+
+def calc_sta(spiketrain,window,signal,dt):
+    '''spike triggered average of signal (1D or stack of signals) for one spike train'''
+    total,numspikes=sta_sum(spiketrain,window,signal,dt)
+    if numspikes==0:
+        return np.full(total.shape,np.nan)
+    return total/numspikes
+
+def calc_sta_many(spiketrains,window,signal,dt):
+    '''spike triggered average of one signal for each of many spike trains, one gather for all trains.
+    Returns array of shape (num trains, window size); trains with no spikes are nan'''
+    samplesize=window[-1]-window[0]
+    signal=np.asarray(signal,dtype=float)
+    counts=np.array([len(st) for st in spiketrains])
+    result=np.full((len(spiketrains),samplesize),np.nan)
+    if counts.sum()==0:
+        return result
+    spikes=np.concatenate([np.asarray(st,dtype=float).ravel() for st in spiketrains])
+    train_id=np.repeat(np.arange(len(spiketrains)),counts)
+    endpt,valid=_endpoints(spikes,window,dt,len(signal))
+    sums=np.zeros((len(spiketrains),samplesize))
+    np.add.at(sums,train_id[valid],_windows(signal,samplesize)[endpt[valid]])
+    nonzero=counts>0
+    result[nonzero]=sums[nonzero]/counts[nonzero,None]
+    return result
+
+def parallel_files(func,files,*args,processes=None):
+    '''apply func(fname,*args) to each file using a process pool; returns list in order of files.
+    func must be a module level function so that it can be pickled'''
+    if processes==1 or len(files)<2:
+        return [func(f,*args) for f in files]
+    from multiprocessing import Pool
+    with Pool(processes) as pool:
+        return pool.map(_FileCall(func,args),files)
+
+class _FileCall():
+    #picklable replacement for lambda f: func(f,*args)
+    def __init__(self,func,args):
+        self.func=func
+        self.args=args
+    def __call__(self,fname):
+        return self.func(fname,*self.args)
@@ -0,0 +1,86 @@
+"""
+Population synchrony measures computed in batch.
+All spike trains are binned once into a sparse matrix (rows=trains, columns=time bins);
+cross-correlograms and spectra are computed for all rows at once with FFTs.
+Shuffle (shift predictor) and jitter corrections are computed analytically
+from the correlograms instead of by reshuffling or resimulating.
+
+Correlogram convention, same as elephant.cross_correlation_histogram:
+ccg[k] = sum_t x[t]*y[t+k], so positive lags mean y fires after x.
+"""
+import numpy as np
+from scipy import sparse, fft
+
+def bin_trains(trains,t_end,binsize):
+    '''sparse (num trains x num bins) matrix of spike counts, bins start at 0'''
+    numbins=int(np.round(t_end/binsize))
+    rows=[];cols=[]
+    for i,st in enumerate(trains):
+        idx=np.floor(np.asarray(st,dtype=float).ravel()/binsize).astype(int)
+        idx=idx[(idx>=0)&(idx<numbins)]
+        rows.append(np.full(len(idx),i));cols.append(idx)
+    rows=np.concatenate(rows) if len(rows) else np.zeros(0,dtype=int)
+    cols=np.concatenate(cols) if len(cols) else np.zeros(0,dtype=int)
+    return sparse.csr_matrix((np.ones(len(rows)),(rows,cols)),shape=(len(trains),numbins))
+
+def _dense(binned):
+    return binned.toarray() if sparse.issparse(binned) else np.atleast_2d(np.asarray(binned,dtype=float))
+
+def lags(numbins,binsize,maxlag=None):
+    '''lag times (sec) of correlograms'''
+    if maxlag is None:
+        maxlag=numbins-1
+    return np.arange(-maxlag,maxlag+1)*binsize
+
+def cross_correlograms(x,y,maxlag=None):
+    '''correlogram of row i of x with row i of y, for all rows at once.
+    x and y are binned trains (sparse or dense) with same shape.
+    Returns (num rows x 2*maxlag+1) array, lags from -maxlag to maxlag bins'''
+    x=_dense(x);y=_dense(y)
+    numbins=x.shape[-1]
+    if maxlag is None:
+        maxlag=numbins-1
+    nfft=fft.next_fast_len(2*numbins-1,real=True)
+    cc=fft.irfft(np.conj(fft.rfft(x,nfft))*fft.rfft(y,nfft),nfft)
+    return np.concatenate((cc[:,nfft-maxlag:],cc[:,:maxlag+1]),axis=1)
+
+def shift_predictor(x,y,maxlag=None,same_trial_ccg=None):
+    '''mean correlogram of x from trial a with y from trial b, over all a != b (shuffle predictor).
+    Uses linearity of the correlogram instead of computing n*(n-1) correlograms:
+    sum_(a!=b) ccg(x_a,y_b) = ccg(sum_a x_a,sum_b y_b) - sum_a ccg(x_a,y_a)'''
+    x=_dense(x);y=_dense(y)
+    numtrials=x.shape[0]
+    if same_trial_ccg is None:
+        same_trial_ccg=cross_correlograms(x,y,maxlag)
+    total=cross_correlograms(x.sum(axis=0,keepdims=True),y.sum(axis=0,keepdims=True),maxlag)[0]
+    return (total-same_trial_ccg.sum(axis=0))/(numtrials*(numtrials-1))
+
+def jitter_predictor(ccg,jitter_bins):
+    '''expected correlogram when spikes of one train are jittered uniformly by +/- jitter_bins:
+    the correlogram convolved with a box kernel'''
+    kernel=np.ones(2*jitter_bins+1)/(2*jitter_bins+1)
+    return np.array([np.convolve(cc,kernel,mode='same') for cc in np.atleast_2d(ccg)]).reshape(np.shape(ccg))
+
+def corrcoef(binned):
+    '''matrix of pearson correlation coefficients between all pairs of binned trains,
+    computed from the sparse matrix without forming dense arrays'''
+    binned=sparse.csr_matrix(binned)
+    numbins=binned.shape[1]
+    mean=np.asarray(binned.mean(axis=1)).ravel()
+    cov=np.asarray((binned@binned.T).todense())/numbins-np.outer(mean,mean)
+    std=np.sqrt(np.diag(cov))
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return cov/np.outer(std,std)
+
+def population_spectrum(binned,binsize,maxfreq=None):
+    '''power spectra of binned trains: returns frequencies, mean of individual train spectra,
+    and spectrum of the population (summed) activity'''
+    x=_dense(binned)
+    x=x-x.mean(axis=1,keepdims=True)
+    freqs=np.fft.rfftfreq(x.shape[1],binsize)
+    psd=np.abs(fft.rfft(x,axis=1))**2
+    pop_psd=np.abs(fft.rfft(x.sum(axis=0)))**2
+    if maxfreq is not None:
+        keep=freqs<=maxfreq
+        freqs,psd,pop_psd=freqs[keep],psd[:,keep],pop_psd[keep]
+    return freqs,psd.mean(axis=0),pop_psd
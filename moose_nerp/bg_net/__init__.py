@@ -5,9 +5,11 @@ from .param_net import (connect_dict,
                         change_prob,
                         mindelay,
                         cond_vel,
+                        clock_dt,
                         merge_connect,
                         ttable_replace,
                         fname,
+                        ttable_files,
                         feedback,
                         add_connect,
                         change_FSI,
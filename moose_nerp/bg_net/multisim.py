@@ -1,7 +1,48 @@
 from __future__ import print_function, division
 
-def moose_main(p):
+### By importing network modules, no need to repeat all the information in param_net.py
+NET_MODULES=['moose_nerp.ep_net','moose_nerp.gp_net', 'moose_nerp.spn1_net']
+#slot summaries of the neuron prototypes, written by the first trial, used by check_network
+SLOT_SUMMARY_FILE='bg_net/output/slot_summary.json'
+
+def trial_connections(p):
+    '''connections of the network of one trial, without changing those of bg_net;
+    sets the time table files of bg_net.param_net used by the trial'''
+    stop_signal,freqCtx,freqStn,pulsedur,rampdur,fb_npas,fb_lhx=p[:7]
+    import copy
+    import types
+    from moose_nerp import bg_net as net
+    for tt,filename in net.ttable_files(stop_signal,freqCtx,freqStn,pulsedur,rampdur).items():
+        getattr(net.param_net,tt).filename=filename
+    connect_dict,change_prob,connect_delete=copy.deepcopy((net.connect_dict,net.change_prob,net.connect_delete))
+    if stop_signal: #add in second "pulse" time table, change postyn fraction for the log normal inpput
+        connect_dict,change_prob=net.add_connect(connect_dict,change_prob,freqStn)
+    connect_dict=net.feedback(connect_dict,fb_npas,fb_lhx)
+    connect_delete=net.change_FSI(connect_delete,net.p['FSI_input'])
+    return types.SimpleNamespace(connect_dict=connect_dict,change_prob=change_prob,connect_delete=connect_delete,
+                                 change_weight=net.change_weight,ttable_replace=net.ttable_replace,
+                                 merge_connect=net.merge_connect)
+
+def check_network(p,summary_file=SLOT_SUMMARY_FILE):
+    '''raise ValueError if net_planner predicts that the network of parameters p cannot be built as
+    specified (synapse shortage, missing or too small time table files).  Not checked until the
+    first trial has written the slot summaries'''
+    import os
+    from moose_nerp.prototypes import net_planner
+    if not os.path.exists(summary_file):
+        print('no slot summaries in',summary_file,'network not checked')
+        return
+    summaries=net_planner.read_slot_summaries(summary_file)
+    netparams=net_planner.combined_network(trial_connections(p),NET_MODULES)
+    ok,problems=net_planner.feasible(netparams,summaries)
+    if not ok:
+        raise ValueError('infeasible network for {}: {}'.format(p[:-1],'; '.join(problems)))
+
+def build_network(p,seed=None):
+    '''create neurons, populations, connections and stimulation of one trial, without output
+    tables or clocks; used by moose_main and by partition.run (each partition builds the network)'''
     stop_signal,freqCtx,freqStn,pulsedur,rampdur,fb_npas,fb_lhx,FSI_input,simtime,trial=p
+    import os
     import numpy as np
     import moose
     import importlib
@@ -23,37 +64,23 @@ def moose_main(p):
     #output file names and time table inputs depend on input parameters
     net.confile,net.outfile=net.fname(stop_signal,freqCtx,freqStn,pulsedur,rampdur,fb_npas,fb_lhx,FSI_input)
     net.outfile=net.outfile+'t'+str(trial)
-    if stop_signal: #regardless, STN2000_lognorm_freq28.0.npz is used
+    trial_net=trial_connections(p)
+    if stop_signal:
         print('if stop signal',stop_signal,'param_net',net.param_net.tt_Ctx.filename,'fname',net.outfile)
-        net.param_net.tt_Ctx.filename='bg_net/Ctx10000_ramp_freq7.0_'+freqCtx+'dur'+str(rampdur)
-        net.param_net.tt_STNp.filename='bg_net/STN500_pulse_freq1.0_'+freqStn+'dur'+str(pulsedur)
-    else:
-        net.param_net.tt_Ctx.filename='bg_net/Ctx10000_osc_freq'+freqCtx+'_osc0.7'
-   
-    if stop_signal: #add in second "pulse" time table, change postyn fraction for the log normal inpput
-        net.connect_dict,net.change_prob=net.add_connect(net.connect_dict,net.change_prob,freqStn) 
-    
-    net.connect_dict=net.feedback(net.connect_dict,fb_npas,fb_lhx)
-    net.connect_delete=net.change_FSI(net.connect_delete,net.p['FSI_input'])
+    net.connect_dict,net.change_prob,net.connect_delete=trial_net.connect_dict,trial_net.change_prob,trial_net.connect_delete
+    if not os.path.exists(SLOT_SUMMARY_FILE):
+        net.slot_summary_file=SLOT_SUMMARY_FILE
 
-    np.random.seed()
+    #seed=None gives different random connections and inputs each trial; fixed seed for benchmarks
+    np.random.seed(seed)
+    if seed is not None:
+        moose.seed(seed)
     #names of additional neuron modules to import
     neuron_modules=['ep_1comp','proto154_1compNoCal','Npas2005_1compNoCal','arky140_1compNoCal','FSI01Aug2014']
 
-    ### By importing network modules, no need to repeat all the information in param_net.py
-    net_modules=['moose_nerp.ep_net','moose_nerp.gp_net', 'moose_nerp.spn1_net']
-
-    #only save vm trace from save_num neurons of each type if there are more than too_many_neurons
-    #consider putting this stuff into param_net
-    too_many_neurons=30
-    save_num=2
-    savett=True
-    save_conn=False
-
     #additional, optional parameter overrides specified from with python terminal
     model.synYN = True
     net.single=False
-    outdir="bg_net/output/"
     create_model_sim.setupOptions(model)
     param_sim = model.param_sim
     param_sim.injection_current = [0e-12]
@@ -76,10 +103,10 @@ def moose_main(p):
         buf_cap=multi_module.multi_modules(neuron_modules,model,buf_cap,net.change_syn)
 
     ########### Create Network. For multiple populations, send in net_modules ###########
-    population,[connections,conn_summary],plas=create_network.create_network(model, net, model.neurons,network_list=net_modules)
+    population,[connections,conn_summary],plas=create_network.create_network(model, net, model.neurons,network_list=NET_MODULES)
     #print(net.connect_dict)
     total_neurons=np.sum([len(pop) for pop in population['pop'].values()])
-    if total_neurons<too_many_neurons:
+    if total_neurons<30:
         print('populations created and connected!!!',population['pop'],'\n',population['netnames'])
     else:
         print('populations created and connected!!!',[(key,len(pop)) for key,pop in population['pop'].items()])
@@ -93,6 +120,30 @@ def moose_main(p):
         model.inject_pop=population['pop']
 
     create_model_sim.setupStim(model)
+    return {'model':model,'net':net,'population':population,'connections':connections,
+            'conn_summary':conn_summary,'plas':plas,'buf_cap':buf_cap}
+
+def moose_main(p,seed=None):
+    import numpy as np
+    from moose_nerp.prototypes import (calcium,
+                                       create_model_sim,
+                                       clocks,
+                                       tables,
+                                       net_output)
+    simtime=p[8]
+    #only save vm trace from save_num neurons of each type if there are more than too_many_neurons
+    #consider putting this stuff into param_net
+    too_many_neurons=30
+    save_num=2
+    savett=True
+    save_conn=False
+    outdir="bg_net/output/"
+
+    built=build_network(p,seed)
+    model,net,population=built['model'],built['net'],built['population']
+    connections,conn_summary,plas,buf_cap=built['connections'],built['conn_summary'],built['plas'],built['buf_cap']
+    param_sim=model.param_sim
+    total_neurons=np.sum([len(pop) for pop in population['pop'].values()])
 
 ##############--------------output elements
     if net.single:
@@ -106,7 +157,7 @@ def moose_main(p):
         print('simpath',simpath)
 
     #### Set up hsolve and fix calcium
-    clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA)
+    clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA,clock_dt=clocks.clock_dt(param_sim, net))
     # Fix calculation of B parameter in CaConc if using hsolve and calcium
     ######### Need to use CaPlasticityParams.BufferCapacityDensity from EACH neuron_module
     if model.param_sim.hsolve and model.calYN:
@@ -143,7 +194,7 @@ def moose_main(p):
                 else:
                     conn_dict.append({'neur':ntype,'syn':syntype,'pre':pretype,'params':{'nc':info.num_conns,'prob':info.probability,'sc':info.space_const,'wt':info.weight}})
 
-    params={'simtime':model.param_sim.simtime,,'plotdt':model.param_sim.plotdt,'numSyn':model.NumSyn,'connect_dict':conn_dict}
+    params={'simtime':model.param_sim.simtime,'plotdt':model.param_sim.plotdt,'numSyn':model.NumSyn,'connect_dict':conn_dict}
 
     ######### Actually save data - just spikes if they occur.  also conn_dict
     print('************ output file name',net.outfile)
@@ -168,17 +219,57 @@ def moose_main(p):
         #
     return spike_time,isis,params,conn_summary
 
-def multi_main(p):
+PARAM_NAMES=('stoptask','ctxfreq','stnfreq','pulsedur','rampdur','fb_npas','fb_lhx','FSI','simtime','trial')
+RESULT_NAMES=('spike_time','isi','params','conn_summary')
+
+def rate_metrics(results):
+    #summary metrics of one trial for the result index: mean firing rate of each population
+    import numpy as np
+    spike_time,isis,params,conn_summary=results
+    return {'rate/'+ntype:np.mean([len(st) for st in trains])/params['simtime'] for ntype,trains in spike_time.items() if len(trains)}
+
+def multi_main(p,result_dir="bg_net/output/results/",cache_dir=None,cache_MB=None):
     from multiprocessing.pool import Pool
     import os
+    from moose_nerp.prototypes import result_store, result_cache, result_index, spike_trains
     # Apply main simulation varying cortical fractions:
     params=[(p.stoptask,p.ctxfreq,p.stnfreq,p.pulsedur,p.rampdur,p.fb_npas,p.fb_lhx,p.FSI,p.simtime,i) for i in range(p.trials)]
+    #trials differ only in random connections and inputs: one check for all
+    check_network(params[0])
     max_pools=os.cpu_count()
     num_pools=min(len(params),max_pools)
     print('************* number of processors',num_pools,' params',len(params),params)
     pp = Pool(num_pools,maxtasksperchild=1)
-    results = pp.map(moose_main,params)
-    return dict(zip(range(p.trials),results))
+    #each run is recorded in result_dir/index.sqlite with its parameters and firing rates
+    indexed=result_index.IndexedResult(moose_main,result_dir,os.path.join(result_dir,'index.sqlite'),'bg_net',PARAM_NAMES,rate_metrics,RESULT_NAMES)
+    if cache_dir:
+        #only trials whose parameters, model, inputs or source changed are simulated
+        from moose_nerp import bg_net
+        cache=result_cache.ResultCache(cache_dir,cache_MB)
+        inputs=[f for name in bg_net.ttable_files(p.stoptask,p.ctxfreq,p.stnfreq,p.pulsedur,p.rampdur).values()
+                for f in spike_trains.train_files(name)]
+        outfile='bg_net/output/'+bg_net.fname(p.stoptask,p.ctxfreq,p.stnfreq,p.pulsedur,p.rampdur,p.fb_npas,p.fb_lhx,p.FSI)[1]
+        results = cache.map(pp.map,moose_main,params,modules=['moose_nerp.bg_net','moose_nerp.spn_1comp'],input_files=inputs,
+                            outputs=lambda trial: outfile+'t'+str(trial[-1])+'.npz')
+        indexed.add(params,results)
+        return dict(zip(range(p.trials),result_store.load(results)))
+    #workers write arrays to files in result_dir and return handles; arrays are memory mapped when loaded
+    results = pp.map(indexed,params)
+    return dict(zip(range(p.trials),result_store.load(results)))
+
+def partitioned_main(p):
+    #each trial is divided among p.partitions processes, which exchange spikes; trials run one after another
+    #all partitions of a trial must build the same random network, so each trial gets a fixed seed
+    import zlib
+    from moose_nerp.prototypes import partition
+    results={}
+    check_network((p.stoptask,p.ctxfreq,p.stnfreq,p.pulsedur,p.rampdur,p.fb_npas,p.fb_lhx,p.FSI,p.simtime,0))
+    for i in range(p.trials):
+        trial=(p.stoptask,p.ctxfreq,p.stnfreq,p.pulsedur,p.rampdur,p.fb_npas,p.fb_lhx,p.FSI,p.simtime,i)
+        seed=zlib.crc32(repr(trial).encode())
+        results[i]=partition.run(build_network,(trial,),num_partitions=p.partitions,simtime=p.simtime,seed=seed)
+        print('trial',i,'timing',results[i]['timing'])
+    return results
     
 from moose_nerp.prototypes import standard_options
 def parse_args(commandline,do_exit):
@@ -191,6 +282,9 @@ def parse_args(commandline,do_exit):
     parser.add_argument("--stnfreq",'-stn', type=str, help="frequency of stn inputs to GPe")
     parser.add_argument("--rampdur",'-ramp', type=float, default=0,help="duration of ctx ramp inputs to striatum")
     parser.add_argument("--ctxfreq",'-ctx', type=str, help="frequency of ctx inputs to striatum")
+    parser.add_argument("--partitions", type=int, default=1, help="number of processes sharing the neurons of each trial, exchanging spikes")
+    parser.add_argument("--cache", type=str, help="directory of result cache; only simulations not in the cache are run")
+    parser.add_argument("--cache_MB", type=float, help="maximum size of result cache")
     parser.add_argument("--FSI",'-FSI', type=str, default='11', help="2 bit string controlling FSI inputs, first bit=0 deletes inputs to FSI, 2nd bit=0 deletes inputs to SPNs")
     try:
         args = parser.parse_args(commandline) # maps arguments (commandline) to choices, and checks for validity of choices.
@@ -215,6 +309,9 @@ if __name__ == "__main__":
         do_exit = True
     params=parse_args(args,do_exit)
     print('main: params',params)
-    results = multi_main(params)
+    if params.partitions>1:
+        results = partitioned_main(params)
+    else:
+        results = multi_main(params,cache_dir=params.cache,cache_MB=params.cache_MB)
 
 
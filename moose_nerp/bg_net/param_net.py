@@ -34,6 +34,13 @@ size_factor=1 #(change from 500x500 str network)
 D1_to_ep=0.3/size_factor 
 D2_to_GPe=0.08/size_factor
 
+#time table files of each trial, depending on input parameters, used in multisim.py
+def ttable_files(stop_signal,freqCtx,freqStn,pulsedur,rampdur):
+    if stop_signal: #regardless, STN2000_lognorm_freq28.0.npz is used
+        return {'tt_Ctx':'bg_net/Ctx10000_ramp_freq7.0_'+freqCtx+'dur'+str(rampdur),
+                'tt_STNp':'bg_net/STN500_pulse_freq1.0_'+freqStn+'dur'+str(pulsedur)}
+    return {'tt_Ctx':'bg_net/Ctx10000_osc_freq'+freqCtx+'_osc0.7'}
+
 #filename from parameters governing time table inputs, used here and in multisim.py
 def fname(stop_signal,freqCtx,freqStn,pulsedur,rampdur,fb_npas,fb_lhx,FSI_in,size_factor=1):
     if stop_signal==True:
@@ -237,6 +244,10 @@ change_weight={'D1':{'gaba':{'D2':('weight',0.45),'D1':('weight',0.45)},'gaba2':
                'ep':{'ampa':{'extern1':('weight',1.5)}}}
 mindelay={}
 cond_vel={}
+#multi-rate clocks (see clocks.schedule): dt of neuron types or element classes, multiples of simdt
+#e.g. single compartment GP and EP neurons and time tables at 5x simdt:
+#clock_dt={'proto':5e-5,'Npas':5e-5,'Lhx6':5e-5,'ep':5e-5,'TimeTable':5e-5}
+clock_dt={}
 
 '''
 For external connections, the total number of synapses from each set of time tables to post-synaptic cell =
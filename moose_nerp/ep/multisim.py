@@ -115,9 +115,19 @@ def moose_main(p):
 
     return param_dict,tab_dict,vmtab,spike_time,isis
 
-def multi_main(synset,stpYN,inj,stimfreqs):
+PARAM_NAMES=('stimfreq','presyn','stpYN','inj')
+RESULT_NAMES=('params','tables','vm','spike_time','isi')
+
+def rate_metrics(results):
+    #summary metrics of one simulation for the result index: mean firing rate of each neuron type
+    import numpy as np
+    param_dict,tab_dict,vmtab,spike_time,isis=results
+    return {'rate/'+ntype:np.mean([len(st) for st in trains])/param_dict['simtime'] for ntype,trains in spike_time.items() if len(trains)}
+
+def multi_main(synset,stpYN,inj,stimfreqs,result_dir="ep/output/results/",cache_dir=None,cache_MB=None):
     from multiprocessing.pool import Pool
     import os
+    from moose_nerp.prototypes import result_store, result_cache, result_index
     # Apply main simulation varying cortical fractions:
     params=[(freq,syntype,stpYN,inj) for freq in stimfreqs for syntype in synset]
     key=[(p[0],p[1]) for p in params]
@@ -125,8 +135,18 @@ def multi_main(synset,stpYN,inj,stimfreqs):
     num_pools=min(len(params),max_pools)
     print('************* number of processors',num_pools,' params',len(params),params, 'syn', synset)
     p = Pool(num_pools,maxtasksperchild=1)
-    results = p.map(moose_main,params)
-    return dict(zip(key,results))
+    #each run is recorded in result_dir/index.sqlite with its parameters and firing rates
+    indexed=result_index.IndexedResult(moose_main,result_dir,os.path.join(result_dir,'index.sqlite'),'ep',PARAM_NAMES,rate_metrics,RESULT_NAMES)
+    if cache_dir:
+        #only frequencies and synapses whose model, inputs or source changed are simulated
+        cache=result_cache.ResultCache(cache_dir,cache_MB)
+        results = cache.map(p.map,moose_main,params,modules=['moose_nerp.ep','moose_nerp.ep_net'],
+                            outputs=lambda prm: 'ep/output/ep*'+prm[1]+'_freq'+str(prm[0])+'_plas'+str(1 if prm[2] else 0)+'_inj'+str(prm[3])+'*')
+        indexed.add(params,results)
+        return dict(zip(key,result_store.load(results)))
+    #workers write vectors to files in result_dir and return handles; arrays are memory mapped when loaded
+    results = p.map(indexed,params)
+    return dict(zip(key,result_store.load(results)))
 
 if __name__ == "__main__":
     import sys
@@ -145,7 +165,8 @@ if __name__ == "__main__":
     stpYN=int(args[1]) #either 0 or 1
     synset=args[2].split() 
     stimfreqs=[5,10,20,40,50]
-    results = multi_main(synset,stpYN,inj,stimfreqs)
+    cache_dir=args[3] if len(args)>3 else None #optional result cache directory
+    results = multi_main(synset,stpYN,inj,stimfreqs,cache_dir=cache_dir)
 
     if plot_stuff:
         #plot plasticity and synaptic response
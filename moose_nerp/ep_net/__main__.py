@@ -116,7 +116,7 @@ else:   #population of neurons
     simpath=[net.netname]
 
 #### Set up hsolve and fix calcium
-clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA)
+clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA,clock_dt=clocks.clock_dt(param_sim, net))
 # Fix calculation of B parameter in CaConc if using hsolve
 ######### Need to use CaPlasticityParams.BufferCapacityDensity from EACH neuron_module
 if model.param_sim.hsolve and model.calYN:
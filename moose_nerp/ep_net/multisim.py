@@ -121,7 +121,7 @@ def moose_main(p):
         model.spiketab,model.vmtab,model.plastab,model.catab=net_output.SpikeTables(model, population['pop'], net.plot_netvm, plas, net.plots_per_neur)
         #simpath used to set-up simulation dt and hsolver
         simpath=[net.netname]
-        clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA)
+        clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA,clock_dt=clocks.clock_dt(param_sim, net))
         # Fix calculation of B parameter in CaConc if using hsolve
         if model.param_sim.hsolve and model.calYN:
             calcium.fix_calcium(util.neurontypes(model.param_cond), model)
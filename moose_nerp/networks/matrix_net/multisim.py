@@ -23,6 +23,7 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
         logutil,
         util,
         standard_options,
+        profiling,
     )
     #from moose_nerp import d1opt as model
     #from moose_nerp import D1MatrixSample2 as model
@@ -123,6 +124,7 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
             param_sim.plotdt,
             param_sim.hsolve,
             model.param_cond.NAME_SOMA,
+            clock_dt=clocks.clock_dt(param_sim, net),
         )
     if model.synYN and (param_sim.plot_synapse or net.single):
         # overwrite plastab above, since it is empty
@@ -155,12 +157,15 @@ def moose_main(corticalinput,LTP_amp_thresh_mod=1.158, LTD_amp_thresh_mod=1.656,
     def run_simulation(injection_current, simtime):
         print(u"◢◤◢◤◢◤◢◤ injection_current = {} ◢◤◢◤◢◤◢◤".format(injection_current))
         pg.firstLevel = injection_current
-        moose.reinit()
-        moose.start(simtime, True)
+        with profiling.phase('reinit'):
+            moose.reinit()
+        with profiling.phase('run'):
+            moose.start(simtime, True)
 
     traces, names = [], []
     for inj in param_sim.injection_current:
         run_simulation(injection_current=inj, simtime=param_sim.simtime)
+    profiling.write_report()
 
     weights = [w.value for w in moose.wildcardFind("/##/plas##[TYPE=Function]")]
     if param_sim.useStreamer == True:
@@ -31,6 +31,7 @@ from moose_nerp.prototypes import (create_model_sim,
                                    tables,
                                    net_output,
                                    logutil,
+                                   profiling,
                                    util,
                                    multi_module,
                                    net_sim_graph)
@@ -104,7 +105,7 @@ else:   #population of neurons
     #simpath used to set-up simulation dt and hsolver
     simpath=[net.netname]
 
-clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA)
+clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA,clock_dt=clocks.clock_dt(param_sim, net))
 # Fix calculation of B parameter in CaConc if using hsolve and simple calcium dynamics
 ######### Need to use CaPlasticityParams.BufferCapacityDensity from EACH neuron_module
 if model.param_sim.hsolve and model.calYN:
@@ -140,8 +141,10 @@ def run_simulation(injection_current, simtime, pg,continue_sim = False):
     print(u'◢◤◢◤◢◤◢◤ injection_current = {} ◢◤◢◤◢◤◢◤'.format(injection_current))
     pg.firstLevel = injection_current
     if not continue_sim:
-        moose.reinit()
-    moose.start(simtime)
+        with profiling.phase('reinit'):
+            moose.reinit()
+    with profiling.phase('run'):
+        moose.start(simtime)
 
 continue_sim = False
 traces, names = [], []
@@ -165,6 +168,7 @@ for inj in param_sim.injection_current:
         if model.synYN and param_sim.plot_synapse and not param_sim.useStreamer:
             net_graph.syn_graph(connections, model.syntab, param_sim)
         net_output.writeOutput(model, net.outfile+str(inj),model.spiketab,model.vmtab,population)
+profiling.write_report()
 
 if net.single:
     neuron_graph.SingleGraphSet(traces, names, param_sim.simtime,title=net.netname)
@@ -0,0 +1,226 @@
+"""\
+Adaptive sampling of model parameters for variability sweeps.
+
+Instead of simulating thousands of uniformly drawn parameter sets, the sampler
+simulates an initial Latin hypercube design, fits a surrogate of each output
+feature (e.g. rheobase, upstate amplitude, weight change) and then simulates
+batches of points chosen where the surrogate predicts the features to be in a
+target region, or where the surrogate is most uncertain.  Points of a batch
+are kept apart, so that a batch is not spent on one spot.
+
+    space = adaptive_sampler.ParamSpace({'D1PatchSample5/KaS': (0, 4), 'D1PatchSample5/CaR': (0, 20)})
+    sampler = adaptive_sampler.AdaptiveSampler(space, ['upstate_amp'], target={'upstate_amp': (15e-3, 35e-3)})
+    with Pool(16, maxtasksperchild=1) as pool:
+        sampler.run(upstate_features, pool.map, num_init=64, batch=32, num_batches=10)
+    sampler.save('adaptive_upstate.npz')
+
+The simulation function receives the parameters as nested dicts (names are
+split at /, e.g. a mod_dict of sim_upstate) and returns a dict of features;
+it must be picklable (module level) to be used with a process pool.
+
+GPSurrogate needs only numpy and scipy; ForestSurrogate uses sklearn (as anal/RF_utils).
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+log = logutil.Logger()
+
+class ParamSpace(object):
+    '''Box of parameter ranges, {name: (low, high)}; names in integers are rounded'''
+    def __init__(self, ranges, integers=()):
+        self.names = list(ranges)
+        self.low = np.array([ranges[n][0] for n in self.names], dtype=float)
+        self.high = np.array([ranges[n][1] for n in self.names], dtype=float)
+        self.integers = set(integers)
+
+    def __len__(self):
+        return len(self.names)
+
+    def from_unit(self, u):
+        '''{name: value} of point u of the unit cube'''
+        values = self.low+np.asarray(u)*(self.high-self.low)
+        return {n: int(round(v)) if n in self.integers else float(v) for n, v in zip(self.names, values)}
+
+    def to_unit(self, params):
+        values = np.array([params[n] for n in self.names], dtype=float)
+        return (values-self.low)/np.where(self.high > self.low, self.high-self.low, 1)
+
+    def latin_hypercube(self, num, rng):
+        '''num points of the unit cube, one in each of num intervals of every parameter'''
+        u = (np.arange(num)[:, None]+rng.uniform(size=(num, len(self))))/num
+        for j in range(len(self)):
+            u[:, j] = u[rng.permutation(num), j]
+        return u
+
+def nested(params, sep='/'):
+    '''{'a/b': 1} -> {'a': {'b': 1}}'''
+    out = {}
+    for name, value in params.items():
+        keys = name.split(sep)
+        d = out
+        for key in keys[:-1]:
+            d = d.setdefault(key, {})
+        d[keys[-1]] = value
+    return out
+
+################ surrogates: fit(X, y) on the unit cube, predict(X) -> mean, std
+class GPSurrogate(object):
+    '''Gaussian process with squared exponential kernel; length scale and noise are
+    chosen from a grid by marginal likelihood'''
+    LENGTHS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.2, 2.0)
+    NOISES = (1e-4, 1e-2, 1e-1)
+
+    def fit(self, X, y):
+        from scipy.linalg import cho_factor, cho_solve
+        self.X = np.asarray(X)
+        self.mean, self.scale = np.mean(y), np.std(y) or 1.0
+        z = (np.asarray(y)-self.mean)/self.scale
+        d2 = np.sum((self.X[:, None, :]-self.X[None, :, :])**2, axis=2)
+        best = None
+        for length in self.LENGTHS:
+            K0 = np.exp(-d2/(2*length**2))
+            for noise in self.NOISES:
+                try:
+                    chol = cho_factor(K0+noise*np.eye(len(z)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = cho_solve(chol, z)
+                loglik = -0.5*z.dot(alpha)-np.sum(np.log(np.diag(chol[0])))
+                if best is None or loglik > best[0]:
+                    best = (loglik, length, noise, chol, alpha)
+        _, self.length, self.noise, self.chol, self.alpha = best
+        return self
+
+    def predict(self, X):
+        from scipy.linalg import cho_solve
+        d2 = np.sum((np.asarray(X)[:, None, :]-self.X[None, :, :])**2, axis=2)
+        Ks = np.exp(-d2/(2*self.length**2))
+        var = np.clip(1-np.sum(Ks*cho_solve(self.chol, Ks.T).T, axis=1), 1e-12, None)
+        return self.mean+self.scale*Ks.dot(self.alpha), self.scale*np.sqrt(var)
+
+class ForestSurrogate(object):
+    '''Random forest; uncertainty is the spread of predictions of the trees'''
+    def __init__(self, n_estimators=100, seed=0):
+        self.n_estimators = n_estimators
+        self.seed = seed
+
+    def fit(self, X, y):
+        from sklearn.ensemble import RandomForestRegressor
+        self.forest = RandomForestRegressor(n_estimators=self.n_estimators, random_state=self.seed,
+                                            min_samples_leaf=2).fit(X, y)
+        return self
+
+    def predict(self, X):
+        trees = np.array([tree.predict(X) for tree in self.forest.estimators_])
+        return np.mean(trees, axis=0), np.std(trees, axis=0)
+
+class _Safe(object):
+    #a failed simulation gives no features instead of stopping the whole batch
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, params):
+        try:
+            return self.func(params)
+        except Exception as e:
+            log.warning('simulation failed for {}: {}', params, e)
+            return None
+
+class AdaptiveSampler(object):
+    def __init__(self, space, features, target=None, surrogate=GPSurrogate, explore=0.5, seed=None):
+        '''features: names of features returned by the simulation function;
+        target: {feature: (low, high)} region of interest, None to sample where the surrogate is uncertain;
+        explore: weight of uncertainty relative to probability of being in the target region'''
+        self.space = space
+        self.features = list(features)
+        self.target = target or {}
+        self.surrogate = surrogate
+        self.explore = explore
+        self.rng = np.random.RandomState(seed)
+        self.U = np.zeros((0, len(space)))
+        self.Y = np.zeros((0, len(self.features)))
+        self.batch_num = np.zeros(0, dtype=int)
+
+    def evaluate(self, func, map_func, U, batch_num=0):
+        params = [nested(self.space.from_unit(u)) for u in U]
+        results = list(map_func(_Safe(func), params))
+        Y = np.array([[np.nan if res is None else res.get(f, np.nan) for f in self.features] for res in results], dtype=float)
+        self.U = np.vstack([self.U, U])
+        self.Y = np.vstack([self.Y, Y.reshape(len(U), len(self.features))])
+        self.batch_num = np.concatenate([self.batch_num, np.full(len(U), batch_num)])
+        return Y
+
+    def fit(self):
+        '''one surrogate per feature, on simulations that returned that feature'''
+        models = []
+        for j in range(len(self.features)):
+            ok = np.isfinite(self.Y[:, j])
+            models.append(self.surrogate().fit(self.U[ok], self.Y[ok, j]))
+        return models
+
+    def acquisition(self, models, U):
+        '''probability of target region plus explore * normalized uncertainty of each candidate'''
+        from scipy.stats import norm
+        prob = np.ones(len(U))
+        unc = np.zeros(len(U))
+        for feature, model in zip(self.features, models):
+            mean, std = model.predict(U)
+            unc += std/(np.max(std) or 1)
+            if feature in self.target:
+                low, high = self.target[feature]
+                prob *= norm.cdf((high-mean)/std)-norm.cdf((low-mean)/std)
+        unc /= len(models)
+        return (prob+self.explore*unc) if self.target else unc
+
+    def propose(self, batch, num_candidates=None):
+        '''batch points of high acquisition; each chosen point lowers the acquisition of its neighbours'''
+        models = self.fit()
+        num = num_candidates or max(2000, 50*batch)
+        #uniform candidates, and candidates near samples in the target region (or all samples),
+        #since uniform candidates rarely fall in a small region of many parameters
+        near = self.U[self.in_target()] if self.target and np.any(self.in_target()) else self.U
+        local = near[self.rng.randint(len(near), size=num//2)]+self.rng.normal(0, 0.05, size=(num//2, len(self.space)))
+        U = np.vstack([self.rng.uniform(size=(num-num//2, len(self.space))), np.clip(local, 0, 1)])
+        score = self.acquisition(models, U)
+        radius = 0.15/batch**(1/len(self.space))
+        chosen = []
+        for _ in range(batch):
+            best = int(np.argmax(score))
+            chosen.append(U[best])
+            score = score*(1-np.exp(-np.sum((U-U[best])**2, axis=1)/(2*radius**2)))
+        return np.array(chosen)
+
+    def in_target(self):
+        '''samples with all target features in their target range'''
+        ok = np.ones(len(self.Y), dtype=bool)
+        for feature, (low, high) in self.target.items():
+            y = self.Y[:, self.features.index(feature)]
+            ok &= (y >= low) & (y <= high)
+        return ok
+
+    def run(self, func, map_func=map, num_init=None, batch=16, num_batches=10):
+        '''initial design (unless samples exist) followed by num_batches adaptive batches'''
+        if not len(self.U):
+            self.evaluate(func, map_func, self.space.latin_hypercube(num_init or 2*batch, self.rng), 0)
+        start = int(self.batch_num.max())+1
+        for b in range(start, start+num_batches):
+            if np.sum(np.all(np.isfinite(self.Y), axis=1)) < 2:
+                log.warning('fewer than 2 successful simulations, sampling uniformly')
+                U = self.rng.uniform(size=(batch, len(self.space)))
+            else:
+                U = self.propose(batch)
+            self.evaluate(func, map_func, U, b)
+            if self.target:
+                log.info('batch {}: {} of {} samples in target region', b, np.sum(self.in_target()), len(self.U))
+            else:
+                log.info('batch {}: {} samples', b, len(self.U))
+        return self
+
+    def params(self):
+        return [nested(self.space.from_unit(u)) for u in self.U]
+
+    def save(self, fname):
+        np.savez(fname, names=self.space.names, low=self.space.low, high=self.space.high,
+                 values=self.space.low+self.U*(self.space.high-self.space.low),
+                 features=self.features, Y=self.Y, batch=self.batch_num)
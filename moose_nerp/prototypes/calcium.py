@@ -1,5 +1,6 @@
 from __future__ import print_function, division
 import os
+import re
 import numpy as np
 import moose
 
@@ -231,6 +232,19 @@ def connectNMDA(comp,capool,CurrentMessage,CaOutMessage):
             moose.connect(capool,CaOutMessage,chan,'assignIntCa')
 
 
+def connectNMDAchan(model,comp,chan):
+    #one NMDA channel created after addCalcium, e.g. by syn_proto.get_synchan: couple it to
+    #the calcium pool of comp, or to its outer shell
+    capath=strip_brackets(comp)+'/'+model.CaPlasticityParams.CalciumParams.CaName
+    if moose.exists(capath):
+        capool,CurrentMessage,CaOutMessage=moose.element(capath),'current','concOut'
+    elif moose.exists(capath+'_0'):
+        capool,CurrentMessage,CaOutMessage=moose.element(capath+'_0'),'influx','concentrationOut'
+    else:
+        return
+    moose.connect(chan, 'ICaOut', capool, CurrentMessage)
+    moose.connect(capool,CaOutMessage,chan,'assignIntCa')
+
 def addDifMachineryToComp(model,comp,Buffers,Pumps,sgh,spine):
 
     diam_thick = difshell_geometry(comp, sgh)
@@ -443,7 +457,11 @@ def fix_calcium(neurontypes, model,buf_cap=None):
 
     comptype = 'ZombieCompartment'
     cacomptype = 'ZombieCaConc'
-         
+    #neurons of network populations are copies of the prototype named <ntype>_<number>,
+    #each with its own HSolve (see clocks.assign_clocks)
+    pop_comps = [comp for comp in moose.wildcardFind('/##[TYPE={}]'.format(comptype))
+                 if re.match(r'.+_\d+$', comp.parent.name)]
+
     for ntype in neurontypes:
         ### if neurons come from different packages, they may have different buffer_capacity_densities
         ### if so, use the dictionary of those values in this function
@@ -454,7 +472,8 @@ def fix_calcium(neurontypes, model,buf_cap=None):
             buffer_density=model.CaPlasticityParams.BufferCapacityDensity
             log.info('Fixing calcium buffer capacity for {} elements'.format(comptype))
             
-        for comp in moose.wildcardFind('{}/#[TYPE={}]'.format(ntype, comptype)):
+        copies = [comp for comp in pop_comps if comp.parent.name.rsplit('_',1)[0]==ntype.strip('/')]
+        for comp in moose.wildcardFind('{}/#[TYPE={}]'.format(ntype, comptype))+copies:
             cacomps = [m for m in moose.element(comp).children if m.className==cacomptype]
             for cacomp in cacomps:
 
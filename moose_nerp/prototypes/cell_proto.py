@@ -12,7 +12,8 @@ from moose_nerp.prototypes import (calcium,
                      syn_proto,
                      add_channel,
                      util as _util,
-                     logutil
+                     logutil,
+                     profiling
                      )
 
 log = logutil.Logger()
@@ -52,6 +53,7 @@ def create_neuron(model, ntype, ghkYN,module=None):
 
     return cellproto
 
+@profiling.profiled()
 def neuronclasses(model,module=None):
     ##create channels in the library
     chan_proto.chanlib(model,module)
@@ -0,0 +1,255 @@
+"""\
+Voltage clamp characterization of all channels of a model package at once.
+
+Every channel of model.Channels is clamped through families of voltage steps
+(protocols): activation (I-V curve and peak conductance), steady state
+inactivation (prepulse steps followed by a test pulse) and deactivation
+(tail currents after an activating pulse).  Under voltage clamp (and clamped
+calcium) each gate relaxes exponentially to its steady state within a
+step, so the traces of all steps are calculated directly from the gate
+tables, vectorized over steps and time, without moose:
+
+    model = gate_tables.load_channel_params('d1opt')
+    curves = chan_clamp.characterize(model, ca=50e-6)
+    curves['KaS']['activation'], curves['KaS']['inactivation'], curves['KaS']['tau']['X']
+
+method='moose' instead simulates every channel of the library in its own
+clamp (the step waveform drives the Vm of the channel) in a single simulation,
+to verify the tables moose actually uses:
+
+    python -m moose_nerp.prototypes.chan_clamp d1opt [--moose] [--ca 50e-6] [--plot]
+
+Currents are for Gbar = 1 S (i.e. open fraction times driving force); GHK
+calcium channels use the Erev of their ChannelSettings.
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+from moose_nerp.prototypes.util import NamedList
+from moose_nerp.prototypes.chan_proto import ca_gate_tables, bk_gating_matrix, TwoD
+from moose_nerp.prototypes.gate_tables import gates, voltage_gate_tables
+log = logutil.Logger()
+
+#voltages: one value (or array of step values) per segment; measure: segment of peak current
+ClampProtocol = NamedList('ClampProtocol', 'durations voltages measure')
+
+STEPS = np.arange(-100e-3, 41e-3, 10e-3)
+
+def activation(steps=STEPS, hold=-90e-3, dur=0.2):
+    return ClampProtocol([0.02, dur, 0.02], [hold, np.asarray(steps), hold], 1)
+
+def inactivation(steps=STEPS, test=0, dur=1.0, hold=-90e-3):
+    return ClampProtocol([0.02, dur, 0.1], [hold, np.asarray(steps), test], 2)
+
+def deactivation(steps=STEPS, activate=20e-3, hold=-90e-3, dur=0.2):
+    return ClampProtocol([0.02, 0.05, dur], [hold, activate, np.asarray(steps)], 2)
+
+PROTOCOLS = {'activation': activation(), 'inactivation': inactivation(), 'deactivation': deactivation()}
+
+def waveforms(protocol, dt):
+    '''time (num samples) and command voltage (num steps x num samples) of protocol'''
+    nsteps = max(np.size(v) for v in protocol.voltages)
+    V = np.hstack([np.broadcast_to(np.reshape(v, (-1, 1)), (nsteps, int(round(d/dt))))
+                   for d, v in zip(protocol.durations, protocol.voltages)])
+    return dt*np.arange(1, V.shape[1]+1), V
+
+def segment_slice(protocol, dt, segment):
+    n = [int(round(d/dt)) for d in protocol.durations]
+    return slice(sum(n[:segment]), sum(n[:segment+1]))
+
+class ChannelKinetics(object):
+    '''steady state and time constant of each gate of one channel, at clamped calcium ca (mM)'''
+    def __init__(self, model, chan, ca):
+        self.name = chan
+        params = model.Channels[chan]
+        self.Erev = params.channel.Erev
+        self.vgrid = np.linspace(model.VMIN, model.VMAX, model.VDIVS)
+        self.gates = []
+        for name, gate, kind, gparams in gates(model):
+            if name != chan:
+                continue
+            power = getattr(params.channel, gate+'pow')
+            if kind == 'V':
+                A, B = voltage_gate_tables(gparams, self.vgrid)
+                self.gates.append((gate, power, kind, (A, B)))
+            elif kind == 'Ca':
+                A, B = ca_gate_tables(gparams, np.array([ca]))
+                self.gates.append((gate, power, kind, (A[0], B[0])))
+            else:
+                self.gates.append((gate, power, kind, (gparams, ca, model.Temp)))
+
+    def rates(self, gate, v):
+        '''steady state and time constant of gate at voltages v'''
+        _, _, kind, tables = gate
+        if kind == 'V':
+            A, B = np.interp(v, self.vgrid, tables[0]), np.interp(v, self.vgrid, tables[1])
+        elif kind == 'Ca':
+            A, B = np.full(np.shape(v), tables[0]), np.full(np.shape(v), tables[1])
+        else:
+            gparams, ca, Temp = tables
+            A, B = bk_gating_matrix(gparams, np.asarray(v), ca, Temp)
+        return A/B, 1/B
+
+    def steady_state(self, v):
+        return {gate[0]: self.rates(gate, v)[0] for gate in self.gates}
+
+    def tau(self, v):
+        return {gate[0]: self.rates(gate, v)[1] for gate in self.gates}
+
+    def open_fraction(self, protocol, dt):
+        '''open fraction (num steps x num samples) through protocol, starting at steady state'''
+        t, V = waveforms(protocol, dt)
+        opened = np.ones(V.shape)
+        for gate in self.gates:
+            x = np.empty(V.shape)
+            x0 = self.rates(gate, V[:, 0])[0]
+            for seg in range(len(protocol.durations)):
+                sl = segment_slice(protocol, dt, seg)
+                inf, tau = self.rates(gate, V[:, sl.start])
+                tloc = dt*np.arange(1, sl.stop-sl.start+1)
+                x[:, sl] = inf[:, None]+(x0-inf)[:, None]*np.exp(-tloc[None, :]/tau[:, None])
+                x0 = x[:, sl.stop-1]
+            opened *= x**gate[1]
+        return t, V, opened
+
+def summarize(curves, kinetics, protocols, dt):
+    '''I-V, activation, inactivation and tail curves from the traces of each protocol'''
+    for pname, (t, V, I) in curves['traces'].items():
+        protocol = protocols[pname]
+        sl = segment_slice(protocol, dt, protocol.measure)
+        seg = I[:, sl]
+        peak = seg[np.arange(len(seg)), np.argmax(np.abs(seg), axis=1)]
+        G = np.abs(peak/np.where(V[:, sl.start] == kinetics.Erev, np.nan, V[:, sl.start]-kinetics.Erev))
+        v = np.atleast_1d(protocol.voltages[protocol.measure])
+        if pname == 'activation':
+            curves['iv'] = (v, peak)
+            curves['activation'] = (v, G/np.nanmax(G) if np.nanmax(G) > 0 else G)
+        elif pname == 'inactivation':
+            pre = np.atleast_1d(protocol.voltages[1])
+            curves['inactivation'] = (pre, G/np.nanmax(G) if np.nanmax(G) > 0 else G)
+        elif pname == 'deactivation':
+            curves['tail'] = (v, peak)
+    return curves
+
+def characterize(model, protocols=None, ca=50e-6, dt=1e-4, channels=None, method='tables'):
+    '''{channel: curves} for all (or listed) channels: traces {protocol: (t, V, I)}, iv, activation,
+    inactivation, tail, and steady state (inf) and tau of each gate on a voltage grid.
+    method 'tables' calculates traces from gate parameters, 'moose' simulates them'''
+    protocols = protocols or PROTOCOLS
+    channels = channels or list(model.Channels)
+    if method == 'moose':
+        traces = simulate(model, protocols, ca, dt, channels)
+    result = {}
+    for chan in channels:
+        kin = ChannelKinetics(model, chan, ca)
+        curves = {'v': kin.vgrid, 'inf': kin.steady_state(kin.vgrid), 'tau': kin.tau(kin.vgrid), 'traces': {}}
+        for pname, protocol in protocols.items():
+            if method == 'moose':
+                curves['traces'][pname] = traces[chan][pname]
+            else:
+                t, V, opened = kin.open_fraction(protocol, dt)
+                curves['traces'][pname] = (t, V, opened*(V-kin.Erev))
+        result[chan] = summarize(curves, kin, protocols, dt)
+    return result
+
+def simulate(model, protocols, ca, dt, channels):
+    '''traces {channel: {protocol: (t, V, I)}} of copies of the library channels, each driven by
+    a StimulusTable with the command voltage of one step, all in one simulation'''
+    import moose
+    from moose_nerp.prototypes import chan_proto
+    if not all(moose.exists('/library/'+chan) for chan in channels):
+        chan_proto.chanlib(model)
+    container = moose.Neutral('/chanclamp')
+    conc = moose.PulseGen(container.path+'/ca')
+    conc.baseLevel = ca
+    conc.delay[0] = 1e9
+    simtime = max(sum(p.durations) for p in protocols.values())
+    records = {}
+    for pname, protocol in protocols.items():
+        t, V = waveforms(protocol, dt)
+        #hold the last command voltage until all protocols end
+        V = np.hstack([V, np.repeat(V[:, -1:], int(round(simtime/dt))-V.shape[1], axis=1)])
+        for k, command in enumerate(V):
+            stim = moose.StimulusTable('{}/{}_{}'.format(container.path, pname, k))
+            stim.vector = command
+            stim.startTime = 0
+            stim.stopTime = simtime
+            for chan in channels:
+                copy = moose.copy(moose.element('/library/'+chan), container, '{}_{}_{}'.format(chan, pname, k))[0]
+                copy.Gbar = 1
+                moose.connect(stim, 'output', copy, 'Vm')
+                if isinstance(model.Channels[chan], TwoD) or getattr(copy, 'useConcentration', False):
+                    moose.connect(conc, 'output', copy, 'concen')
+                tab = moose.Table(copy.path+'_Ik')
+                moose.connect(tab, 'requestOut', copy, 'getIk')
+                records.setdefault(chan, {}).setdefault(pname, []).append(tab)
+    for tick in range(10):
+        moose.setClock(tick, dt)
+    moose.reinit()
+    moose.start(simtime)
+    traces = {}
+    for chan, by_protocol in records.items():
+        for pname, tabs in by_protocol.items():
+            t, V = waveforms(protocols[pname], dt)
+            I = np.array([tab.vector[1:V.shape[1]+1] for tab in tabs])
+            traces.setdefault(chan, {})[pname] = (t, V, -I)
+    moose.delete(container)
+    return traces
+
+def half_activation(v, g):
+    '''voltage where g (increasing or decreasing, normalized) crosses 0.5'''
+    cross = np.where(np.diff(np.sign(np.asarray(g)-0.5)) != 0)[0]
+    if not len(cross):
+        return np.nan
+    i = cross[0]
+    return v[i]+(0.5-g[i])*(v[i+1]-v[i])/(g[i+1]-g[i])
+
+def report(curves):
+    lines = ['{:8s} {:>10s} {:>10s} {:>12s}'.format('channel', 'V1/2 act', 'V1/2 inact', 'peak I@0mV')]
+    for chan, c in curves.items():
+        v, peak = c['iv']
+        lines.append('{:8s} {:10.1f} {:10.1f} {:12.3g}'.format(
+            chan, 1e3*half_activation(*c['activation']), 1e3*half_activation(*c['inactivation']),
+            np.interp(0, v, peak)))
+    return '\n'.join(lines)
+
+def plot(curves):
+    from matplotlib import pyplot as plt
+    fig, axes = plt.subplots(2, 2, figsize=(10, 8))
+    for chan, c in curves.items():
+        axes[0, 0].plot(*c['iv'], label=chan)
+        axes[0, 1].plot(*c['activation'], label=chan)
+        axes[0, 1].plot(*c['inactivation'], '--')
+        for gate, tau in c['tau'].items():
+            axes[1, 0].plot(c['v'], 1e3*tau, label=chan+' '+gate)
+        axes[1, 1].plot(*c['tail'], label=chan)
+    for ax, title in zip(axes.flat, ('I-V (A/S)', 'activation, inactivation (--)', 'tau (ms)', 'tail current (A/S)')):
+        ax.set_title(title)
+        ax.set_xlabel('V')
+    axes[0, 0].legend(fontsize=8)
+    plt.show()
+
+def main(args=None):
+    import argparse
+    import importlib
+    from moose_nerp.prototypes.gate_tables import load_channel_params
+    parser = argparse.ArgumentParser(description='voltage clamp curves of all channels of a model package')
+    parser.add_argument('model', help='model package, e.g. d1opt or cells.d1d2')
+    parser.add_argument('--ca', type=float, default=50e-6, help='clamped calcium concentration (mM), default basal')
+    parser.add_argument('--dt', type=float, default=1e-4)
+    parser.add_argument('--moose', action='store_true', help='simulate the library channels instead of using gate tables')
+    parser.add_argument('--plot', action='store_true')
+    args = parser.parse_args(args)
+    if args.moose:
+        model = importlib.import_module('moose_nerp.'+args.model)
+    else:
+        model = load_channel_params(args.model)
+    curves = characterize(model, ca=args.ca, dt=args.dt, method='moose' if args.moose else 'tables')
+    print(report(curves))
+    if args.plot:
+        plot(curves)
+    return curves
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,13 @@ If channel does not have inactivation, just send in empty Yparam array.
 """
 
 from __future__ import print_function, division
-import moose
 import numpy as np
 import logging
 
 from moose_nerp.prototypes import constants, logutil
 from moose_nerp.prototypes.util import NamedList
+#moose is imported in the functions that create channels, so that param_chan
+#(and gate_tables) can be used without moose
 log = logutil.Logger()
 
 StandardMooseTauInfChannelParams = NamedList('StandardMooseTauInfChannelParams', '''
@@ -82,19 +83,23 @@ def quadratic(x,xmin,xmax,xvhalf,xslope):
     tau_x = xmin+tau1*tau2
     return tau_x
 
-def make_sigmoid_gate(model,params,Gate):
-    v = np.linspace(model.VMIN, model.VMAX, model.VDIVS)
+def sigmoid_gate_tables(params,v):
+    '''tableA and tableB of TauInfMinChannelParams gate at membrane potentials v'''
     if params.T_power==2:
-        print('making quadratic gate', Gate.path)
         tau = quadratic(v,params.T_min,params.T_vdep,params.T_vhalf,params.T_vslope)
     else:
         tau = sigmoid(v,params.T_min,params.T_vdep,params.T_vhalf,params.T_vslope)
     minf = sigmoid(v,params.SS_min,params.SS_vdep,params.SS_vhalf,params.SS_vslope)
+    return minf/tau, 1/tau
+
+def make_sigmoid_gate(model,params,Gate):
+    v = np.linspace(model.VMIN, model.VMAX, model.VDIVS)
+    if params.T_power==2:
+        log.debug('making quadratic gate {}', Gate.path)
     Gate.min = model.VMIN
     Gate.max = model.VMAX
     Gate.divs = model.VDIVS
-    Gate.tableA = minf/tau
-    Gate.tableB = 1/tau
+    Gate.tableA, Gate.tableB = sigmoid_gate_tables(params,v)
 
 def interpolate_values_in_table(model, tabA, V_0, l=40):
     '''This function interpolates values in the table
@@ -147,7 +152,36 @@ def make_gate(params,model,gate):
     elif isinstance(params,TauInfMinChannelParams):
         make_sigmoid_gate(model,params,gate)
 
+def ca_gate_tables(params,ca_array):
+    '''tableA and tableB of calcium dependent ZChannelParams gate at concentrations ca_array'''
+    caterm = (ca_array/params.Kd) ** params.power
+    inf_z = caterm / (1 + caterm)
+    if params.taumax>0:
+        tauterm=(ca_array/params.cahalf)**params.tau_power
+        taumax_z=(params.taumax-params.tau)/(1+tauterm)
+        taumin_z= params.tau * np.ones(len(ca_array))
+        tau_z = taumin_z+taumax_z
+    else:
+        tau_z = params.tau * np.ones(len(ca_array))
+    return inf_z / tau_z, 1 / tau_z
+
+def bk_gating_matrix(X_params, v_array, ca_array, Temp):
+    '''tableA and tableB of 2D (voltage x calcium) BK gate, as in BKchan_proto.
+    v_array and ca_array are broadcast against each other, e.g. v_array[:,None] and
+    ca_array[None,:] for the full table'''
+    ZFbyRT= 2 * constants.Faraday / (constants.R * constants.celsius_to_kelvin(Temp))
+    gatingMatrix = []
+    for i,pars in enumerate(X_params):
+        Vdepgating=pars.K*np.exp(pars.delta*ZFbyRT*v_array)
+        if i == 0:
+            gatingMatrix.append(pars.alphabeta*ca_array/(ca_array+pars.K*Vdepgating))
+        else:
+            gatingMatrix.append(pars.alphabeta/(1+ca_array/pars.K*Vdepgating))
+            gatingMatrix[i] = gatingMatrix[i] + gatingMatrix[0]
+    return gatingMatrix
+
 def chan_proto(model, chanpath, params):
+    import moose
     log.info("{}: {}", chanpath, params)
     chan = moose.HHChannel(chanpath)
 
@@ -169,18 +203,7 @@ def chan_proto(model, chanpath, params):
             ca_array = np.linspace(model.CAMIN, model.CAMAX, model.CADIVS)
             zGate.min = model.CAMIN
             zGate.max = model.CAMAX
-            caterm = (ca_array/params.Z.Kd) ** params.Z.power
-            inf_z = caterm / (1 + caterm)
-            if params.Z.taumax>0:
-                tauterm=(ca_array/params.Z.cahalf)**params.Z.tau_power
-                taumax_z=(params.Z.taumax-params.Z.tau)/(1+tauterm)
-                taumin_z= params.Z.tau * np.ones(len(ca_array))
-                tau_z = taumin_z+taumax_z
-            else:
-                tau_z = params.Z.tau * np.ones(len(ca_array))
-            #
-            zGate.tableA = inf_z / tau_z
-            zGate.tableB = 1 / tau_z
+            zGate.tableA, zGate.tableB = ca_gate_tables(params.Z, ca_array)
             chan.useConcentration = True
         else:
             chan.useConcentration = False
@@ -191,21 +214,12 @@ def chan_proto(model, chanpath, params):
     return chan
 
 def BKchan_proto(model, chanpath, params):
-    ZFbyRT= 2 * constants.Faraday / (constants.R * constants.celsius_to_kelvin(model.Temp))
+    import moose
     v_array = np.linspace(model.VMIN, model.VMAX, model.VDIVS)
     ca_array = np.linspace(model.CAMIN, model.CAMAX, model.CADIVS)
     if model.VDIVS<=5 and model.CADIVS<=5:
         log.info("{}, {}", v_array, ca_array)
-    gatingMatrix = []
-    for i,pars in enumerate(params.X):
-        Vdepgating=pars.K*np.exp(pars.delta*ZFbyRT*v_array)
-        if i == 0:
-            gatingMatrix.append(pars.alphabeta*ca_array[None,:]/(ca_array[None,:]+pars.K*Vdepgating[:,None]))
-            #table.tableVector2D=gatingMatrix
-        else:
-            gatingMatrix.append(pars.alphabeta/(1+ca_array[None,:]/pars.K*Vdepgating[:,None]))
-            gatingMatrix[i] += gatingMatrix[0]
-            #table.tableVector2D=gatingMatrix
+    gatingMatrix = bk_gating_matrix(params.X, v_array[:,None], ca_array[None,:], model.Temp)
 
 
     chan = moose.HHChannel2D(chanpath)
@@ -248,6 +262,7 @@ def make_channel(model, chanpath, params):
     return func(model, chanpath, params)
 
 def chanlib(model,module=None):
+    import moose
     if not moose.exists('/library'):
         lib = moose.Neutral('/library')
     else:
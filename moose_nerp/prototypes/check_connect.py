@@ -9,6 +9,7 @@ import logging
 
 from moose_nerp.prototypes import (pop_funcs,
                                    connect,
+                                   syn_proto,
                                    ttables,
                                    logutil)
 
@@ -35,7 +36,7 @@ def count_postsyn(netparams,NumSyn,population):
         neur_proto=moose.element(ntype).path
         #allsyncomp_list = moose.wildcardFind(neur_proto + '/##[ISA=SynChan]')
         for syntype in netparams.connect_dict[ntype].keys():  #next level is synaptic receptor
-            allsyncomp_list = moose.wildcardFind(neur_proto + '/##/'+syntype+'[ISA=SynChan]')
+            allsyncomp_list = syn_proto.synchan_sites(neur_proto,syntype)
             print('CREATE_SYNPATH_ARRAY from check_connect.count_postyn, no prob')
             syncomps,totalsyn,availsyn=connect.create_synpath_array(allsyncomp_list,syntype,NumSyn)
             num_postsyn[ntype][syntype]=num_postcells[ntype]*totalsyn
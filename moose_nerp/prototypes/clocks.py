@@ -10,16 +10,132 @@ Information on how to use clocks can be read by typing: help("moose") in python.
 
 from __future__ import print_function, division
 
-from . import logutil
+import re
+from . import logutil, profiling
 log = logutil.Logger()
 
 import moose
 from moose_nerp.prototypes.tables import DATA_NAME
 
-def assign_clocks(model_container_list, simdt, plotdt,hsolveYN, name_soma):
+#Multi-rate scheduling: clock_dt = {key: dt}, where key is a neuron type (all elements of
+#prototype neuron and its copies in populations) or one of the element classes below.
+#Element classes take precedence over neuron types, e.g. {'D1':5e-5, 'SpikeGen':1e-5}
+ELEMENT_CLASSES = {'calcium':['CaConcBase', 'DifShellBase', 'DifBufferBase', 'MMPump'],
+                   'TimeTable':['TimeTable'],
+                   'SpikeGen':['SpikeGen'],
+                   'Function':['Function'],
+                   'tables':['Table']}
+#ticks 0-12 are the default ticks of moose classes, higher ticks are free
+FIRST_FREE_TICK = 13
+NUM_TICKS = 32
+
+def solver_targets(path, name_soma):
+    """neurons under path: path itself if it is a neuron (contains name_soma),
+    otherwise each neuron of the population in container path"""
+    container = moose.element(path)
+    if moose.exists(container.path+'/'+name_soma):
+        return [container.path]
+    return sorted(soma.parent.path for soma in moose.wildcardFind(container.path+'/#/'+name_soma))
+
+def num_compartments(neuron):
+    return len(moose.wildcardFind(neuron+'/##[ISA=CompartmentBase]'))
+
+def hsolve_neuron(neuron, simdt, name_soma):
+    """create HSolve for one neuron, returns True if compartments were converted to zombies"""
+    hsolve = moose.HSolve(neuron + '/hsolve')
+    hsolve.dt=simdt
+    # Compartment is transformed into zombiecompartment after below statement.
+    hsolve.target = neuron+'/'+name_soma
+    if moose.element(neuron+'/'+name_soma).className.startswith('Zombie'):
+        return True
+    log.warning('HSolve of {} did not convert compartments, using exponential Euler', neuron)
+    moose.delete(hsolve)
+    return False
+
+def clock_dt(param_sim, param_net=None):
+    """multi-rate clock configuration from param_sim.clock_dt, updated by param_net.clock_dt"""
+    dts = dict(getattr(param_sim, 'clock_dt', None) or {})
+    dts.update(getattr(param_net, 'clock_dt', None) or {})
+    return dts
+
+def validate_clock_dt(dts, simdt):
+    for key, dt in dts.items():
+        ratio = dt/simdt
+        if ratio < 1 or abs(ratio-round(ratio)) > 1e-6:
+            raise ValueError('clock_dt[{}]={} must be an integer multiple of simdt={}'.format(key, dt, simdt))
+
+def neuron_type(neuron, ntypes):
+    """type of prototype neuron (name is type) or population neuron (name is <type>_<number>)"""
+    name = moose.element(neuron).name
+    if name in ntypes:
+        return name
+    match = re.match(r'(.+)_\d+$', name)
+    if match and match.group(1) in ntypes:
+        return match.group(1)
+    return None
+
+def _scheduled(element):
+    #elements computed by HSolve are zombies, which follow the tick of their HSolve
+    return element.tick >= 0 and not element.className.startswith('Zombie')
+
+def schedule(dts, simdt, model_container_list, name_soma):
+    """Move elements to their own ticks, with dt from dts (see ELEMENT_CLASSES).
+    Elements with the same dt keep the relative order of their default ticks, e.g.
+    channels (tick 2) are still computed before compartments (tick 4).
+    Returns {(dt, default tick): new tick}"""
+    validate_clock_dt(dts, simdt)
+    assignments = {}
+    ntypes = [key for key in dts if key not in ELEMENT_CLASSES]
+    if ntypes:
+        for path in model_container_list:
+            for neuron in solver_targets(path, name_soma):
+                ntype = neuron_type(neuron, ntypes)
+                if ntype is None:
+                    continue
+                for el in moose.wildcardFind(neuron+'/##'):
+                    if _scheduled(el):
+                        assignments[el.path] = (el, dts[ntype])
+    for key, classes in ELEMENT_CLASSES.items():
+        if key in dts:
+            for cls in classes:
+                for el in moose.wildcardFind('/##[ISA={}]'.format(cls)):
+                    if _scheduled(el):
+                        assignments[el.path] = (el, dts[key])
+    groups = {}
+    for el, dt in assignments.values():
+        if abs(dt-simdt) > 1e-6*simdt:
+            groups.setdefault((dt, el.tick), []).append(el)
+    num_ticks = getattr(moose.element('/clock'), 'numTicks', NUM_TICKS)
+    if FIRST_FREE_TICK+len(groups) > num_ticks:
+        raise ValueError('clock_dt needs {} ticks, only {} available'.format(len(groups), num_ticks-FIRST_FREE_TICK))
+    ticks = {}
+    for tick, (dt, default_tick) in enumerate(sorted(groups), FIRST_FREE_TICK):
+        moose.setClock(tick, dt)
+        for el in groups[(dt, default_tick)]:
+            el.tick = tick
+            if el.className == 'HSolve':
+                el.dt = dt
+        ticks[(dt, default_tick)] = tick
+        log.info('clock {} dt={}: {} elements of tick {}', tick, dt, len(groups[(dt, default_tick)]), default_tick)
+    return ticks
+
+@profiling.profiled()
+def assign_clocks(model_container_list, simdt, plotdt,hsolveYN, name_soma, min_hsolve_comps=2, clock_dt=None):
+    """Set clocks and, if hsolveYN, create one HSolve per neuron.
+
+    Each entry of model_container_list is either a neuron or a container of a
+    population of neurons (e.g. the network created by create_network).
+    Neurons of populations with fewer than min_hsolve_comps compartments use
+    exponential Euler, which is cheaper for single compartment cells; neurons
+    given directly always use HSolve.
+    clock_dt (see schedule) runs neuron types or element classes with larger dt.
+    Returns solver used for each neuron: {container: {'hsolve':[], 'ee':[], 'failed':[]}}
+    """
     log.info('SimDt={}, PlotDt={}', simdt, plotdt)
     for tab in moose.wildcardFind(DATA_NAME+'/##[TYPE=Table]'):
-        moose.setClock(tab.tick,plotdt)
+        #tables on free ticks have their own sample interval (see recording.create)
+        if tab.tick < FIRST_FREE_TICK:
+            moose.setClock(tab.tick,plotdt)
     for tick in range(0, 13):
         moose.setClock(tick, simdt)
         # 1 - CaConc, DifShell, DifBuffer
@@ -34,11 +150,32 @@ def assign_clocks(model_container_list, simdt, plotdt,hsolveYN, name_soma):
     moose.setClock(8, plotdt)
     # 8 — hdf5datawriter, tables
 
+    solvers={}
+    if isinstance(model_container_list, str):
+        model_container_list=[model_container_list]
     for path in model_container_list:
-        if hsolveYN:
-            hsolve = moose.HSolve(path + '/hsolve')
-            hsolve.dt=simdt
-            # Compartment is transformed into zombiecompartment after below statement.
-            hsolve.target = path+'/'+name_soma
-            log.info("Using HSOLVE for {} clock {}", hsolve.path, hsolve.tick)
+        solvers[path]={'hsolve':[], 'ee':[], 'failed':[]}
+        if not hsolveYN:
+            continue
+        neurons = solver_targets(path, name_soma)
+        population = neurons != [moose.element(path).path]
+        for neuron in neurons:
+            if population and num_compartments(neuron) < min_hsolve_comps:
+                solvers[path]['ee'].append(neuron)
+            elif hsolve_neuron(neuron, simdt, name_soma):
+                solvers[path]['hsolve'].append(neuron)
+            else:
+                solvers[path]['failed'].append(neuron)
+        counts = {}
+        for solver, solved in solvers[path].items():
+            for neuron in solved:
+                #population neurons are named <type>_<number>
+                ntype = re.sub(r'_\d+$', '', moose.element(neuron).name)
+                counts.setdefault(ntype, {'hsolve':0, 'ee':0, 'failed':0})[solver] += 1
+        for ntype, count in sorted(counts.items()):
+            log.info("{} {}: HSOLVE for {} neurons, exponential Euler for {} single compartment neurons, {} failed",
+                     path, ntype, count['hsolve'], count['ee'], count['failed'])
+    if clock_dt:
+        schedule(clock_dt, simdt, model_container_list, name_soma)
     moose.reinit()
+    return solvers
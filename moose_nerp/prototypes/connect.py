@@ -8,16 +8,24 @@ Function definitions for connecting populations of neurons
 
 from __future__ import print_function, division
 import numpy as np
-import moose
 
 from moose_nerp.prototypes import logutil, util
-from moose_nerp.prototypes.spines import NAME_HEAD
-from moose_nerp.prototypes import plasticity
 from moose_nerp.prototypes.util import NamedList
+#moose, spines and plasticity are imported inside functions, so that param_net can be read without moose
 
 log = logutil.Logger()
 CONNECT_SEPARATOR='_to_'
 
+#when not None, plain_synconn appends one SynapseRecord per synapse (used by partition)
+SynapseRecord=NamedList('SynapseRecord','presyn synhandler index delay stp')
+synapse_records=None
+
+def record_synapses():
+    '''start recording every synapse created, returns the list of SynapseRecords'''
+    global synapse_records
+    synapse_records=[]
+    return synapse_records
+
 ####################### Connections
 #for improved NetPyne correspondance: change synapse to synMech, change pre to source
 #Two types of probabilities controlling the connections
@@ -47,14 +55,91 @@ dend_location=NamedList('dend_location','mindist=0 maxdist=1 maxprob=None half_d
 connect=NamedList('connect','synapse pre post num_conns=2 space_const=None probability=None dend_loc=None stp=None weight=1')
 ext_connect=NamedList('ext_connect','synapse pre post dend_loc=None stp=None weight=1')
 
+def stimulated_synapses(connections,syntype):
+    '''names (as util.syn_name) of synchans of type syntype receiving synapses in each cell,
+    from connect_list of connect_neurons or timetable_input; used by plasticity.addPlasticity'''
+    stimulated={}
+    for cell,syns in connections.items():
+        stimulated[cell]=set()
+        for pre,conns in syns.get(syntype,{}).items():
+            if CONNECT_SEPARATOR in pre:
+                #connections from neurons: key is precell_to_postbranch
+                stimulated[cell].add(pre.split(CONNECT_SEPARATOR,1)[1])
+            else:
+                #connections from time tables: dictionary with postbranch keys
+                stimulated[cell].update(conns.keys())
+    return stimulated
+
+################ connect_dict of a network made of several networks (create_network with network_list)
+def merge(a, b, path=[]):
+    "merges b into a"
+    for key in b:
+        if key in a:
+            if isinstance(a[key], dict) and isinstance(b[key], dict):
+                merge(a[key], b[key], path + [str(key)])
+            elif a[key] == b[key]:
+                pass # same leaf value
+            else:
+                raise Exception('Conflict at %s' % '.'.join(path + [str(key)]))
+        else:
+            a[key] = b[key]
+    return a
+
+def dict_delete(a, delete, path=[]):
+    "deletes dictionary with key b from a"
+    for ntype in delete:
+        if ntype in a:
+            for syntype in delete[ntype]:
+                if syntype in a[ntype]:
+                    print('dict delete',ntype,syntype,delete[ntype][syntype])
+                    if isinstance (delete[ntype][syntype],str):
+                        del a[ntype][syntype][delete[ntype][syntype]]
+                    elif isinstance (delete[ntype][syntype],list):
+                        for pre in delete[ntype][syntype]:
+                            del a[ntype][syntype][pre]
+                    else:
+                        print('>>>>>>>> dict_delete,', delete[ntype][syntype], 'is neither string nor list. Write more code to handle this')
+                else:
+                    pass
+        else:
+            pass
+    return a
+
+def change_connect(connect_dict,change_dict):
+    for neurtype in change_dict.keys():
+        for syntype in change_dict[neurtype].keys():
+            for presyn,change_tuple in change_dict[neurtype][syntype].items():
+                #print('>>>>>> old connect ',connect_dict[neurtype][syntype][presyn])
+                if presyn in connect_dict[neurtype][syntype]:
+                    if change_tuple[0]=='space_const' or change_tuple[0]=='weight':
+                        oldvalue=connect_dict[neurtype][syntype][presyn].__getattribute__(change_tuple[0])
+                        connect_dict[neurtype][syntype][presyn].__setattr__(change_tuple[0],change_tuple[1]*oldvalue)
+                    else:
+                        connect_dict[neurtype][syntype][presyn].__setattr__(change_tuple[0],change_tuple[1])
+                    print('>>>>>> change connect, type= ', change_dict[neurtype][syntype][presyn][0],' :::',connect_dict[neurtype][syntype][presyn])
+                else:
+                    print('***** connection not found for ', neurtype,syntype,presyn,' other connections=',connect_dict[neurtype][syntype])
+                    
+    return connect_dict
+
+def change_extern_files(connect_dict,ttables):
+    for neurtype in ttables:
+        for syntype in ttables[neurtype]:
+            for presyn in ttables[neurtype][syntype]:
+                connect_dict[neurtype][syntype][presyn].pre=ttables[neurtype][syntype][presyn]
+                print('>>>>>>      new connect          ', connect_dict[neurtype][syntype][presyn])
+    return connect_dict
+
 def plain_synconn(syn,presyn,syn_delay,weight,simdt=None,stp_params=None):
+    import moose
+    from moose_nerp.prototypes import plasticity
     sh=moose.element(syn.path)
     jj=sh.synapse.num
     sh.synapse.num = sh.synapse.num+1
     sh.synapse[jj].delay=syn_delay
     sh.synapse[jj].weight=weight
     if weight!=1:
-        log.info('SYNAPSE: {} index {} num {} delay {} weight {} tt {}', syn.path, jj, sh.synapse.num, sh.synapse[jj].delay, sh.synapse[jj].weight,presyn.path)
+        log.debug('SYNAPSE: {} index {} delay {} weight {} tt {}', syn.path, jj, syn_delay, weight, logutil.lazy(lambda: presyn.path))
     #It is possible to set the synaptic weight here.
     if presyn.className=='TimeTable':
         msg='eventOut'
@@ -63,18 +148,24 @@ def plain_synconn(syn,presyn,syn_delay,weight,simdt=None,stp_params=None):
     moose.connect(presyn, msg, sh.synapse[jj], 'addSpike')
     if stp_params is not None:
         plasticity.ShortTermPlas(sh.synapse[jj],jj,stp_params,simdt,presyn,msg)
+    if synapse_records is not None:
+        synapse_records.append(SynapseRecord(presyn.path,sh.path,jj,syn_delay,stp_params is not None))
 
 def synconn(synpath,dist,presyn, syn_params ,mindel=1e-3,cond_vel=0.8,simdt=None,stp=None,weight=1):
+    import moose
+    from moose_nerp.prototypes import syn_proto
     if dist:
         syn_delay = max(mindel,np.random.normal(mindel+dist/cond_vel,mindel))
     else:
         syn_delay=mindel
+    #synchans planned by lazy syn_proto.add_synchans are created when the first synapse lands
+    syn_proto.get_synchan(synpath.rsplit('/',1)[0])
     syn=moose.element(synpath)
     plain_synconn(syn,presyn,syn_delay,weight,simdt=simdt,stp_params=stp)
                 
     if syn.parent.name==syn_params.NAME_AMPA:
        nmda_synpath=syn.parent.parent.path+'/'+syn_params.NAME_NMDA+'/'+syn.name
-       if moose.exists(nmda_synpath):
+       if syn_proto.get_synchan(nmda_synpath.rsplit('/',1)[0]) is not None:
            nmda_syn=moose.element(nmda_synpath)
            #probably should add stp for NMDA.  When including desensitization, will be different
            plain_synconn(nmda_syn,presyn,syn_delay,weight)
@@ -123,6 +214,8 @@ def dendritic_distance_dep_connect_prob(prob,dist):
     return dist_prob
 
 def create_synpath_array(allsyncomp_list,syntype,NumSyn,prob=None,soma_loc=[0,0,0]):
+    import moose
+    from moose_nerp.prototypes.spines import NAME_HEAD
     #list of possible synapses with connection probability, which takes into account prior creation of synapses
     syncomps=[]
     totalsyns=0
@@ -140,7 +233,9 @@ def create_synpath_array(allsyncomp_list,syntype,NumSyn,prob=None,soma_loc=[0,0,
         #since there may be multiple types of pre-synaptic neurons, reduce length of syncomps if synapses already made
         #
         if dist_prob>0: #only add synchan to list if connection probability is non-zero
-            sh=moose.element(syncomp.path+'/SH')
+            #planned synchans (syn_proto.PlannedSynChan) have no synapses yet
+            shpath=syncomp.path+'/SH'
+            numSynapses=moose.element(shpath).numSynapses if moose.exists(shpath) else 0
             # TODO: Fix for synapses on spines; there should only be 1 per spine
             if NAME_HEAD in nm:
                 SynPerComp = 1 #- sh.numSynapses
@@ -149,7 +244,7 @@ def create_synpath_array(allsyncomp_list,syntype,NumSyn,prob=None,soma_loc=[0,0,
             #print('   sh',sh.path,'numSynapses',sh.numSynapses,'synpercomp',SynPerComp,'NumSyn',NumSyn[syntype])
             for i in range(SynPerComp):
                 totalsyns+=dist_prob #totalsyns=total synapses to connect
-                if i < SynPerComp - sh.numSynapses:
+                if i < SynPerComp - numSynapses:
                     syncomps.append([syncomp.path+'/SH',dist_prob])
                     #print('{} synapses already connected of {} total synapses, adding 1 synapse with {} dist_prob to list'.format(sh.numSynapses,SynPerComp,dist_prob))
                 else:
@@ -163,11 +258,13 @@ def create_synpath_array(allsyncomp_list,syntype,NumSyn,prob=None,soma_loc=[0,0,
         for syn in syncomps:
             syn[1]=float(syn[1])/syncomp_sum
     else:
-        log.info('&&&&&&&&& Un Oh, no synapes remaining on post-synaptic neurons, syncom_sum='.format(syncomp_sum))
+        log.info('&&&&&&&&& Un Oh, no synapes remaining on post-synaptic neurons, syncom_sum={}',syncomp_sum)
     avail_syns=np.int(np.round(syncomp_sum))
     return syncomps,totalsyns,avail_syns
 
 def connect_timetable(post_connection,syncomps,totalsyn,model,mindelay=0):
+    import moose
+    from moose_nerp.prototypes.spines import NAME_HEAD
     dist=0
     syn_params=model.param_syn
     simdt=model.param_sim.simdt
@@ -188,28 +285,28 @@ def connect_timetable(post_connection,syncomps,totalsyn,model,mindelay=0):
         syn_choices=np.random.choice([sc[0] for sc in syncomps],size=num_choices,replace=False,p=[sc[1] for sc in syncomps])
         #randomly select subset of time-tables for spike train input
         #could do this in one line, but then meaningless error message
-        log.info('>>>>>>>>> num_choices {} for {} {} tt remaining {} from',num_choices, post_connection.post,post_connection.synapse,  len(tt_list), post_connection.pre.tablename)
+        log.debug('>>>>>>>>> num_choices {} for {} {} tt remaining {} from {}',num_choices, post_connection.post,post_connection.synapse,  len(tt_list), post_connection.pre.tablename)
         if len(tt_list)<1000:#2*num_choices:
-            print('>>>>>>>>> num_choices {} for {} {} tt remaining {} from'.format(num_choices, post_connection.post,post_connection.synapse,  len(tt_list), post_connection.pre.tablename))
+            log.info('>>>>>>>>> num_choices {} for {} {} tt remaining {} from {}',num_choices, post_connection.post,post_connection.synapse,  len(tt_list), post_connection.pre.tablename)
         presyn_tt=[]
         for i,syn in enumerate(syn_choices):
             if len(tt_list)>0:
                 presyn_tt.append(select_entry(tt_list))
             else:
-                print('table empty',i,syn,tt_list)
+                log.warning('table {} empty, synapse {} of {} {} not connected',post_connection.pre.tablename,i,syn,post_connection.synapse)
         #presyn_tt=[select_entry(tt_list) for syn in syn_choices]
-        print('## connect from tt',post_connection.pre.tablename,', number of connections',len(presyn_tt))
+        log.debug('## connect from tt {}, number of connections {}',post_connection.pre.tablename,len(presyn_tt))
     else:
         syn_choices=[];presyn_tt=[]
-        log.info('&&&&&&&&&&&&&& no connections from time tables'.format(post_connection.pre.tablename))
+        log.info('&&&&&&&&&&&&&& no connections from time tables {}',post_connection.pre.tablename)
     #connect the time-table to the synapse with mindelay (set dist=0)
     for tt,syn in zip(presyn_tt,syn_choices):
-        postbranch=util.syn_name(moose.element(syn).parent.path,NAME_HEAD)
-        log.debug('CONNECT: TT {} POST {}', tt.path,syn)
+        log.debug('CONNECT: TT {} POST {}', logutil.lazy(lambda: tt.path),syn)
         if hasattr(post_connection,'weight'):
             synconn(syn,dist,tt,syn_params,mindelay,simdt=simdt,stp=stp,weight=post_connection.weight)
         else:
             synconn(syn,dist,tt,syn_params,mindelay,simdt=simdt,stp=stp,weight=1)
+        postbranch=util.syn_name(moose.element(syn).parent.path,NAME_HEAD)
         #save the connection in a dictionary for inspection later.
         '''
         #NEW METHOD: allow multiple connections, needed when 2 or more pre-syn time tables
@@ -222,6 +319,7 @@ def connect_timetable(post_connection,syncomps,totalsyn,model,mindelay=0):
     return connections
 
 def timetable_input(cells, netparams, postype, model,soma_loc=[0,0,0]):
+    from moose_nerp.prototypes import syn_proto
     #connect post-synaptic synapses to time tables
     #used for single neuron models only, since populations are connected in connect_neurons
     log.info('CONNECT set: {} {} {}', postype, cells[postype],netparams.connect_dict[postype])
@@ -233,17 +331,20 @@ def timetable_input(cells, netparams, postype, model,soma_loc=[0,0,0]):
         for pretype in post_connections[syntype].keys():
             if 'extern' in pretype:
                 dend_prob=post_connections[syntype][pretype].dend_loc
-                print('####### timetable input ######### to',postcell,'from', pretype, ', synchan=', syntype,', num stimtab',len(post_connections[syntype][pretype].pre.stimtab) )
-                allsyncomp_list=moose.wildcardFind(postcell+'/##/'+syntype+'[ISA=SynChan]')
+                log.info('####### timetable input ######### to {} from {}, synchan={}, num stimtab {}',postcell,pretype,syntype,len(post_connections[syntype][pretype].pre.stimtab))
+                allsyncomp_list=syn_proto.synchan_sites(postcell,syntype)
                 syncomps,totalsyn,availsyn=create_synpath_array(allsyncomp_list,syntype,model.param_syn.NumSyn[postype],prob=dend_prob,soma_loc=soma_loc)
                 log.info('  SYN TABLE for {} {} has {} slots to make {} synapses from {} ', postcell,syntype, len(syncomps),totalsyn,pretype)
                 connect_list[postcell][syntype][pretype]=connect_timetable(post_connections[syntype][pretype],syncomps,availsyn,model,netparams.mindelay[postype])
     return connect_list
                     
 def connect_neurons(cells, netparams, postype, model):
+    import moose
+    from moose_nerp.prototypes import syn_proto
+    from moose_nerp.prototypes.spines import NAME_HEAD
     print_cells=3
-    print('CONNECT_NEURONS, num cells',len(cells[postype]), ', a few cells', [cl for cl in cells[postype][0:print_cells]])
-    log.info('CONNECT set: {} {} {}', postype, cells[postype],netparams.connect_dict[postype])
+    log.info('CONNECT_NEURONS, num cells {}, a few cells {}',len(cells[postype]), cells[postype][0:print_cells])
+    log.debug('CONNECT set: {} {} {}', postype, cells[postype],netparams.connect_dict[postype])
     post_connections=netparams.connect_dict[postype]
     connect_list = {pc:{} for pc in cells[postype]}
     intra_conns={key:{k:[] for k in post_connections[key].keys()} for key in post_connections.keys()} #accumulate number of connections of each type to calculate mean
@@ -252,7 +353,9 @@ def connect_neurons(cells, netparams, postype, model):
         temp=cells[postype]
         cells[postype]=list([temp])
     synchan_shortage={k:{} for k in post_connections.keys()}
+    progress=logutil.ProgressReporter(log,'connect '+postype,len(cells[postype]))
     for ix,postcell in enumerate(cells[postype]):
+        progress.update()
         postsoma=postcell+'/'+model.param_cond.NAME_SOMA
         xpost=moose.element(postsoma).x
         ypost=moose.element(postsoma).y
@@ -265,13 +368,13 @@ def connect_neurons(cells, netparams, postype, model):
             #make a table of possible post-synaptic connections
             for pretype in post_connections[syntype].keys():
                 dend_prob=post_connections[syntype][pretype].dend_loc
-                allsyncomp_list=moose.wildcardFind(postcell+'/##/'+syntype+'[ISA=SynChan]')
+                allsyncomp_list=syn_proto.synchan_sites(postcell,syntype)
                 syncomps,totalsyn,availsyns=create_synpath_array(allsyncomp_list,syntype,model.param_syn.NumSyn[postype],prob=dend_prob,soma_loc=[xpost,ypost,zpost])
                 if ix<print_cells:
-                    print('    SYN TABLE for {} {} from {} has {} slots and {} synapses avail'.format( postsoma, syntype, pretype,len(syncomps),availsyns))
+                    log.debug('    SYN TABLE for {} {} from {} has {} slots and {} synapses avail', postsoma, syntype, pretype,len(syncomps),availsyns)
                 if 'extern' in pretype:
                     if ix<print_cells:
-                        print('## connect to tt',postcell,syntype,pretype,'from',post_connections[syntype][pretype].pre.filename)
+                        log.debug('## connect to tt {} {} {} from {}',postcell,syntype,pretype,post_connections[syntype][pretype].pre.filename)
                     ####### connect to time tables instead of other neurons in network
                     connect_list[postcell][syntype][pretype]=connect_timetable(post_connections[syntype][pretype],syncomps,availsyns,model,netparams.mindelay[postype])
                     #NEW METHOD
@@ -298,7 +401,7 @@ def connect_neurons(cells, netparams, postype, model):
                         elif post_connections[syntype][pretype].probability:
                             prob=post_connections[syntype][pretype].probability
                         else:
-                            print('need to specify either probability or space constant in param_net for', syntype,pretype)
+                            log.warning('need to specify either probability or space constant in param_net for {} {}', syntype,pretype)
                         connect=np.random.uniform()
                         log.debug('{} {} {} {} {} {}', presoma,postsoma,dist,fact,prob,connect)
                         #select a random number to determine whether a connection should occur
@@ -307,7 +410,7 @@ def connect_neurons(cells, netparams, postype, model):
                     if len(spikegen_conns):
                         num_conn=[max(np.random.poisson(post_connections[syntype][pretype].num_conns),1) for n in spikegen_conns]
                         if ix<print_cells:
-                            print('&& connect to neuron', postcell,syntype,'from',pretype,'num conns',num_conn)
+                            log.debug('&& connect to neuron {} {} from {} num conns {}', postcell,syntype,pretype,num_conn)
                         intra_conns[syntype][pretype].append(np.sum(num_conn))
                         #duplicate spikegens in list to match the length of the list syn_choices to be generated
                         for i in range(len(num_conn)-1,-1,-1):
@@ -316,32 +419,31 @@ def connect_neurons(cells, netparams, postype, model):
                         num_choices=min(len(spikegen_conns),availsyns)
                         if len(spikegen_conns)>availsyns:
                             if ix<print_cells:
-                                print('$$$$$$ uh oh, too few synapses on post-synaptic cell, need',len(spikegen_conns),', avail',availsyns)
+                                log.debug('$$$$$$ uh oh, too few synapses on post-synaptic cell, need {}, avail {}',len(spikegen_conns),availsyns)
                             synchan_shortage[syntype][postcell]=synchan_shortage[syntype][postcell]+len(spikegen_conns)-availsyns
                         #randomly select num_choices of synapses
                         if availsyns==0:
                             if ix<print_cells:
-                                print('$$$$$$$$$$$$$$$$ even worse, no available synapses on post-synaptic cell')
+                                log.debug('$$$$$$$$$$$$$$$$ even worse, no available synapses on post-synaptic cell')
                             syn_choices=[]
                         else:
                             syn_choices=np.random.choice([sc[0] for sc in syncomps],size=num_choices,replace=False,p=[sc[1] for sc in syncomps])
-                        log.debug('CONNECT: PRE {} POST {} ', spikegen_conns,syn_choices)
+                        log.debug('CONNECT: PRE {} POST {} ', logutil.lazy(lambda: [sg[0].path for sg in spikegen_conns]),syn_choices)
                         #connect the pre-synaptic spikegens to randomly chosen synapses
                         #print('** intrinsic synconns',pretype, 'one mindelay',netparams.mindelay[pretype],'all cond',netparams.cond_vel, 'num cons:',len(syn_choices))
                         for i,syn in enumerate(syn_choices):
+                                synconn(syn,spikegen_conns[i][2], spikegen_conns[i][0],model.param_syn,netparams.mindelay[pretype],netparams.cond_vel[pretype],stp=stp,weight=post_connections[syntype][pretype].weight)
                                 postbranch=util.syn_name(moose.element(syn).parent.path,NAME_HEAD)
                                 precell=spikegen_conns[i][0].parent.path.split('/')[2].split('[')[0]
                                 connect_list[postcell][syntype][precell+CONNECT_SEPARATOR+postbranch]={'presoma_loc':spikegen_conns[i][1],'dist':np.round(spikegen_conns[i][2],6)}
                                 log.debug('{}',connect_list[postcell][syntype])
-                                #connect the synapse
-                                #print('** intrinsic synconn',i,syn,spikegen_conns[i][2],spikegen_conns[i][0].path)
-                                synconn(syn,spikegen_conns[i][2], spikegen_conns[i][0],model.param_syn,netparams.mindelay[pretype],netparams.cond_vel[pretype],stp=stp,weight=post_connections[syntype][pretype].weight)
                     else:
                         intra_conns[syntype][pretype].append(0)
                         if len(cells[pretype]):
-                            print('   !!! no pre-synaptic cells selected for',postcell, 'from',pretype, 'connect=',connect,'>? prob=',prob,'or dist=0?',dist)
+                            log.debug('   !!! no pre-synaptic cells selected for {} from {} connect={} >? prob={} or dist=0? {}',postcell,pretype,connect,prob,dist)
                         else:
-                            print('   !!! no pre-synaptic cells selected for',postcell,' because no', pretype, 'in population')
+                            log.debug('   !!! no pre-synaptic cells selected for {} because no {} in population',postcell,pretype)
+    progress.done()
     for syn in intra_conns.keys():
         tmp=[(pre,np.sum(intra_conns[syn][pre])/float(len(cells[postype]))) for pre in intra_conns[syn].keys()]
         print('*************** number of intra-network connections to',postype, syn,'from\n',intra_conns[syn],'\nmean',tmp)
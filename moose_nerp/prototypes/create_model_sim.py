@@ -1,7 +1,6 @@
 # -*- coding:utf-8 -*-
 from __future__ import print_function, division
 import numpy as np
-import matplotlib.pyplot as plt
 from pprint import pprint
 import moose
 import logging
@@ -18,8 +17,10 @@ from moose_nerp.prototypes import (cell_proto,
                                    util,
                                    standard_options,
                                    constants,
-                                   print_params)
-from moose_nerp.graph import plot_channel, neuron_graph, spine_graph
+                                   profiling,
+                                   warm_start)
+#matplotlib and moose_nerp.graph are imported in the functions that plot,
+#so that simulations without graphs (e.g. worker processes) do not import them
 
 def setupLogging(model, level = logging.INFO):
     ### logging.basicConfig(level=level) ### basicConfig only works in __main__
@@ -28,6 +29,7 @@ def setupLogging(model, level = logging.INFO):
     return model.log
 
 @util.call_counter
+@profiling.profiled('setupOptions')
 def setupOptions(model, **kwargs):
     '''Can be called with no arguments except model. This will use the defaults
     in param_sim.py param_model_defaults.py and apply no overrides.
@@ -80,6 +82,9 @@ def setupOptions(model, **kwargs):
                            #change to (after checking with Dan)
                            model.param_stim.Stimulation.StimLoc.stim_dendrites[0])
 
+    # Record time, memory and moose objects of each phase if param_sim.profile
+    profiling.setup(param_sim)
+
     ######### Add any new code here to parse additional possible kwargs.
     ######### Be sure to pop any parsed kwarg from kwargs dictionary.
 
@@ -91,6 +96,7 @@ def setupOptions(model, **kwargs):
 
 
 #@util.call_counter
+@profiling.profiled()
 def setupNeurons(model, **kwargs):
     '''Creates neuron(s) defined by model.
 
@@ -133,7 +139,8 @@ def setupNeurons(model, **kwargs):
         print("Not simulating network; setting up simpaths and clocks in create_model_sim")
         simpaths=['/'+neurotype for neurotype in util.neurontypes(model.param_cond)]
         clocks.assign_clocks(simpaths, param_sim.simdt, param_sim.plotdt,
-                             param_sim.hsolve, model.param_cond.NAME_SOMA)
+                             param_sim.hsolve, model.param_cond.NAME_SOMA,
+                             clock_dt=clocks.clock_dt(param_sim))
         # Fix calculation of B parameter in CaConc if using hsolve
         if model.param_sim.hsolve and model.calYN:
             calcium.fix_calcium(util.neurontypes(model.param_cond), model)
@@ -145,6 +152,7 @@ def setupNeurons(model, **kwargs):
     return model
 
 
+@profiling.profiled()
 def setupStim(model,**kwargs):
     '''Setup the stimulation pulse generator. This function requires that the
     neurons and options have already been setup'''
@@ -156,6 +164,7 @@ def setupStim(model,**kwargs):
     model.pg, model.param_sim = pg, param_sim
     return model
 
+@profiling.profiled()
 def setupOutput(model, **kwargs):
     ###############--------------output elements
     (vmtab,
@@ -181,10 +190,13 @@ def setupOutput(model, **kwargs):
     model.currtab = currtab
 
     if model.log.logger.getEffectiveLevel() == logging.DEBUG:
+        from moose_nerp.prototypes import print_params
         for neur in model.neurons.keys():
             print_params.print_elem_params(model, neur, model.param_sim)
 
     if model.param_sim.plot_channels:
+        import matplotlib.pyplot as plt
+        from moose_nerp.graph import plot_channel
         plt.ion()
         if type(model.param_sim.plot_channels) is str:
             useChans = [model.param_sim.plot_channels] #Convert to list of len 1
@@ -232,10 +244,18 @@ def runOneSim(model, simtime=None, injection_current=None):
         print(u'◢◤◢◤◢◤◢◤ injection_current = {} ◢◤◢◤◢◤◢◤'.format(injection_current))
         model.pg.firstLevel = injection_current
     if simtime is None: simtime = model.param_sim.simtime
-    moose.reinit()
-    moose.start(simtime)
+    if getattr(model.param_sim, 'warm_start', False):
+        with profiling.phase('warm_start'):
+            warm_start.run(model, simtime)
+    else:
+        with profiling.phase('reinit'):
+            moose.reinit()
+        with profiling.phase('run'):
+            moose.start(simtime)
+    profiling.write_report()
 
 def stepRunPlot(model, **kwargs):
+    import matplotlib.pyplot as plt
     if 'neuron' in kwargs:
         mod = kwargs['neuron']
     else:
@@ -262,8 +282,17 @@ def stepRunPlot(model, **kwargs):
     #    mv.updateValues()
     #    plt.pause(.01)
 
-def runAll(model, plotIndividualInjections=False, writeWavesCSV=False, printParams = False):
+def _plotting():
+    #matplotlib and graph modules, imported only by runs that plot
+    import matplotlib.pyplot as plt
+    from moose_nerp.graph import neuron_graph, spine_graph
     plt.ion()
+    return plt, neuron_graph, spine_graph
+
+def runAll(model, plotIndividualInjections=False, writeWavesCSV=False, printParams = False):
+    plots = model.param_sim.plot_vm or model.param_sim.plot_current
+    if plots:
+        plt, neuron_graph, spine_graph = _plotting()
     if model.plasYN:
         plotIndividualInjections=True
     traces, names, catraces, current_traces, curr_names = [], [], [], [], []
@@ -327,7 +356,8 @@ def runAll(model, plotIndividualInjections=False, writeWavesCSV=False, printPara
                 plt.plot(ts,model.gatetables['gateztab'].vector,label='Z')
             plt.legend()
 
-    util.block_if_noninteractive()
+    if plots:
+        util.block_if_noninteractive()
     for st in model.spiketab:
           print("number of spikes", st.path, ' = ',len(st.vector))
 
@@ -13,69 +13,15 @@ from moose_nerp.prototypes import (pop_funcs,
                                    connect,
                                    check_connect,
                                    plasticity,
+                                   syn_proto,
                                    ttables,
+                                   net_planner,
+                                   profiling,
                                    logutil)
+#functions changing connect_dict, also used by net_planner without moose
+from moose_nerp.prototypes.connect import merge, dict_delete, change_connect, change_extern_files
 log = logutil.Logger()
 
-def merge(a, b, path=[]):
-    "merges b into a"
-    for key in b:
-        if key in a:
-            if isinstance(a[key], dict) and isinstance(b[key], dict):
-                merge(a[key], b[key], path + [str(key)])
-            elif a[key] == b[key]:
-                pass # same leaf value
-            else:
-                raise Exception('Conflict at %s' % '.'.join(path + [str(key)]))
-        else:
-            a[key] = b[key]
-    return a
-
-def dict_delete(a, delete, path=[]):
-    "deletes dictionary with key b from a"
-    for ntype in delete:
-        if ntype in a:
-            for syntype in delete[ntype]:
-                if syntype in a[ntype]:
-                    print('dict delete',ntype,syntype,delete[ntype][syntype])
-                    if isinstance (delete[ntype][syntype],str):
-                        del a[ntype][syntype][delete[ntype][syntype]]
-                    elif isinstance (delete[ntype][syntype],list):
-                        for pre in delete[ntype][syntype]:
-                            del a[ntype][syntype][pre]
-                    else:
-                        print('>>>>>>>> dict_delete,', delete[ntype][syntype], 'is neither string nor list. Write more code to handle this')
-                else:
-                    pass
-        else:
-            pass
-    return a
-
-def change_connect(connect_dict,change_dict):
-    for neurtype in change_dict.keys():
-        for syntype in change_dict[neurtype].keys():
-            for presyn,change_tuple in change_dict[neurtype][syntype].items():
-                #print('>>>>>> old connect ',connect_dict[neurtype][syntype][presyn])
-                if presyn in connect_dict[neurtype][syntype]:
-                    if change_tuple[0]=='space_const' or change_tuple[0]=='weight':
-                        oldvalue=connect_dict[neurtype][syntype][presyn].__getattribute__(change_tuple[0])
-                        connect_dict[neurtype][syntype][presyn].__setattr__(change_tuple[0],change_tuple[1]*oldvalue)
-                    else:
-                        connect_dict[neurtype][syntype][presyn].__setattr__(change_tuple[0],change_tuple[1])
-                    print('>>>>>> change connect, type= ', change_dict[neurtype][syntype][presyn][0],' :::',connect_dict[neurtype][syntype][presyn])
-                else:
-                    print('***** connection not found for ', neurtype,syntype,presyn,' other connections=',connect_dict[neurtype][syntype])
-                    
-    return connect_dict
-
-def change_extern_files(connect_dict,ttables):
-    for neurtype in ttables:
-        for syntype in ttables[neurtype]:
-            for presyn in ttables[neurtype][syntype]:
-                connect_dict[neurtype][syntype][presyn].pre=ttables[neurtype][syntype][presyn]
-                print('>>>>>>      new connect          ', connect_dict[neurtype][syntype][presyn])
-    return connect_dict
-
 def print_connect_dict(connect_dict):
     for key1,item1 in connect_dict.items():
         for key2,item2 in item1.items():
@@ -83,10 +29,14 @@ def print_connect_dict(connect_dict):
                 print('***connect_dict after merge and delete:',key1,key2,key3,item3)
     return
 
+@profiling.profiled()
 def create_network(model, param_net,neur_protos={},network_list=None,create_all=True):
     connections={}
     #
     conn_summary={}
+    #save synapse slots of prototypes, for planning networks without moose using net_planner
+    if getattr(param_net,'slot_summary_file',None):
+        net_planner.write_slot_summaries(model,param_net.slot_summary_file,[ntype for ntype in model.neurons.keys() if moose.exists(ntype)])
     if param_net.single:
         #create all timetables
         if create_all:
@@ -172,6 +122,14 @@ def create_network(model, param_net,neur_protos={},network_list=None,create_all=
     plascum={}
     if model.calYN and model.plasYN:
         for ntype in network_pop['pop'].keys():
-            plascum[ntype]=plasticity.addPlasticity(network_pop['pop'][ntype],model.CaPlasticityParams)
+            #only synapses with inputs and a sample of the others, for heterosynaptic plasticity
+            plascum[ntype]=plasticity.addPlasticity(network_pop['pop'][ntype],model.CaPlasticityParams,connections[ntype],
+                                                    getattr(param_net,'plas_nonstim_fraction',plasticity.NONSTIM_FRACTION))
+    #delete synchans that received no synapses, so they are not updated every time step
+    #(synapses with plasticity are kept; not needed if prototypes were created with model.lazy_synchans)
+    if getattr(param_net,'prune_synchans',False):
+        for cells in network_pop['pop'].values():
+            for cell in cells:
+                syn_proto.prune_synchans(cell)
     return network_pop, [connections, conn_summary],plascum
 
@@ -0,0 +1,322 @@
+"""\
+Resolution of channel gate tables.
+
+VMIN, VMAX, VDIVS, CAMIN, CAMAX and CADIVS of param_chan set the size of every
+gate table built by chan_proto, and thus table build time and memory (HSolve
+builds its own lookup tables, of hsolve.vDiv and hsolve.caDiv entries, which
+do not depend on them).  scan measures, for
+every gate of the model's Channels, the error of linear interpolation in
+tables of candidate sizes, relative to tables ref_factor times finer than
+the current tables, and recommends the smallest VDIVS and CADIVS for which
+all gates, including the 2D BK tables, are within an error budget.
+
+Errors are of the quantities that determine gating: the steady state
+(tableA/tableB, absolute error) and the time constant (1/tableB, relative
+error).  Gates with singularities are built as chan_proto.fix_singularities
+would build them at each resolution.
+
+    python -m moose_nerp.prototypes.gate_tables D1PatchSample5 --budget 1e-3 [--simulate] [--apply]
+
+--simulate compares a short current injection simulation with the current and
+recommended tables (requires moose); --apply writes VDIVS and CADIVS into param_chan.py
+"""
+from __future__ import print_function, division
+import os
+import re
+import time
+import importlib
+import importlib.util
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+from moose_nerp.prototypes.util import NamedDict
+from moose_nerp.prototypes.chan_proto import (AlphaBetaChannelParams,
+                                              StandardMooseTauInfChannelParams,
+                                              TauInfMinChannelParams,
+                                              ZChannelParams,
+                                              TwoD,
+                                              sigmoid_gate_tables,
+                                              ca_gate_tables,
+                                              bk_gating_matrix,
+                                              interpolate_values_in_table)
+log = logutil.Logger()
+
+#number of table entries linearized around singularities by chan_proto.fix_singularities
+FIX_WIDTH = 40
+BYTES = 8
+NUM_BK_SAMPLES = 100000
+
+def load_channel_params(modelname):
+    '''VMIN..CADIVS, Channels and Temp of model package (e.g. D1PatchSample5 or cells.d1d2),
+    read from param_chan.py and param_cond.py without importing the package (which needs moose)'''
+    spec = importlib.util.find_spec('moose_nerp.'+modelname)
+    pkgdir = os.path.dirname(spec.origin)
+    model = NamedDict('channel_params', modelname=modelname, pkgdir=pkgdir)
+    for name in ('param_chan', 'param_cond'):
+        fspec = importlib.util.spec_from_file_location('moose_nerp.{}.{}'.format(modelname, name),
+                                                       os.path.join(pkgdir, name+'.py'))
+        module = importlib.util.module_from_spec(fspec)
+        fspec.loader.exec_module(module)
+        for key in ('VMIN', 'VMAX', 'VDIVS', 'CAMIN', 'CAMAX', 'CADIVS', 'Channels', 'Temp'):
+            if hasattr(module, key):
+                model[key] = getattr(module, key)
+    return model
+
+def _ab(v, rate, B, C, vhalf, vslope):
+    #(rate + B * v) / (C + exp((v + vhalf) / vslope)), form of HHGate.setupAlpha and setupTau
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return (rate + B*v)/(C + np.exp((v+vhalf)/vslope))
+
+def voltage_gate_tables(params, v, fix_width=FIX_WIDTH):
+    '''tableA and tableB of voltage dependent gate on grid v, as built by chan_proto.make_gate'''
+    if isinstance(params, AlphaBetaChannelParams):
+        alpha = _ab(v, params.A_rate, params.A_B, params.A_C, params.A_vhalf, params.A_vslope)
+        beta = _ab(v, params.B_rate, params.B_B, params.B_C, params.B_vhalf, params.B_vslope)
+        tableA, tableB = alpha, alpha+beta
+        grid = NamedDict('grid', VMIN=v[0], VMAX=v[-1])
+        #same windows as fix_singularities, without changing params
+        if params.A_C < 0:
+            V_0 = params.A_vslope*np.log(-params.A_C)-params.A_vhalf
+            if v[0] < V_0 < v[-1]:
+                tableA = interpolate_values_in_table(grid, tableA, V_0, fix_width)
+                tableB = interpolate_values_in_table(grid, tableB, V_0, fix_width)
+        if params.B_C < 0:
+            V_0 = params.B_vslope*np.log(-params.B_C)-params.B_vhalf
+            if v[0] < V_0 < v[-1]:
+                tableB = interpolate_values_in_table(grid, tableB, V_0, fix_width)
+        return tableA, tableB
+    if isinstance(params, StandardMooseTauInfChannelParams):
+        tau = _ab(v, params.T_rate, params.T_B, params.T_C, params.T_vhalf, params.T_vslope)
+        inf = _ab(v, params.SS_rate, params.SS_B, params.SS_C, params.SS_vhalf, params.SS_vslope)
+        return inf/tau, 1/tau
+    if isinstance(params, TauInfMinChannelParams):
+        return sigmoid_gate_tables(params, v)
+    raise ValueError('unknown gate parameters {}'.format(params))
+
+def gates(model):
+    '''(channel, gate, kind, params) of every gate in model.Channels; kind is V, Ca or BK'''
+    for chan, chanparams in model.Channels.items():
+        if isinstance(chanparams, TwoD):
+            yield chan, 'X', 'BK', chanparams.X
+            continue
+        for gate in ('X', 'Y', 'Z'):
+            params = getattr(chanparams, gate)
+            #unused gates are empty lists
+            if getattr(chanparams.channel, gate+'pow') == 0 or not len(params):
+                continue
+            yield chan, gate, 'Ca' if isinstance(params, ZChannelParams) else 'V', params
+
+def _tables(kind, params, x, fix_width=FIX_WIDTH):
+    if kind == 'Ca':
+        return ca_gate_tables(params, x)
+    return voltage_gate_tables(params, x, fix_width)
+
+def table_error(refA, refB, A, B):
+    '''max absolute error of steady state A/B and max relative error of time constant 1/B'''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref_inf, inf = refA/refB, A/B
+        ref_tau, tau = 1/refB, 1/B
+        inf_err = np.abs(inf-ref_inf)
+        tau_err = np.abs(tau-ref_tau)/np.abs(ref_tau)
+    ok = np.isfinite(inf_err) & np.isfinite(tau_err)
+    if not np.any(ok):
+        return np.inf
+    return max(np.max(inf_err[ok]), np.max(tau_err[ok]))
+
+def gate_error(kind, params, divs, xmin, xmax, current_divs, ref_factor=4):
+    '''error of linear interpolation in table of divs entries, relative to table ref_factor finer than current_divs'''
+    ref_divs = ref_factor*(current_divs-1)+1
+    x_ref = np.linspace(xmin, xmax, ref_divs)
+    #singularity window as wide (in mV) as in the current tables
+    refA, refB = _tables(kind, params, x_ref, FIX_WIDTH*ref_factor)
+    x = np.linspace(xmin, xmax, divs)
+    A, B = _tables(kind, params, x)
+    return table_error(refA, refB, np.interp(x_ref, x, A), np.interp(x_ref, x, B))
+
+def _bilinear(table, xmin, xmax, ymin, ymax, x, y):
+    nx, ny = table.shape
+    fx = np.clip((x-xmin)/(xmax-xmin)*(nx-1), 0, nx-1)
+    fy = np.clip((y-ymin)/(ymax-ymin)*(ny-1), 0, ny-1)
+    ix = np.minimum(fx.astype(int), nx-2)
+    iy = np.minimum(fy.astype(int), ny-2)
+    wx, wy = fx-ix, fy-iy
+    return (table[ix, iy]*(1-wx)*(1-wy) + table[ix+1, iy]*wx*(1-wy)
+            + table[ix, iy+1]*(1-wx)*wy + table[ix+1, iy+1]*wx*wy)
+
+def bk_error(params, model, vdivs, cadivs, num_samples=NUM_BK_SAMPLES, seed=1):
+    '''error of bilinear interpolation in BK tables, relative to the gating functions at random
+    voltages (uniform) and calcium concentrations (log uniform, resolving low concentrations)'''
+    rng = np.random.RandomState(seed)
+    v = rng.uniform(model.VMIN, model.VMAX, num_samples)
+    ca = np.exp(rng.uniform(np.log(max(model.CAMIN, 1e-9)), np.log(model.CAMAX), num_samples))
+    refA, refB = bk_gating_matrix(params, v, ca, model.Temp)
+    v_array = np.linspace(model.VMIN, model.VMAX, vdivs)
+    ca_array = np.linspace(model.CAMIN, model.CAMAX, cadivs)
+    A, B = bk_gating_matrix(params, v_array[:, None], ca_array[None, :], model.Temp)
+    return table_error(refA, refB,
+                       _bilinear(A, model.VMIN, model.VMAX, model.CAMIN, model.CAMAX, v, ca),
+                       _bilinear(B, model.VMIN, model.VMAX, model.CAMIN, model.CAMAX, v, ca))
+
+def candidate_divs(divs, min_divs=51):
+    '''current divs and successive halvings of the step size, smallest first'''
+    candidates = []
+    k = 0
+    while True:
+        num = int((divs-1)/2**k)+1
+        if num < min_divs and k > 0:
+            break
+        candidates.append(num)
+        k += 1
+    return sorted(set(candidates))
+
+def table_memory(model, vdivs, cadivs):
+    '''bytes of library (chan_proto) gate tables'''
+    one_d = sum(2*(vdivs if kind == 'V' else cadivs)*BYTES for _, _, kind, _ in gates(model) if kind != 'BK')
+    two_d = sum(2*vdivs*cadivs*BYTES for _, _, kind, _ in gates(model) if kind == 'BK')
+    return {'library_bytes': one_d+two_d}
+
+def build_time(model, vdivs, cadivs):
+    '''seconds to calculate all gate tables, the numerical part of chan_proto.chanlib'''
+    start = time.perf_counter()
+    v = np.linspace(model.VMIN, model.VMAX, vdivs)
+    ca = np.linspace(model.CAMIN, model.CAMAX, cadivs)
+    for chan, gate, kind, params in gates(model):
+        if kind == 'BK':
+            bk_gating_matrix(params, v[:, None], ca[None, :], model.Temp)
+        else:
+            _tables(kind, params, ca if kind == 'Ca' else v)
+    return time.perf_counter()-start
+
+def _smallest(candidates, errors, budget):
+    for divs in candidates:
+        if errors[divs] <= budget:
+            return divs
+    return candidates[-1]
+
+def scan(model, budget=1e-3, ref_factor=4, vdivs_candidates=None, cadivs_candidates=None):
+    '''errors of all gates for candidate VDIVS and CADIVS and the smallest tables within budget.
+    model: from load_channel_params'''
+    vdivs_candidates = vdivs_candidates or candidate_divs(model.VDIVS)
+    cadivs_candidates = cadivs_candidates or candidate_divs(model.CADIVS)
+    errors = {}
+    v_err = {d: 0 for d in vdivs_candidates}
+    ca_err = {d: 0 for d in cadivs_candidates}
+    for chan, gate, kind, params in gates(model):
+        if kind == 'V':
+            errors[(chan, gate)] = {d: gate_error(kind, params, d, model.VMIN, model.VMAX, model.VDIVS, ref_factor)
+                                    for d in vdivs_candidates}
+            v_err = {d: max(v_err[d], errors[(chan, gate)][d]) for d in vdivs_candidates}
+        elif kind == 'Ca':
+            errors[(chan, gate)] = {d: gate_error(kind, params, d, model.CAMIN, model.CAMAX, model.CADIVS, ref_factor)
+                                    for d in cadivs_candidates}
+            ca_err = {d: max(ca_err[d], errors[(chan, gate)][d]) for d in cadivs_candidates}
+    vdivs = _smallest(vdivs_candidates, v_err, budget)
+    cadivs = _smallest(cadivs_candidates, ca_err, budget)
+    #2D tables: smallest table (vdivs x cadivs) no smaller than 1D choices within budget
+    bk = [(chan, params) for chan, gate, kind, params in gates(model) if kind == 'BK']
+    if bk:
+        combos = sorted([(v, c) for v in vdivs_candidates for c in cadivs_candidates if v >= vdivs and c >= cadivs],
+                        key=lambda vc: (vc[0]*vc[1], vc))
+        for v, c in combos:
+            bk_errs = {chan: bk_error(params, model, v, c) for chan, params in bk}
+            for chan, err in bk_errs.items():
+                errors.setdefault((chan, 'X'), {})[(v, c)] = err
+            if max(bk_errs.values()) <= budget:
+                vdivs, cadivs = v, c
+                break
+        else:
+            vdivs, cadivs = vdivs_candidates[-1], cadivs_candidates[-1]
+    result = {'budget': budget, 'current': (model.VDIVS, model.CADIVS), 'recommended': (vdivs, cadivs),
+              'errors': errors, 'kinds': {(chan, gate): kind for chan, gate, kind, _ in gates(model)}, 'vdivs_error': v_err, 'cadivs_error': ca_err}
+    for key, (v, c) in (('current', result['current']), ('recommended', result['recommended'])):
+        result[key+'_memory'] = table_memory(model, v, c)
+        result[key+'_build_sec'] = build_time(model, v, c)
+    return result
+
+def report(result):
+    lines = ['error budget {}'.format(result['budget'])]
+    lines += ['  VDIVS {:6d}: max error {:.3g}'.format(d, e) for d, e in sorted(result['vdivs_error'].items())]
+    lines += ['  CADIVS {:6d}: max error {:.3g}'.format(d, e) for d, e in sorted(result['cadivs_error'].items())]
+    for key in ('current', 'recommended'):
+        mem = result[key+'_memory']
+        lines.append('{:11s} VDIVS={} CADIVS={}: library tables {:.1f} MB, build {:.3f} sec'.format(
+            key, result[key][0], result[key][1], mem['library_bytes']/1e6, result[key+'_build_sec']))
+    vdivs, cadivs = result['recommended']
+    for (chan, gate), errors in sorted(result['errors'].items()):
+        key = {'V': vdivs, 'Ca': cadivs, 'BK': (vdivs, cadivs)}[result['kinds'][(chan, gate)]]
+        err = errors.get(key)
+        if err is not None and err > result['budget']:
+            lines.append('  {} {} gate: error {:.3g} exceeds budget at recommended size'.format(chan, gate, err))
+    if 'simulation' in result:
+        sim = result['simulation']
+        lines.append('simulation: max Vm difference {:.3g} mV, spikes {} vs {}, run {:.2f} vs {:.2f} sec'.format(
+            sim['max_dVm']*1e3, sim['current']['spikes'], sim['recommended']['spikes'],
+            sim['current']['wall_sec'], sim['recommended']['wall_sec']))
+    return '\n'.join(lines)
+
+################ reference simulation, in a fresh process for each table size
+def _reference_sim(modelname, vdivs, cadivs, simtime, inj):
+    import moose
+    from moose_nerp.prototypes import create_model_sim
+    model = importlib.import_module('moose_nerp.'+modelname)
+    model.VDIVS, model.CADIVS = vdivs, cadivs
+    np.random.seed(1)
+    moose.seed(1)
+    create_model_sim.setupOptions(model, simtime=simtime, plot_vm=False, plot_channels=False,
+                                  save=False, save_txt=False, stim_paradigm='inject')
+    start = time.perf_counter()
+    create_model_sim.setupAll(model)
+    setup = time.perf_counter()-start
+    start = time.perf_counter()
+    create_model_sim.runOneSim(model, simtime=simtime, injection_current=inj)
+    vm = np.array(list(model.vmtab.values())[0][0].vector)
+    return {'vm': vm, 'spikes': int(np.sum((vm[1:] >= 0) & (vm[:-1] < 0))),
+            'setup_sec': setup, 'wall_sec': time.perf_counter()-start}
+
+def simulate(result, modelname, simtime=0.3, inj=0.3e-9):
+    '''run current injection with current and recommended tables, adds comparison to result'''
+    import multiprocessing
+    runs = {}
+    for key in ('current', 'recommended'):
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            runs[key] = pool.apply(_reference_sim, (modelname,)+tuple(result[key])+(simtime, inj))
+    n = min(len(runs['current']['vm']), len(runs['recommended']['vm']))
+    runs['max_dVm'] = float(np.max(np.abs(runs['current']['vm'][:n]-runs['recommended']['vm'][:n])))
+    result['simulation'] = runs
+    return result
+
+def apply(model, vdivs, cadivs, budget):
+    '''write VDIVS and CADIVS into param_chan.py of model'''
+    fname = os.path.join(model.pkgdir, 'param_chan.py')
+    with open(fname) as f:
+        text = f.read()
+    for name, value in (('VDIVS', vdivs), ('CADIVS', cadivs)):
+        text, num = re.subn(r'^{}\s*=.*$'.format(name),
+                            '{} = {} #gate_tables, error budget {}'.format(name, value, budget), text, flags=re.M)
+        if num != 1:
+            raise ValueError('{} not found in {}'.format(name, fname))
+    with open(fname, 'w') as f:
+        f.write(text)
+    log.info('{}: VDIVS={} CADIVS={}', fname, vdivs, cadivs)
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='recommend VDIVS and CADIVS of a model package')
+    parser.add_argument('model', help='model package, e.g. D1PatchSample5 or cells.d1d2')
+    parser.add_argument('--budget', type=float, default=1e-3,
+                        help='max error of steady state (absolute) and time constant (relative)')
+    parser.add_argument('--ref-factor', type=int, default=4)
+    parser.add_argument('--simulate', action='store_true', help='compare current injection simulations (requires moose)')
+    parser.add_argument('--apply', action='store_true', help='write recommended VDIVS and CADIVS into param_chan.py')
+    opts = parser.parse_args(args)
+    model = load_channel_params(opts.model)
+    result = scan(model, opts.budget, opts.ref_factor)
+    if opts.simulate:
+        simulate(result, opts.model)
+    print(report(result))
+    if opts.apply:
+        apply(model, result['recommended'][0], result['recommended'][1], opts.budget)
+    return result
+
+if __name__ == '__main__':
+    main()
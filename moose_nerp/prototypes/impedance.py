@@ -0,0 +1,195 @@
+"""\
+Input and transfer impedances of a neuron computed from its cable equations,
+instead of simulating current steps or chirps.
+
+The compartments of a neuron built by cell_proto (including explicit spines
+and spine compensation) give the sparse conductance matrix G and capacitances
+C; the voltage at all compartments for a unit current at one of them is the
+solution of (G + i*2*pi*f*C) V = I, solved for all frequencies and input
+compartments at once.  With active=True, channel conductances are linearized
+at the resting potential (initVm): the conductance open at rest, plus a term
+for each X and Y gate relaxing with its time constant (quasi-active cable).
+Calcium dependent Z gates are frozen at their current state, so call
+moose.reinit() first if they matter.
+
+    cable = impedance.Cable.from_neuron('/D1', active=True)
+    rin = cable.input_resistance()
+    tau = cable.time_constants(3)
+    Z = cable.impedance(np.logspace(0, 3, 50), inputs=[cable.index('/D1/soma')])
+
+Variants of passive parameters and channel densities are computed without moose:
+    for rm in np.linspace(0.5, 2, 100):
+        rin = cable.scaled(RM=rm, gbar={'KaS': 2}).input_resistance()
+"""
+from __future__ import print_function, division
+import copy
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+from moose_nerp.prototypes import logutil
+log = logutil.Logger()
+
+def _gate_state(gate, v):
+    #steady state, time constant and slope of steady state of moose HHGate at v
+    vtab = np.linspace(gate.min, gate.max, len(gate.tableA))
+    A, B = np.asarray(gate.tableA), np.asarray(gate.tableB)
+    inf = np.interp(v, vtab, A/B)
+    dv = vtab[1]-vtab[0]
+    slope = (np.interp(v+dv, vtab, A/B)-np.interp(v-dv, vtab, A/B))/(2*dv)
+    return inf, 1/np.interp(v, vtab, B), slope
+
+def channel_terms(chan, v):
+    '''conductance at v, and (amplitude, tau) of the admittance of each voltage gate of a moose HHChannel:
+    y(f) = g + sum amplitude/(1+i*2*pi*f*tau)'''
+    import moose
+    gates, terms = [], []
+    for name in ('X', 'Y'):
+        power = getattr(chan, name+'power')
+        if power > 0:
+            gates.append((power,)+_gate_state(moose.element(chan.path+'/gate'+name), v))
+    open_prob = np.prod([inf**power for power, inf, _, _ in gates]) if gates else 1.0
+    if chan.Zpower > 0:
+        open_prob *= chan.Z**chan.Zpower
+    for power, inf, tau, slope in gates:
+        if inf > 0:
+            terms.append((chan.Gbar*(v-chan.Ek)*open_prob*power/inf*slope, tau))
+    return chan.Gbar*open_prob, terms
+
+class Cable(object):
+    '''Compartments with membrane conductance gm, capacitance cm, index of parent (-1 for root)
+    and axial resistance ra to the parent (asymmetric compartments, as moose.Compartment)'''
+    def __init__(self, names, gm, cm, parent, ra):
+        self.names = list(names)
+        self.gm = np.asarray(gm, dtype=float)
+        self.cm = np.asarray(cm, dtype=float)
+        self.parent = np.asarray(parent, dtype=int)
+        self.ra = np.asarray(ra, dtype=float)
+        #linearized channels: compartment, name, conductance at rest; gate terms: channel, amplitude, tau
+        self.chan_comp = np.zeros(0, dtype=int)
+        self.chan_name = []
+        self.chan_g = np.zeros(0)
+        self.term_chan = np.zeros(0, dtype=int)
+        self.term_amp = np.zeros(0)
+        self.term_tau = np.zeros(0)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_neuron(cls, neuron, active=False, vrest=None):
+        '''cable of all compartments of neuron, e.g. /D1, including spines;
+        active: linearize HHChannels at vrest (default initVm of each compartment)'''
+        import moose
+        comps = [moose.element(c) for c in moose.wildcardFind(neuron+'/##[ISA=CompartmentBase]')]
+        index = {c.path: i for i, c in enumerate(comps)}
+        parent = []
+        for c in comps:
+            up = [p for p in c.neighbors['handleAxial'] if p.path in index]
+            parent.append(index[up[0].path] if up else -1)
+        cable = cls([c.path for c in comps], [1/c.Rm for c in comps], [c.Cm for c in comps],
+                    parent, [c.Ra for c in comps])
+        if active:
+            chan_comp, chan_name, chan_g, term_chan, term_amp, term_tau = [], [], [], [], [], []
+            for i, c in enumerate(comps):
+                v = c.initVm if vrest is None else vrest
+                for chan in moose.wildcardFind(c.path+'/#[ISA=HHChannel]'):
+                    g, terms = channel_terms(moose.element(chan), v)
+                    for amp, tau in terms:
+                        term_chan.append(len(chan_g))
+                        term_amp.append(amp)
+                        term_tau.append(tau)
+                    chan_comp.append(i)
+                    chan_name.append(chan.name)
+                    chan_g.append(g)
+            cable.chan_comp, cable.chan_name, cable.chan_g = np.array(chan_comp, dtype=int), chan_name, np.array(chan_g)
+            cable.term_chan, cable.term_amp, cable.term_tau = np.array(term_chan, dtype=int), np.array(term_amp), np.array(term_tau)
+            log.info('{}: {} compartments, {} channels linearized', neuron, len(comps), len(chan_g))
+        return cable
+
+    def index(self, name):
+        '''index of compartment name (a path, or the end of a path, e.g. soma)'''
+        if name in self.names:
+            return self.names.index(name)
+        matches = [i for i, n in enumerate(self.names) if n.endswith('/'+name)]
+        if len(matches) != 1:
+            raise ValueError('{} matches {} compartments'.format(name, len(matches)))
+        return matches[0]
+
+    def scaled(self, RM=1, CM=1, RA=1, gbar=None):
+        '''copy with specific resistances and capacitance multiplied by RM, CM, RA and
+        channel conductances multiplied by gbar {channel name: factor}'''
+        new = copy.copy(self)
+        new.gm, new.cm, new.ra = self.gm/RM, self.cm*CM, self.ra*RA
+        if gbar:
+            factor = np.array([gbar.get(name, 1) for name in self.chan_name])
+            new.chan_g = self.chan_g*factor
+            new.term_amp = self.term_amp*factor[self.term_chan]
+        return new
+
+    def _axial(self):
+        child = np.where(self.parent >= 0)[0]
+        ga = 1/self.ra[child]
+        n = len(self)
+        A = sparse.coo_matrix((np.concatenate([-ga, -ga]),
+                               (np.concatenate([child, self.parent[child]]), np.concatenate([self.parent[child], child]))),
+                              shape=(n, n)).tocsc()
+        return A, -np.asarray(A.sum(axis=1)).ravel()
+
+    def admittance(self, freq):
+        '''membrane admittance of each compartment at freq, without capacitance'''
+        y = self.gm+np.bincount(self.chan_comp, self.chan_g, len(self)).astype(complex)
+        if len(self.term_amp):
+            gates = self.term_amp/(1+2j*np.pi*freq*self.term_tau)
+            y += np.bincount(self.chan_comp[self.term_chan], gates.real, len(self))
+            y += 1j*np.bincount(self.chan_comp[self.term_chan], gates.imag, len(self))
+        return y
+
+    def impedance(self, freqs, inputs=None, outputs=None):
+        '''Z[f, out, in]: voltage at compartments outputs (default all) for unit current at inputs
+        (default all), at each of freqs (Hz); one block diagonal sparse solve for all frequencies'''
+        freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+        n = len(self)
+        inputs = np.arange(n) if inputs is None else np.atleast_1d(inputs)
+        outputs = np.arange(n) if outputs is None else np.atleast_1d(outputs)
+        A, diag = self._axial()
+        blocks = [A+sparse.diags(diag+self.admittance(f)+2j*np.pi*f*self.cm) for f in freqs]
+        rhs = np.zeros((n*len(freqs), len(inputs)), dtype=complex)
+        for k in range(len(freqs)):
+            rhs[k*n+inputs, np.arange(len(inputs))] = 1
+        V = splinalg.splu(sparse.block_diag(blocks, format='csc')).solve(rhs)
+        return V.reshape(len(freqs), n, len(inputs))[:, outputs, :]
+
+    @property
+    def root(self):
+        '''index of the compartment without parent, e.g. the soma'''
+        return int(np.where(self.parent < 0)[0][0])
+
+    def input_impedance(self, freqs, comp=None):
+        comp = self.root if comp is None else comp
+        return self.impedance(freqs, [comp], [comp])[:, 0, 0]
+
+    def transfer_impedance(self, freqs, source, target=None):
+        '''voltage at target (default the root, i.e. soma) for unit current at source, e.g. a spine head'''
+        target = self.root if target is None else target
+        return self.impedance(freqs, [source], [target])[:, 0, 0]
+
+    def input_resistance(self, comp=None):
+        return self.input_impedance(0, comp)[0].real
+
+    def time_constants(self, num=1):
+        '''num slowest time constants of the passive (or linearized at zero frequency) cable'''
+        A, diag = self._axial()
+        G = A+sparse.diags(diag+self.admittance(0).real)
+        scale = sparse.diags(1/np.sqrt(self.cm))
+        M = (scale*G*scale).tocsc()
+        if len(self) <= num+1 or len(self) < 100:
+            eig = np.linalg.eigvalsh(M.toarray())[:num]
+        else:
+            eig = np.sort(splinalg.eigsh(M, k=num, sigma=0, return_eigenvectors=False))
+        return 1/eig
+
+    def resonance(self, freqs, comp=None):
+        '''frequency of maximal amplitude of input impedance, and that amplitude'''
+        amp = np.abs(self.input_impedance(freqs, comp))
+        return freqs[np.argmax(amp)], np.max(amp)
@@ -1,6 +1,24 @@
-import inspect
+import sys
+import time
 import logging
 
+FORMAT = '%(process)d - %(filename)s - %(lineno)d - %(funcName)s - %(levelname)s - %(message)s' #SRIRAM 02152018
+_configured = False
+_STACKLEVEL = sys.version_info >= (3, 8)
+
+class lazy(object):
+    '''argument evaluated only when the message is formatted, e.g.
+    log.debug('{} synapses', lazy(lambda: len(moose.wildcardFind(path))))'''
+    __slots__ = ('func',)
+    def __init__(self, func):
+        self.func = func
+
+    def __format__(self, spec):
+        return format(self.func(), spec)
+
+    def __str__(self):
+        return str(self.func())
+
 class Message(object):
     def __init__(self, fmt, args):
         self.fmt = fmt
@@ -16,6 +34,9 @@ class StyleAdapter(logging.LoggerAdapter):
     def log(self, level, msg, *args, **kwargs):
         if self.isEnabledFor(level):
             msg, kwargs = self.process(msg, kwargs)
+            if _STACKLEVEL:
+                #report file and line of the caller of debug/info, not of this adapter
+                kwargs.setdefault('stacklevel', 3)
             self.logger._log(level, Message(msg, args), (), **kwargs)
 
     def debug(self, *args, **kwargs):
@@ -27,14 +48,53 @@ class StyleAdapter(logging.LoggerAdapter):
     def error(self, *args, **kwargs):
         return self.log(logging.ERROR, *args, **kwargs)
 
+class ProgressReporter(object):
+    '''Reports progress of a loop at most once every interval seconds (and when done),
+    instead of printing every iteration:
+        progress = logutil.ProgressReporter(log, 'connect D1', len(cells))
+        for cell in cells:
+            ...
+            progress.update()
+        progress.done()
+    '''
+    def __init__(self, logger, name, total=None, interval=2.0, level=logging.INFO):
+        self.logger = logger
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.level = level
+        self.count = 0
+        self.start = self.last = time.time()
+        self.enabled = logger.isEnabledFor(level)
+
+    def update(self, num=1):
+        self.count += num
+        if not self.enabled:
+            return
+        now = time.time()
+        if now-self.last >= self.interval:
+            self.last = now
+            self._report(now)
+
+    def _report(self, now, status='progress'):
+        #line of the loop calling update or done
+        kwargs = {'stacklevel': 4} if _STACKLEVEL else {}
+        if self.total:
+            self.logger.log(self.level, '{} {}: {}/{} ({:.0f}%) in {:.1f} sec', self.name, status,
+                            self.count, self.total, 100.0*self.count/self.total, now-self.start, **kwargs)
+        else:
+            self.logger.log(self.level, '{} {}: {} in {:.1f} sec', self.name, status, self.count, now-self.start, **kwargs)
+
+    def done(self):
+        if self.enabled:
+            self._report(time.time(), 'done')
+
 def Logger(name=None):
+    global _configured
     if name is None:
-        frame = inspect.stack()[1]
-        mod = inspect.getmodule(frame[0])
-        if mod is not None:
-            name = mod.__name__
-        else:
-            name = '__main__'
-    FORMAT = '%(process)d - %(filename)s - %(lineno)d - %(funcName)s - %(levelname)s - %(message)s' #SRIRAM 02152018
-    logging.basicConfig(format=FORMAT)
+        #module name of caller, without inspect.stack, which reads source of every frame
+        name = sys._getframe(1).f_globals.get('__name__', '__main__')
+    if not _configured:
+        logging.basicConfig(format=FORMAT)
+        _configured = True
     return StyleAdapter(logging.getLogger(name))
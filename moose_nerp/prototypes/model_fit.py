@@ -0,0 +1,278 @@
+"""\
+Parallel fitting of model parameters to target traces or features, e.g. to
+refit d1opt.
+
+Free parameters are given as paths into the parameter modules of the model:
+    Condset.D1.KaS.prox       conductance of KaS in region prox (a key of param_cond) of D1
+    Channels.KaS.X.A_vhalf    any field of the X, Y or Z gate parameters of a channel
+    Channels.KaS.X.vshift     shift of all vhalf fields of the gate (V, positive is depolarized)
+
+    free = [model_fit.FreeParam('Condset.D1.KaS.prox', 10, 500),
+            model_fit.FreeParam('Channels.KaS.X.vshift', -10e-3, 10e-3)]
+    target = model_fit.Target.from_traces(injections, t, vm, delay=0.2, width=0.4)
+    fit = model_fit.Fit('d1opt', 'D1', free, target, simtime=0.8)
+    result = model_fit.optimize(fit, generations=100, checkpoint='d1opt_fit.pkl')
+
+Each worker process builds the model once and, for every candidate, only
+changes conductances of existing channels (scaled, so spine compensation is
+kept) and recomputes gate tables of the library prototypes, which are shared
+by the channels of the neuron.  HSolve copies gate tables when it is
+created, so fits with free gate parameters use exponential Euler.
+
+The optimizer is differential evolution on the unit cube of parameter
+ranges.  Evaluations are cached by parameter values, and population, cache
+and random state are written to the checkpoint file after each generation,
+so that an interrupted fit continues from the last generation.
+"""
+from __future__ import print_function, division
+import os
+import copy
+import time
+import pickle
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+from moose_nerp.prototypes.util import NamedList
+log = logutil.Logger()
+
+FreeParam = NamedList('FreeParam', 'path low high')
+
+#error of one unit of each feature is (feature difference/scale)**2
+FEATURE_SCALE = {'rest': 2e-3, 'steady': 2e-3, 'spikes': 1, 'latency': 5e-3, 'ap_peak': 5e-3, 'isi': 5e-3}
+#error of a feature that is missing (e.g. latency without spikes) in target or model, but not both
+MISSING_ERROR = 25
+
+def trace_features(t, vm, delay, width):
+    '''features of the response to one current injection pulse'''
+    t, vm = np.asarray(t), np.asarray(vm)
+    before = vm[t < delay]
+    during = (t >= delay) & (t < delay+width)
+    rest = np.mean(before) if len(before) else vm[0]
+    up = np.where(during[1:] & (vm[1:] >= 0) & (vm[:-1] < 0))[0]+1
+    spike_times = t[up]
+    last = during & (t >= delay+0.8*width)
+    return {'rest': rest,
+            'steady': np.mean(vm[last])-rest if np.any(last) else np.nan,
+            'spikes': len(up),
+            'latency': spike_times[0]-delay if len(up) else np.nan,
+            'isi': np.mean(np.diff(spike_times)) if len(up) > 1 else np.nan,
+            'ap_peak': np.max(vm[during]) if len(up) else np.nan}
+
+def feature_error(sim, target, weights=None):
+    '''sum of squared scaled differences of the features of target'''
+    err = 0
+    for name, value in target.items():
+        w = (weights or {}).get(name, 1)
+        if np.isnan(value) and np.isnan(sim[name]):
+            continue
+        if np.isnan(value) or np.isnan(sim[name]):
+            err += w*MISSING_ERROR
+        else:
+            err += w*((sim[name]-value)/FEATURE_SCALE[name])**2
+    return err
+
+class Target(object):
+    '''features (dicts) of the responses to each injection current, and optionally traces'''
+    def __init__(self, injections, features, delay, width, traces=None, trace_weight=0, weights=None):
+        self.injections = list(injections)
+        self.features = features
+        self.delay = delay
+        self.width = width
+        self.traces = traces
+        self.trace_weight = trace_weight
+        self.weights = weights
+
+    @classmethod
+    def from_traces(cls, injections, t, vm, delay, width, trace_weight=0, features=None, weights=None):
+        '''vm: one trace per injection, sampled at times t; features: names of features to fit
+        (default all); trace_weight: weight of the rms difference of traces (in mV)'''
+        feats = [trace_features(t, v, delay, width) for v in vm]
+        if features is not None:
+            feats = [{k: f[k] for k in features} for f in feats]
+        return cls(injections, feats, delay, width, (np.asarray(t), [np.asarray(v) for v in vm]), trace_weight, weights)
+
+    def error(self, t, vms):
+        feats = [trace_features(t, v, self.delay, self.width) for v in vms]
+        err = sum(feature_error(f, target, self.weights) for f, target in zip(feats, self.features))
+        if self.trace_weight and self.traces is not None:
+            tt, tvm = self.traces
+            err += self.trace_weight*np.mean([np.sqrt(np.mean((np.interp(tt, t, v)-tv)**2))*1e3
+                                              for v, tv in zip(vms, tvm)])
+        return err, feats
+
+class Fit(object):
+    '''what to fit: model package, neuron type, free parameters, target and simulation options'''
+    def __init__(self, modelname, ntype, free, target, simtime=None, hsolve=True):
+        self.modelname = modelname
+        self.ntype = ntype
+        self.free = [FreeParam(*p) for p in free]
+        self.target = target
+        self.simtime = simtime
+        self.hsolve = hsolve and not any(p.path.startswith('Channels.') for p in self.free)
+        self.low = np.array([p.low for p in self.free], dtype=float)
+        self.high = np.array([p.high for p in self.free], dtype=float)
+
+    def values(self, u):
+        return self.low+np.asarray(u)*(self.high-self.low)
+
+def _gate_fields(params, field, value):
+    #vshift: sign of vhalf is v+vhalf for alpha beta and tau inf forms, v-vhalf for TauInfMin
+    from moose_nerp.prototypes.chan_proto import TauInfMinChannelParams
+    if field != 'vshift':
+        setattr(params, field, value)
+        return
+    sign = 1 if isinstance(params, TauInfMinChannelParams) else -1
+    for name in params._fields:
+        if name.endswith('vhalf'):
+            setattr(params, name, getattr(params, name)+sign*value)
+
+class Evaluator(object):
+    '''model of one worker: built once, parameters changed for every candidate'''
+    def __init__(self, fit):
+        import importlib
+        from moose_nerp.prototypes import create_model_sim
+        self.fit = fit
+        self.model = model = importlib.import_module('moose_nerp.'+fit.modelname)
+        model.synYN = False
+        model.plasYN = False
+        create_model_sim.setupOptions(model, simtime=fit.simtime or model.param_sim.simtime,
+                                      injection_delay=fit.target.delay, injection_width=fit.target.width,
+                                      plot_vm=False, plot_current=False, plot_channels=False,
+                                      save=False, save_txt=False, stim_paradigm='inject')
+        model.param_sim.hsolve = fit.hsolve
+        create_model_sim.setupAll(model)
+        self.base_gates = {name: copy.deepcopy(params) for name, params in model.Channels.items()}
+        self.gbar = {}
+        self.gates = set()
+        for p in fit.free:
+            parts = p.path.split('.')
+            if parts[0] == 'Condset':
+                _, ntype, chan, region = parts
+                base = model.Condset[ntype][chan][getattr(model.param_cond, region)]
+                if not base:
+                    raise ValueError('{}: conductance is 0 in {}, so there are no channels to change'.format(p.path, fit.modelname))
+                #Gbar of each channel as built, so candidates are scaled from it, not from the previous candidate
+                self.gbar[p.path] = (base, [(c, c.Gbar) for c in self._channels(ntype, chan, getattr(model.param_cond, region))])
+            elif parts[0] == 'Channels':
+                self.gates.add(parts[1])
+            else:
+                raise ValueError('unknown free parameter {}'.format(p.path))
+
+    def _channels(self, ntype, chan, region):
+        import moose
+        from moose_nerp.prototypes.util import distance_mapping
+        comps = [moose.element(c) for c in moose.wildcardFind('/{}/#[ISA=CompartmentBase]'.format(ntype))]
+        return [moose.element(c.path+'/'+chan) for c in comps
+                if distance_mapping({region: 1}, c) and moose.exists(c.path+'/'+chan)]
+
+    def update(self, values):
+        gates = {}
+        for p, value in zip(self.fit.free, values):
+            parts = p.path.split('.')
+            if parts[0] == 'Condset':
+                base, chans = self.gbar[p.path]
+                for chan, base_gbar in chans:
+                    chan.Gbar = base_gbar*value/base
+            else:
+                _, chan, gate, field = parts
+                params = gates.setdefault(chan, copy.deepcopy(self.base_gates[chan]))
+                _gate_fields(getattr(params, gate), field, value)
+        if not gates:
+            return
+        import moose
+        from moose_nerp.prototypes import chan_proto
+        for chan, params in gates.items():
+            for gate in ('X', 'Y', 'Z'):
+                gpath = '/library/{}/gate{}'.format(chan, gate)
+                if moose.exists(gpath) and not isinstance(getattr(params, gate), chan_proto.ZChannelParams):
+                    chan_proto.make_gate(getattr(params, gate), self.model, moose.element(gpath))
+
+    def __call__(self, values):
+        from moose_nerp.prototypes import create_model_sim
+        self.update(values)
+        vms = []
+        for inj in self.fit.target.injections:
+            create_model_sim.runOneSim(self.model, injection_current=inj)
+            vms.append(np.array(self.model.vmtab[self.fit.ntype][0].vector))
+        t = np.linspace(0, self.model.param_sim.simtime, len(vms[0]))
+        return self.fit.target.error(t, vms)
+
+_evaluator = None
+
+def _init_worker(fit):
+    global _evaluator
+    _evaluator = Evaluator(fit)
+
+def _evaluate(values):
+    try:
+        return _evaluator(values)
+    except Exception as e:
+        log.warning('evaluation of {} failed: {}', values, e)
+        return np.inf, None
+
+def _save(checkpoint, state):
+    tmp = checkpoint+'.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp, checkpoint)
+
+def optimize(fit, popsize=None, generations=100, checkpoint=None, processes=None, seed=None, F=0.7, CR=0.9, map_func=None):
+    '''differential evolution (rand/1/bin) of fit with a pool of processes (all cores by default);
+    continues from checkpoint if it exists. map_func replaces the pool, e.g. map with _init_worker called'''
+    import multiprocessing
+    dim = len(fit.free)
+    popsize = popsize or max(10, 4*dim)
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint, 'rb') as f:
+            state = pickle.load(f)
+        log.info('continuing from generation {} of {}', state['generation'], checkpoint)
+    else:
+        rng = np.random.RandomState(seed)
+        state = {'generation': 0, 'pop': rng.uniform(size=(popsize, dim)), 'fitness': None,
+                 'cache': {}, 'history': [], 'rng': rng.get_state()}
+    rng = np.random.RandomState()
+    rng.set_state(state['rng'])
+    pool = None
+    if map_func is None:
+        pool = multiprocessing.get_context('spawn').Pool(processes or os.cpu_count(), _init_worker, (fit,))
+        map_func = pool.map
+
+    def evaluate(U):
+        #cached evaluations are not repeated, e.g. after restarting from a checkpoint
+        keys = [tuple(np.round(fit.values(u), 12)) for u in U]
+        todo = [k for k in dict.fromkeys(keys) if k not in state['cache']]
+        for k, res in zip(todo, map_func(_evaluate, [np.array(k) for k in todo])):
+            state['cache'][k] = res
+        return np.array([state['cache'][k][0] for k in keys])
+
+    try:
+        if state['fitness'] is None:
+            state['fitness'] = evaluate(state['pop'])
+            if checkpoint:
+                _save(checkpoint, dict(state, rng=rng.get_state()))
+        pop, fitness = state['pop'], state['fitness']
+        while state['generation'] < generations:
+            start = time.time()
+            n = len(pop)
+            idx = np.array([rng.choice([j for j in range(n) if j != i], 3, replace=False) for i in range(n)])
+            mutant = np.clip(pop[idx[:, 0]]+F*(pop[idx[:, 1]]-pop[idx[:, 2]]), 0, 1)
+            cross = rng.uniform(size=pop.shape) < CR
+            cross[np.arange(n), rng.randint(dim, size=n)] = True
+            trial = np.where(cross, mutant, pop)
+            trial_fitness = evaluate(trial)
+            better = trial_fitness <= fitness
+            pop[better], fitness[better] = trial[better], trial_fitness[better]
+            state['generation'] += 1
+            state['history'].append((np.min(fitness), np.median(fitness)))
+            state.update(pop=pop, fitness=fitness)
+            if checkpoint:
+                _save(checkpoint, dict(state, rng=rng.get_state()))
+            log.info('generation {}: best {:.4g} median {:.4g} ({:.1f} sec, {} evaluations cached)',
+                     state['generation'], np.min(fitness), np.median(fitness), time.time()-start, len(state['cache']))
+    finally:
+        if pool is not None:
+            pool.terminate()
+    best = int(np.argmin(state['fitness']))
+    values = fit.values(state['pop'][best])
+    return {'params': {p.path: v for p, v in zip(fit.free, values)}, 'fitness': state['fitness'][best],
+            'features': state['cache'][tuple(np.round(values, 12))][1], 'history': state['history']}
@@ -6,16 +6,17 @@ import numpy as np
 import moose
 #from moose_nerp.prototypes.calcium import NAME_CALCIUM
 from moose_nerp.prototypes.tables import DATA_NAME, add_one_table
-from moose_nerp.prototypes import logutil, util
+from moose_nerp.prototypes import logutil, util, profiling, recording
 log = logutil.Logger()
 
+@profiling.profiled()
 def SpikeTables(model, pop,plot_netvm, plas=[], plots_per_neur=[]):
     if not moose.exists(DATA_NAME):
         moose.Neutral(DATA_NAME)
     spiketab={key:[] for key in pop.keys()}
     vmtab={key:[] for key in pop.keys()}
     plastabs={key:[] for key in plas.keys()}
-    catab={key:[] for key in plas.keys()}
+    catab={key:[] for key in pop.keys()}
     for neur_type in pop.keys():
         if plot_netvm:
             vmtab[neur_type]=[moose.Table(DATA_NAME+'/Vm_%s' % (moose.element(neurname).name)) for neurname in pop[neur_type]]
@@ -28,33 +29,25 @@ def SpikeTables(model, pop,plot_netvm, plas=[], plots_per_neur=[]):
             if plot_netvm:
                 moose.connect(vmtab[neur_type][tabnum], 'requestOut', moose.element(soma_name), 'getVm')
     #now plot calcium and plasticity, if created, but only from a few compartments for each neuron
-    #first, check if calYN.  If so, randomly select compartments to plot.  Remember those.  THEN, if model.plasYN, plot those plasticity tables
+    #the same randomly selected synapses are used for plasticity and calcium tables
+    num_plots=plots_per_neur or 0
     if model.plasYN:
         for neur_type in plas.keys():
             for cellnum,cellpath in enumerate(plas[neur_type].keys()):
                 cellname=moose.element(cellpath).name
-                choice_comps=plas[neur_type][cellpath].keys()
-                syncomp_names=np.random.choice(choice_comps,plots_per_neur,replace=False)
+                syncomp_names=recording.sample(list(plas[neur_type][cellpath].keys()),num_plots)
                 log.debug('{} {} {}', cellpath, cellname, syncomp_names)
-                catab[neur_type]=[moose.Table(DATA_NAME+'/Ca%s_%s' % (cellname, syncomp)) for syncomp in syncomp_names]
-                for compnum,syncomp_name in enumerate(syncomp_names):
+                for syncomp_name in syncomp_names:
                     plas_entry = plas[neur_type][cellpath][syncomp_name]
-                    plastabs[neur_type].append(add_one_table(DATA_NAME,plas_entry, cellname+syncomp_name))
-                    # cal_name=plas_entry['syn'].parent.path+'/'+NAME_CALCIUM
-                    # moose.connect(catab[neur_type][compnum], 'requestOut', moose.element(cal_name), 'getCa')
+                    plastabs[neur_type].append(add_one_table(DATA_NAME,plas_entry, cellname+syncomp_name.replace('/','_')))
+                comps=[plas[neur_type][cellpath][name]['syn'].parent for name in syncomp_names]
+                targets=[target for target in map(recording.calcium,comps) if target is not None]
+                catab[neur_type].extend(recording.create({neur_type:{'Ca':targets}})[neur_type]['Ca'])
     elif model.calYN:
-        #if no plasticity, just plot calcium and (synaptic input?) for some compartments
-        #add synaptic channels for the calcium compartments?  Or randomly select synchans with synapses and then plot those calcium comps
-        # for neur_type in pop.keys():
-        #     for neurname in pop[neur_type]:
-        #         allcomps = moose.wildcardFind(neurname+ '/#[TYPE=Compartment]')
-        #         plotcomps=np.random.choice(allcomps,plots_per_neur,replace=False)
-        #         catab[neur_type]=[moose.Table(DATA_NAME+'/Ca%s_%s' % (moose.element(neurname).name,comp.name)) for comp in plotcomps]
-        #         for compnum,comp in enumerate(plotcomps):
-        #             cal_name=comp.path+'/'+NAME_CALCIUM
-        #             print(catab[neur_type][compnum].path,moose.element(cal_name).path)
-        #             moose.connect(catab[neur_type][compnum], 'requestOut', moose.element(cal_name), 'getCa')
-        pass
+        #if no plasticity, plot calcium of a few randomly selected compartments of each neuron
+        spec=[recording.Record(neur_type,['Ca'],comps='all',per_neuron=num_plots,label=neur_type) for neur_type in pop.keys()]
+        for neur_type,tabs in recording.record(spec,pop,model.param_cond.NAME_SOMA).items():
+            catab[neur_type]=tabs['Ca']
     return spiketab, vmtab, plastabs, catab
 
 def writeOutput(model, outfilename,spiketab,vmtab,network_pop):
@@ -0,0 +1,394 @@
+"""\
+Dry-run of network creation without moose.
+
+Predicts, from param_net and per-prototype synapse-slot summaries, the
+number of neurons of each type, the expected number of connections,
+synapse shortages, time tables needed from each TableSet file, number of
+moose objects and approximate memory and run time.  Used to reject
+infeasible parameter sets (e.g. in a parameter sweep) before building them.
+
+Slot summaries are the only information requiring moose; they are written
+once from the neuron prototypes with write_slot_summaries (or by setting
+param_net.slot_summary_file, see create_network) and read with
+read_slot_summaries.  Expected values are used where create_network makes
+random choices (neuron type, connections, number of synapses per connection).
+With lazy=True, objects, memory and run time are those of a network whose
+synchans are created only where synapses land (model.lazy_synchans, or
+param_net.prune_synchans), see synchan_savings.  A network made of several
+networks (create_network with network_list) is planned with combined_network.
+
+Example:
+    from moose_nerp import str_net
+    from moose_nerp.prototypes import net_planner
+    summaries=net_planner.read_slot_summaries('str_net/slot_summary.json')
+    plan=net_planner.plan_network(str_net.param_net,summaries,simtime=0.5,simdt=10e-6)
+    problems=net_planner.check(plan,max_memory=8e9)
+    net_planner.synchan_savings(str_net.param_net,summaries,simtime=0.5,simdt=10e-6,partners={'ampa':'nmda'})
+"""
+from __future__ import print_function, division
+import os
+import copy
+import json
+import types
+import importlib
+import numpy as np
+
+from moose_nerp.prototypes import logutil, spike_trains, connect
+log = logutil.Logger()
+
+#same criterion as check_connect: mean shortage above this fraction of needed synapses is a problem
+mismatch_criteria=0.1
+#number of post-synaptic positions used to estimate expected pre-synaptic cells with space constants
+max_post_sample=256
+
+#rough resource costs, calibrate with profiling on the machine running the simulations
+BYTES_PER_OBJECT={'Compartment':1200,'HHChannel':900,'HHChannel2D':900,'SynChan':800,'SimpleSynHandler':300,
+                  'CaConc':400,'DifShell':600,'DifBuffer':600,'Function':1500,'SpikeGen':300,'TimeTable':400,'Table':400}
+BYTES_DEFAULT=500
+BYTES_PER_SYNAPSE=150
+BYTES_PER_MSG=200
+SEC_PER_UPDATE={'Compartment':6e-8,'HHChannel':5e-8,'HHChannel2D':8e-8,'SynChan':3e-8,'SimpleSynHandler':1e-8,
+                'CaConc':2e-8,'DifShell':5e-8,'DifBuffer':5e-8,'Function':4e-7,'SpikeGen':1e-8,'TimeTable':1e-8,'Table':1e-8}
+SEC_PER_UPDATE_DEFAULT=3e-8
+#compartment-synchan and synhandler-synchan messages
+MSGS_PER_SYNCHAN=2
+
+OBJECT_CLASSES=list(BYTES_PER_OBJECT.keys())
+
+################ slot summaries, the only functions using moose
+def slot_summary(neurtype,syntypes,NumSyn,soma_loc=[0,0,0]):
+    '''distance from soma and number of synapse slots of each synchan in prototype neurtype,
+    using the same rules as connect.create_synpath_array, plus number of moose objects and messages'''
+    import moose
+    from moose_nerp.prototypes import util, syn_proto
+    from moose_nerp.prototypes.spines import NAME_HEAD
+    proto=moose.element(neurtype)
+    summary={'synchans':{},'objects':{},'messages':0}
+    for syntype in syntypes:
+        dist=[];slots=[]
+        for syncomp in syn_proto.synchan_sites(proto.path,syntype):
+            d,nm=util.get_dist_name(syncomp.parent,soma_loc)
+            dist.append(float(d))
+            slots.append(1 if NAME_HEAD in nm else int(util.distance_mapping(NumSyn[syntype],d)))
+        summary['synchans'][syntype]={'dist':dist,'slots':slots}
+    for cls in OBJECT_CLASSES:
+        summary['objects'][cls]=len(moose.wildcardFind(proto.path+'/##[ISA='+cls+']'))
+    summary['messages']=int(np.sum([len(el.msgOut) for el in moose.wildcardFind(proto.path+'/##')]))
+    #synchans planned by lazy syn_proto.add_synchans are counted as created, lazy planning removes them
+    sites=syn_proto.synapse_sites.get(proto.name)
+    if sites is not None:
+        planned=sum(isinstance(site,syn_proto.PlannedSynChan) for key in sites.model.SYNAPSE_TYPES
+                    for site in syn_proto.synchan_sites(proto.path,key))
+        for cls in ('SynChan','SimpleSynHandler'):
+            summary['objects'][cls]+=planned
+        summary['messages']+=MSGS_PER_SYNCHAN*planned
+    return summary
+
+def write_slot_summaries(model,fname,neurtypes=None):
+    '''write slot summaries of neuron prototypes (all of model.neurons by default) to json file fname'''
+    if neurtypes is None:
+        neurtypes=list(model.neurons.keys())
+    summaries={}
+    for ntype in neurtypes:
+        NumSyn=model.param_syn.NumSyn[ntype]
+        summaries[ntype]=slot_summary(ntype,list(NumSyn.keys()),NumSyn)
+    #workers of a sweep may write the same file at the same time
+    tmp='{}.{}.tmp'.format(fname,os.getpid())
+    with open(tmp,'w') as f:
+        json.dump(summaries,f)
+    os.replace(tmp,fname)
+    log.info('slot summaries of {} written to {}',neurtypes,fname)
+    return summaries
+
+def read_slot_summaries(fname):
+    with open(fname) as f:
+        summaries=json.load(f)
+    for summary in summaries.values():
+        for syn in summary['synchans'].values():
+            syn['dist']=np.array(syn['dist'],dtype=float)
+            syn['slots']=np.array(syn['slots'],dtype=float)
+    return summaries
+
+################ network predictions
+def dendritic_distance_dep_connect_prob(prob,dist):
+    '''vectorized version of connect.dendritic_distance_dep_connect_prob, dist is array'''
+    dist=np.asarray(dist,dtype=float)
+    maxprob=prob.postsyn_fraction if prob.postsyn_fraction else 1
+    steep=prob.steep
+    inside=(dist>=prob.mindist)&(dist<=prob.maxdist)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        x=dist-prob.mindist
+        if steep>0:
+            p=np.where(dist>prob.maxdist,1.0,maxprob*x**steep/(x**steep+prob.half_dist**steep))
+            return np.where(dist<prob.mindist,0.0,p)
+        elif steep<0:
+            p=np.where(dist>prob.maxdist,0.0,maxprob*prob.half_dist**(-steep)/(x**(-steep)+prob.half_dist**(-steep)))
+            return np.where(dist<prob.mindist,1.0,p)
+    return np.where(inside,maxprob,0.0)
+
+def grid_positions(netparams):
+    '''positions of all neurons, same grid as pop_funcs.create_population'''
+    size=np.ones(len(netparams.grid),dtype=int)
+    for i in range(len(netparams.grid)):
+        if netparams.grid[i]['inc']>0:
+            size[i]=int(np.ceil((netparams.grid[i]['xyzmax']-netparams.grid[i]['xyzmin'])/netparams.grid[i]['inc']))
+    axes=[np.linspace(netparams.grid[i]['xyzmin'],netparams.grid[i]['xyzmax'],size[i]) for i in range(3)]
+    xyz=np.meshgrid(*axes,indexing='ij')
+    return size,np.stack([c.ravel() for c in xyz],axis=1)
+
+def neuron_counts(netparams,neurtypes=None,single=None):
+    '''expected number of neurons of each type: types are assigned randomly in proportion to pop_dict percent'''
+    if single is None:
+        single=getattr(netparams,'single',False)
+    if single:
+        return {ntype:1 for ntype in (neurtypes or netparams.pop_dict.keys())}
+    size,positions=grid_positions(netparams)
+    types=[ntype for ntype in netparams.pop_dict.keys() if neurtypes is None or ntype in neurtypes]
+    percent=np.array([netparams.pop_dict[ntype].percent for ntype in types],dtype=float)
+    return {ntype:len(positions)*pc/percent.sum() for ntype,pc in zip(types,percent)}
+
+def populations(netparams,neurtypes=None):
+    '''expected number of neurons, grid positions and fraction of grid positions of each neuron type.
+    A network made of several networks (see combined_network) has one grid per network'''
+    networks=getattr(netparams,'networks',None)
+    if networks:
+        #create_network makes populations of each network, whatever their single setting
+        single=False
+    else:
+        networks=[netparams]
+        single=getattr(netparams,'single',False)
+    counts,positions,fraction={},{},{}
+    for net in networks:
+        net_counts=neuron_counts(net,neurtypes,single)
+        grid=np.zeros((1,3)) if single else grid_positions(net)[1]
+        total_percent=float(np.sum([net.pop_dict[ntype].percent for ntype in net_counts]))
+        for ntype,num in net_counts.items():
+            counts[ntype]=num
+            positions[ntype]=grid
+            fraction[ntype]=net.pop_dict[ntype].percent/total_percent if total_percent>0 else 0
+    return counts,positions,fraction
+
+def _copy_dicts(d):
+    #change_connect changes connections in place; time table sets are shared, as in create_network
+    return {key:_copy_dicts(value) if isinstance(value,dict) else copy.copy(value) for key,value in d.items()}
+
+def combined_network(param_net,networks):
+    '''parameters for plan_network of the network create_network makes from networks (network_list,
+    module names or modules): connections of the networks merged into those of param_net and changed
+    as in create_network (if param_net.merge_connect), populations of each network on its own grid.
+    param_net and the networks are not changed'''
+    networks=[importlib.import_module(net) if isinstance(net,str) else net for net in networks]
+    connect_dict=_copy_dicts(param_net.connect_dict)
+    if param_net.merge_connect:
+        for net in networks:
+            connect_dict=connect.merge(connect_dict,_copy_dicts(net.connect_dict))
+        connect_dict=connect.change_connect(connect_dict,param_net.change_weight)
+        connect_dict=connect.change_connect(connect_dict,param_net.change_prob)
+        connect_dict=connect.dict_delete(connect_dict,param_net.connect_delete)
+        connect_dict=connect.change_extern_files(connect_dict,param_net.ttable_replace)
+    return types.SimpleNamespace(connect_dict=connect_dict,networks=networks,single=False)
+
+def expected_presyn(conn,positions,pre_fraction,pre_positions=None):
+    '''expected number of pre-synaptic cells of one type connected to a post-synaptic cell,
+    averaged over post-synaptic positions; pre_fraction is fraction of grid positions of pre type.
+    pre_positions: grid of the pre-synaptic network, if not the same as the post-synaptic one'''
+    same_grid=pre_positions is None or pre_positions is positions
+    if same_grid:
+        pre_positions=positions
+    if conn.space_const or (conn.probability and not same_grid):
+        if len(positions)>max_post_sample:
+            post=positions[np.linspace(0,len(positions)-1,max_post_sample).astype(int)]
+        else:
+            post=positions
+        total=0.0
+        for start in range(0,len(post),64):
+            d=np.sqrt(((post[start:start+64,None,:]-pre_positions[None,:,:])**2).sum(axis=-1))
+            #as connect.connect_neurons: no connections between cells at the same position
+            if conn.space_const:
+                total+=np.sum(np.where(d>0,np.exp(-d/conn.space_const),0))
+            else:
+                total+=conn.probability*np.sum(d>0)
+        return pre_fraction*total/len(post)
+    elif conn.probability:
+        return pre_fraction*conn.probability*(len(positions)-1)
+    log.warning('need to specify either probability or space constant in param_net for {}',conn)
+    return 0.0
+
+def _take_slots(free,weight,num):
+    #expected slots used at each synchan when num synapses are chosen with probability proportional to weight
+    total=weight.sum()
+    if total>0 and num>0:
+        free-=np.minimum(free,num*weight/total)
+
+def _tt_trains(filename,cache={}):
+    #number of spike trains in time table file, None if file does not exist
+    fname=spike_trains.train_files(filename)[-1]
+    if not os.path.exists(fname):
+        return None
+    key=(fname,os.path.getmtime(fname))
+    if key not in cache:
+        cache[key]=spike_trains.num_trains(filename)
+    return cache[key]
+
+def plan_network(netparams,summaries,simtime=None,simdt=None,check_files=True,lazy=False,partners=None):
+    '''predict network size and connectivity.  summaries: slot summaries of neuron prototypes.
+    Returns dict with neurons, connections, shortage (per cell) and presyn_cells for each
+    post-synaptic type, synapse type and pre-synaptic type, timetables per TableSet,
+    synchans (expected number per cell receiving synapses, for each post-synaptic and synapse type),
+    objects, messages, memory (bytes) and runtime (sec, if simtime and simdt given).
+    lazy: only synchans receiving synapses are created; partners: synapse type created along with
+    another, e.g. {'ampa':'nmda'} (connect.synconn connects NMDA with each AMPA synapse)'''
+    single=getattr(netparams,'single',False)
+    counts,positions,fraction=populations(netparams,None if not single else list(summaries.keys()))
+    plan={'neurons':counts,'connections':{},'shortage':{},'presyn_cells':{},'synchans':{},'timetables':{},
+          'missing':[],'lazy':lazy}
+    tt_sets={}
+    for ntype,syn_connects in netparams.connect_dict.items():
+        if ntype not in counts:
+            continue
+        if ntype not in summaries:
+            plan['missing'].append(ntype)
+            continue
+        for name in ('connections','shortage','presyn_cells','synchans'):
+            plan[name][ntype]={}
+        for syntype,pre_connects in syn_connects.items():
+            for name in ('connections','shortage','presyn_cells'):
+                plan[name][ntype][syntype]={}
+            if syntype not in summaries[ntype]['synchans']:
+                plan['missing'].append(ntype+'/'+syntype)
+                continue
+            synchans=summaries[ntype]['synchans'][syntype]
+            free=np.array(synchans['slots'],dtype=float)
+            #pre-synaptic types are connected in order, each using slots left free by the previous ones
+            for pretype,conn in pre_connects.items():
+                if conn.dend_loc:
+                    prob=dendritic_distance_dep_connect_prob(conn.dend_loc,synchans['dist'])
+                else:
+                    prob=np.ones(len(free))
+                weight=prob*free
+                availsyn=int(np.round(weight.sum()))
+                if 'extern' in pretype:
+                    needed=availsyn
+                    plan['presyn_cells'][ntype][syntype][pretype]=availsyn
+                    tt_sets.setdefault(conn.pre,0)
+                    tt_sets[conn.pre]+=availsyn*counts[ntype]
+                elif single:
+                    continue
+                else:
+                    cells=expected_presyn(conn,positions[ntype],fraction.get(pretype,0),positions.get(pretype))
+                    plan['presyn_cells'][ntype][syntype][pretype]=cells
+                    #each connected cell makes max(poisson(num_conns),1) synapses
+                    needed=cells*(conn.num_conns+np.exp(-conn.num_conns))
+                made=min(needed,availsyn)
+                plan['connections'][ntype][syntype][pretype]=made
+                plan['shortage'][ntype][syntype][pretype]=needed-made
+                _take_slots(free,weight,made)
+            #slots are chosen without replacement, each with probability used/slots: probability of at least one
+            slots=np.array(synchans['slots'],dtype=float)
+            used=np.divide(slots-free,slots,out=np.zeros(len(slots)),where=slots>0)
+            plan['synchans'][ntype][syntype]=float(np.sum(1-(1-used)**slots))
+        for syntype,partner in (partners or {}).items():
+            if syntype in plan['synchans'][ntype]:
+                occupied=plan['synchans'][ntype].get(partner,0)+plan['synchans'][ntype][syntype]
+                if partner in summaries[ntype]['synchans']:
+                    occupied=min(occupied,len(summaries[ntype]['synchans'][partner]['slots']))
+                plan['synchans'][ntype][partner]=occupied
+    for tt,connections in tt_sets.items():
+        needed=int(np.ceil(connections/tt.syn_per_tt))
+        available=_tt_trains(tt.filename) if check_files else None
+        plan['timetables'][tt.tablename]={'filename':tt.filename,'needed':needed,'available':available}
+    plan['objects'],plan['messages'],plan['synapses'],plan['memory']=_resources(plan,summaries)
+    if simtime and simdt:
+        plan['runtime']=_runtime(plan,simtime,simdt)
+    return plan
+
+def _resources(plan,summaries):
+    objects={}
+    messages=0
+    for ntype,num in plan['neurons'].items():
+        if ntype in summaries:
+            for cls,n in summaries[ntype]['objects'].items():
+                objects[cls]=objects.get(cls,0)+n*num
+            messages+=summaries[ntype]['messages']*num
+            if plan['lazy']:
+                #synchans (and their synhandlers) without synapses are not created
+                total=summaries[ntype]['objects'].get('SynChan',0)
+                absent=max(total-sum(plan['synchans'].get(ntype,{}).values()),0)*num
+                for cls in ('SynChan','SimpleSynHandler'):
+                    objects[cls]=objects.get(cls,0)-min(absent,summaries[ntype]['objects'].get(cls,0)*num)
+                messages-=MSGS_PER_SYNCHAN*absent
+    #spike generator added to each neuron by create_population
+    objects['SpikeGen']=objects.get('SpikeGen',0)+sum(plan['neurons'].values())
+    #all trains in a file are created, not only the needed ones
+    objects['TimeTable']=objects.get('TimeTable',0)+sum(tt['available'] if tt['available'] is not None else tt['needed']
+                                                      for tt in plan['timetables'].values())
+    synapses=sum(made*plan['neurons'][ntype] for ntype,syns in plan['connections'].items()
+                 for pres in syns.values() for made in pres.values())
+    messages+=synapses
+    memory=sum(n*BYTES_PER_OBJECT.get(cls,BYTES_DEFAULT) for cls,n in objects.items())
+    memory+=synapses*BYTES_PER_SYNAPSE+messages*BYTES_PER_MSG
+    return objects,messages,synapses,memory
+
+def _runtime(plan,simtime,simdt):
+    steps=simtime/simdt
+    per_step=sum(n*SEC_PER_UPDATE.get(cls,SEC_PER_UPDATE_DEFAULT) for cls,n in plan['objects'].items())
+    return steps*per_step
+
+def check(plan,max_memory=None,max_runtime=None,shortage_tol=mismatch_criteria):
+    '''list of problems with a network plan; empty list if the network is feasible'''
+    problems=['no slot summary for '+name for name in plan['missing']]
+    for ntype,syns in plan['shortage'].items():
+        for syntype,pres in syns.items():
+            for pretype,short in pres.items():
+                needed=short+plan['connections'][ntype][syntype][pretype]
+                if needed>0 and short/needed>shortage_tol:
+                    problems.append('{} {}: too few synapses for {}, need {:.1f}, avail {:.1f} per cell'.format(
+                        ntype,syntype,pretype,needed,needed-short))
+    for tablename,tt in plan['timetables'].items():
+        if tt['available'] is None:
+            problems.append('time table file {}.npz not found'.format(tt['filename']))
+        elif tt['needed']>tt['available']:
+            problems.append('{}: {} trains needed, {} in {}'.format(tablename,tt['needed'],tt['available'],tt['filename']))
+    if max_memory is not None and plan['memory']>max_memory:
+        problems.append('memory {:.3g} bytes exceeds {:.3g}'.format(plan['memory'],max_memory))
+    if max_runtime is not None and plan.get('runtime',0)>max_runtime:
+        problems.append('run time {:.3g} sec exceeds {:.3g}'.format(plan['runtime'],max_runtime))
+    return problems
+
+def feasible(netparams,summaries,simtime=None,simdt=None,**kwargs):
+    '''True and empty list if network can be built as specified, else False and list of problems.
+    kwargs are passed to check (max_memory, max_runtime, shortage_tol)'''
+    problems=check(plan_network(netparams,summaries,simtime,simdt),**kwargs)
+    for problem in problems:
+        log.info('infeasible network: {}',problem)
+    return not len(problems),problems
+
+def synchan_savings(netparams,summaries,simtime=None,simdt=None,partners=None):
+    '''objects, memory and run time of a network with all synchans and of the same network with
+    only synchans receiving synapses (lazy creation or pruning).  Returns dict of (all, lazy) pairs'''
+    plans=[plan_network(netparams,summaries,simtime,simdt,lazy=lazy,partners=partners) for lazy in (False,True)]
+    savings={'objects':tuple(sum(plan['objects'].values()) for plan in plans),
+             'SynChan':tuple(plan['objects'].get('SynChan',0) for plan in plans),
+             'memory':tuple(plan['memory'] for plan in plans)}
+    if simtime and simdt:
+        savings['runtime']=tuple(plan['runtime'] for plan in plans)
+    for name,(full,lazy) in savings.items():
+        log.info('{}: {:.4g} with all synchans, {:.4g} with connected synchans only ({:.1%} less)',
+                 name,full,lazy,1-lazy/full if full else 0)
+    return savings
+
+def report(plan):
+    print('neurons:',{ntype:int(np.round(n)) for ntype,n in plan['neurons'].items()})
+    for ntype,syns in plan['connections'].items():
+        for syntype,pres in syns.items():
+            for pretype,made in pres.items():
+                print('  {} {} from {}: {:.1f} synapses per cell, shortage {:.1f}'.format(
+                    ntype,syntype,pretype,made,plan['shortage'][ntype][syntype][pretype]))
+    for ntype,syns in plan['synchans'].items():
+        for syntype,occupied in syns.items():
+            print('  {} {}: {:.1f} synchans per cell receive synapses'.format(ntype,syntype,occupied))
+    for tablename,tt in plan['timetables'].items():
+        print('  time tables {}: need {}, available {}'.format(tablename,tt['needed'],tt['available']))
+    print('objects:',plan['objects'],'messages:',plan['messages'])
+    print('memory: {:.3g} MB'.format(plan['memory']/1e6),
+          'runtime: {:.3g} sec'.format(plan['runtime']) if 'runtime' in plan else '')
@@ -1,9 +1,9 @@
 from moose_nerp.prototypes import (create_model_sim,
                                    util,
                                    net_sim_graph)
-from moose_nerp.graph import net_graph, neuron_graph, spine_graph
 
 def sim_plot(model,net,connections,population,pg=None):
+    from moose_nerp.graph import net_graph, neuron_graph, spine_graph
     traces, names = [], []
     for inj in model.param_sim.injection_current:
         print('ready to simulation with', inj)
@@ -0,0 +1,347 @@
+"""\
+Partitioned network simulation: the neurons of a network are divided among
+several processes (local processes or MPI ranks), which exchange spikes
+every epoch of the minimum synaptic delay between neurons (see epoch_length).
+
+Each partition calls the same builder with the same seed, which creates the
+complete network with create_network, so that random connections are
+identical in all partitions.  Each partition then keeps its own neurons
+(assign_partitions balances the number of compartments) and deletes the
+others, together with time tables that only connect to deleted neurons.
+Synapses from deleted neurons are driven by proxy TimeTables, one per remote
+presynaptic neuron.  A spike at time t in epoch [t0, t0+epoch) is delivered
+to the proxy at t+epoch (which is in the future), and the synaptic delay of
+the proxy synapse is reduced by epoch, so the spike still arrives at t+delay.
+Short term plasticity of synapses from remote neurons sees the spike one
+epoch late.
+
+The builder is a module level function, builder(*args, seed=seed), that
+returns a dict with model, net, population, plas and buf_cap, after
+create_network and setupStim but before output tables and clocks (e.g.
+bg_net.multisim.build_network).
+
+    results = partition.run(multisim.build_network, (p,), num_partitions=4, seed=1)
+    partition.scaling(multisim.build_network, (p,), partitions=(1, 2, 4), seed=1)
+
+Under MPI (mpirun -n 4 python script.py), call partition.run_mpi in every rank.
+"""
+from __future__ import print_function, division
+import time
+import queue
+import numpy as np
+
+from moose_nerp.prototypes import logutil, profiling
+log = logutil.Logger()
+
+PROXY_PATH = '/proxy'
+#epoch of the message a failed partition sends to the others, so they stop waiting for it
+ABORT = -1
+#seconds between checks that all partition processes are alive
+POLL_SEC = 1
+
+def neuron_of(path, neurons):
+    '''population neuron (/container/neuron) containing element path, None for e.g. time tables'''
+    neuron = '/'.join(path.split('/')[:3])
+    return neuron if neuron in neurons else None
+
+def assign_partitions(pop, num_partitions, cost=None):
+    '''{neuron path: partition}, balancing total cost (e.g. number of compartments) of partitions;
+    neurons of equal cost are dealt out in population order, so each partition gets a share of each population'''
+    cost = cost or {}
+    neurons = [neur for ntype in sorted(pop) for neur in pop[ntype]]
+    order = sorted(range(len(neurons)), key=lambda i: -cost.get(neurons[i], 1))
+    load = np.zeros(num_partitions)
+    owner = {}
+    for i in order:
+        rank = int(np.argmin(load))
+        owner[neurons[i]] = rank
+        load[rank] += cost.get(neurons[i], 1)
+    return owner
+
+def compartment_cost(pop):
+    import moose
+    return {neur: len(moose.wildcardFind(neur+'/##[ISA=CompartmentBase]')) for ntype in pop for neur in pop[ntype]}
+
+def epoch_length(records, neurons, net=None):
+    '''spike exchange interval: minimum delay of the synapses between neurons (records of
+    connect.record_synapses), e.g. bg_net has no mindelay of its own, only those of its networks.
+    Without such synapses, minimum of net.mindelay, or infinite (nothing to exchange)'''
+    delays = [rec.delay for rec in records
+              if neuron_of(rec.presyn, neurons) is not None and neuron_of(rec.synhandler, neurons) is not None]
+    if not len(delays):
+        delays = [d for d in getattr(net, 'mindelay', {}).values() if d]
+    if not len(delays):
+        return np.inf
+    if min(delays) <= 0:
+        raise ValueError('partitioned simulation requires positive synaptic delays, minimum is {}'.format(min(delays)))
+    return min(delays)
+
+class Partition(object):
+    '''Neurons, proxies and exports of one partition, created from the complete network'''
+    def __init__(self, rank, owner, records, epoch):
+        self.rank = rank
+        self.epoch = epoch
+        neurons = set(owner)
+        self.local = set(neur for neur, r in owner.items() if r == rank)
+        self.remote = neurons-self.local
+        #remote presynaptic neuron: synapse records of local postsynaptic neurons
+        self.proxy_records = {}
+        #local presynaptic neuron: partitions with postsynaptic neurons
+        self.exports = {}
+        self.used_inputs = set()
+        for rec in records:
+            pre = neuron_of(rec.presyn, neurons)
+            post = neuron_of(rec.synhandler, neurons)
+            if post in self.local:
+                if pre is None:
+                    self.used_inputs.add(rec.presyn)
+                elif pre in self.remote:
+                    if rec.delay < epoch*(1-1e-9):
+                        raise ValueError('delay {} of {} is less than exchange epoch {}'.format(rec.delay, rec.synhandler, epoch))
+                    self.proxy_records.setdefault(pre, []).append(rec)
+            elif pre in self.local and post is not None:
+                self.exports.setdefault(pre, set()).add(owner[post])
+        self.proxies = {}
+
+    def prune(self):
+        '''delete remote neurons and unused time tables, create proxies for remote presynaptic neurons'''
+        import moose
+        from moose_nerp.prototypes import plasticity
+        from moose_nerp.prototypes.ttables import TableSet
+        for neur in self.remote:
+            moose.delete(neur)
+        num_tt = 0
+        for tabset in TableSet.ALL:
+            keep = []
+            for entry in getattr(tabset, 'stimtab', []):
+                if entry[0].path in self.used_inputs:
+                    keep.append(entry)
+                else:
+                    moose.delete(entry[0])
+                    num_tt += 1
+            if hasattr(tabset, 'stimtab'):
+                tabset.stimtab = keep
+        if not moose.exists(PROXY_PATH):
+            moose.Neutral(PROXY_PATH)
+        for pre, recs in self.proxy_records.items():
+            tt = moose.TimeTable(PROXY_PATH+'/'+pre.strip('/').replace('/', '_'))
+            tt.tick = 7
+            for rec in recs:
+                sh = moose.element(rec.synhandler)
+                sh.synapse[rec.index].delay = rec.delay-self.epoch
+                moose.connect(tt, 'eventOut', sh.synapse[rec.index], 'addSpike')
+                if rec.stp:
+                    for name in (plasticity.NAME_DEPRESS, plasticity.NAME_FACIL):
+                        path = sh.parent.path+name+str(rec.index)
+                        if moose.exists(path):
+                            moose.connect(tt, 'eventOut', moose.element(path).x[1], 'input')
+            self.proxies[pre] = tt
+        log.info('partition {}: {} neurons, deleted {} remote neurons and {} time tables, {} proxies, {} exported neurons',
+                 self.rank, len(self.local), len(self.remote), num_tt, len(self.proxies), len(self.exports))
+
+    def local_pop(self, pop):
+        return {ntype: [neur for neur in neurs if neur in self.local] for ntype, neurs in pop.items()}
+
+    def deliver(self, spikes):
+        '''append spike times {remote neuron: times} to proxies, one epoch later'''
+        for pre, times in spikes.items():
+            if pre in self.proxies and len(times):
+                tt = self.proxies[pre]
+                tt.vector = np.append(tt.vector, np.asarray(times)+self.epoch)
+
+################ spike exchange
+class QueueExchange(object):
+    '''all to all exchange between local processes, through one inbox queue per partition'''
+    def __init__(self, rank, inboxes):
+        self.rank = rank
+        self.inboxes = inboxes
+        self.pending = {}
+
+    def exchange(self, epoch, outgoing):
+        '''send outgoing {partition: {neuron: times}} of epoch, return merged spikes received'''
+        for rank, inbox in enumerate(self.inboxes):
+            if rank != self.rank:
+                inbox.put((epoch, self.rank, outgoing.get(rank, {})))
+        #messages of the next epoch may arrive from partitions that already finished this one
+        while len(self.pending.get(epoch, {})) < len(self.inboxes)-1:
+            msg_epoch, sender, spikes = self.inboxes[self.rank].get()
+            if msg_epoch == ABORT:
+                raise RuntimeError('partition {} failed'.format(sender))
+            self.pending.setdefault(msg_epoch, {})[sender] = spikes
+        received = self.pending.pop(epoch, {})
+        merged = {}
+        for spikes in received.values():
+            merged.update(spikes)
+        return merged
+
+class MPIExchange(object):
+    def __init__(self, comm):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+
+    def exchange(self, epoch, outgoing):
+        received = self.comm.alltoall([outgoing.get(rank, {}) for rank in range(self.comm.Get_size())])
+        merged = {}
+        for spikes in received:
+            merged.update(spikes)
+        return merged
+
+################ one partition
+def simulate_partition(rank, num_partitions, exchange, builder, args, simtime, seed=None):
+    '''build complete network, keep partition rank, run with spike exchange, return spikes of local neurons'''
+    import moose
+    from moose_nerp.prototypes import connect, net_output, clocks, calcium
+    start = time.perf_counter()
+    records = connect.record_synapses()
+    built = builder(*args, seed=seed)
+    connect.synapse_records = None
+    model, net, population = built['model'], built['net'], built['population']
+    pop = population['pop']
+    owner = assign_partitions(pop, num_partitions, compartment_cost(pop))
+    epoch = epoch_length(records, owner, net)
+    part = Partition(rank, owner, records, epoch)
+    del records[:]
+    if num_partitions > 1:
+        part.prune()
+    local_pop = part.local_pop(pop)
+    plas = {ntype: {cell: v for cell, v in cells.items() if cell in part.local}
+            for ntype, cells in built.get('plas', {}).items()}
+    param_sim = model.param_sim
+    simtime = simtime or param_sim.simtime
+    model.spiketab, model.vmtab, model.plastab, model.catab = net_output.SpikeTables(
+        model, local_pop, getattr(net, 'plot_netvm', 0), plas, getattr(net, 'plots_per_neur', 1))
+    simpath = population.get('netnames', [net.netname])
+    clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve, model.param_cond.NAME_SOMA,
+                         clock_dt=clocks.clock_dt(param_sim, net))
+    if param_sim.hsolve and model.calYN:
+        calcium.fix_calcium(model.neurons.keys(), model, built.get('buf_cap'))
+    build_sec = time.perf_counter()-start
+
+    spiketabs = {neur: tab for ntype in local_pop for neur, tab in zip(local_pop[ntype], model.spiketab[ntype])}
+    sent = {neur: 0 for neur in part.exports}
+    moose.reinit()
+    start = time.perf_counter()
+    exchange_sec = 0
+    num_exchanged = 0
+    t = 0
+    epoch_num = 0
+    with profiling.phase('partition_run'):
+        while t < simtime-1e-12:
+            step = min(epoch, simtime-t)
+            moose.start(step)
+            t += step
+            ex_start = time.perf_counter()
+            outgoing = {}
+            for neur, ranks in part.exports.items():
+                vec = spiketabs[neur].vector
+                if len(vec) > sent[neur]:
+                    new = np.array(vec[sent[neur]:])
+                    sent[neur] = len(vec)
+                    num_exchanged += len(new)
+                    for r in ranks:
+                        outgoing.setdefault(r, {})[neur] = new
+            if num_partitions > 1:
+                part.deliver(exchange.exchange(epoch_num, outgoing))
+            exchange_sec += time.perf_counter()-ex_start
+            epoch_num += 1
+    run_sec = time.perf_counter()-start
+    spikes = {ntype: {neur: np.array(spiketabs[neur].vector) for neur in local_pop[ntype]} for ntype in local_pop}
+    return {'rank': rank, 'pop': pop if rank == 0 else None, 'spikes': spikes,
+            'build_sec': build_sec, 'run_sec': run_sec, 'exchange_sec': exchange_sec,
+            'spikes_exchanged': num_exchanged, 'num_neurons': len(part.local), 'epoch': epoch}
+
+def _worker(rank, num_partitions, inboxes, results, builder, args, simtime, seed):
+    try:
+        out = simulate_partition(rank, num_partitions, QueueExchange(rank, inboxes), builder, args, simtime, seed)
+    except Exception as e:
+        log.error('partition {} failed: {}', rank, e)
+        for r, inbox in enumerate(inboxes):
+            if r != rank:
+                inbox.put((ABORT, rank, None))
+        results.put({'rank': rank, 'error': repr(e)})
+        raise
+    results.put(out)
+
+def gather(outputs):
+    '''spike times {ntype: [times of each neuron in population order]} and timing of all partitions'''
+    failed = [out for out in outputs if 'error' in out]
+    if failed:
+        raise RuntimeError('partitions failed: {}'.format(failed))
+    pop = [out['pop'] for out in outputs if out['pop'] is not None][0]
+    spikes = {}
+    for out in outputs:
+        for ntype, neurs in out['spikes'].items():
+            spikes.setdefault(ntype, {}).update(neurs)
+    spike_time = {ntype: [spikes.get(ntype, {}).get(neur, np.zeros(0)) for neur in neurs] for ntype, neurs in pop.items()}
+    timing = {key: [out[key] for out in sorted(outputs, key=lambda o: o['rank'])]
+              for key in ('build_sec', 'run_sec', 'exchange_sec', 'spikes_exchanged', 'num_neurons')}
+    return {'spike_time': spike_time, 'timing': timing, 'epoch': outputs[0]['epoch']}
+
+def run(builder, args, num_partitions=2, simtime=None, seed=None):
+    '''simulate network built by builder(*args, seed=seed) in num_partitions local processes.
+    simtime defaults to model.param_sim.simtime, which is read in each partition.
+    seed is required for more than one partition, so that all partitions build the same network'''
+    import multiprocessing
+    if seed is None and num_partitions > 1:
+        raise ValueError('seed is required for {} partitions: each partition builds the complete network'.format(num_partitions))
+    ctx = multiprocessing.get_context('spawn')
+    inboxes = [ctx.Queue() for _ in range(num_partitions)]
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(rank, num_partitions, inboxes, results, builder, args, simtime, seed))
+             for rank in range(num_partitions)]
+    for proc in procs:
+        proc.start()
+    outputs = []
+    while len(outputs) < num_partitions and not any('error' in out for out in outputs):
+        try:
+            outputs.append(results.get(timeout=POLL_SEC))
+        except queue.Empty:
+            #a partition killed without posting (e.g. crash in moose) would leave the others waiting
+            done = set(out['rank'] for out in outputs)
+            outputs.extend({'rank': rank, 'error': 'exit code {}'.format(proc.exitcode)}
+                           for rank, proc in enumerate(procs) if rank not in done and proc.exitcode not in (None, 0))
+    if any('error' in out for out in outputs):
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+    for proc in procs:
+        proc.join()
+    return gather(outputs)
+
+def run_mpi(builder, args, simtime=None, seed=None):
+    '''call in every MPI rank; rank 0 returns gathered results, other ranks None'''
+    from mpi4py import MPI
+    comm = MPI.COMM_WORLD
+    if seed is None and comm.Get_size() > 1:
+        raise ValueError('seed is required for {} partitions: each partition builds the complete network'.format(comm.Get_size()))
+    out = simulate_partition(comm.Get_rank(), comm.Get_size(), MPIExchange(comm), builder, args, simtime, seed)
+    outputs = comm.gather(out, root=0)
+    return gather(outputs) if comm.Get_rank() == 0 else None
+
+################ validation and scaling
+def compare(reference, partitioned, simtime):
+    '''mean firing rate of each population, and Kolmogorov-Smirnov p value of ISI distributions'''
+    from scipy import stats
+    out = {}
+    for ntype, trains in reference['spike_time'].items():
+        other = partitioned['spike_time'].get(ntype, [])
+        isi = np.concatenate([np.diff(st) for st in trains]) if len(trains) else np.zeros(0)
+        other_isi = np.concatenate([np.diff(st) for st in other]) if len(other) else np.zeros(0)
+        out[ntype] = {'rate': np.mean([len(st) for st in trains])/simtime if len(trains) else np.nan,
+                      'partitioned_rate': np.mean([len(st) for st in other])/simtime if len(other) else np.nan,
+                      'isi_ks_p': stats.ks_2samp(isi, other_isi).pvalue if len(isi) and len(other_isi) else np.nan}
+    return out
+
+def scaling(builder, args, partitions=(1, 2, 4), simtime=None, seed=None):
+    '''run time of each number of partitions, speedup and efficiency relative to one partition'''
+    results = {n: run(builder, args, n, simtime, seed) for n in partitions}
+    base = max(results[partitions[0]]['timing']['run_sec'])*partitions[0]
+    report = {}
+    for n, res in results.items():
+        wall = max(res['timing']['run_sec'])
+        report[n] = {'run_sec': wall, 'speedup': base/wall, 'efficiency': base/wall/n,
+                     'exchange_sec': max(res['timing']['exchange_sec']),
+                     'spikes_exchanged': sum(res['timing']['spikes_exchanged'])}
+        log.info('{} partitions: run {:.2f} sec, speedup {:.2f}, efficiency {:.2f}', n, wall,
+                 report[n]['speedup'], report[n]['efficiency'])
+    return report, results
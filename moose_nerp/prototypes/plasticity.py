@@ -8,6 +8,7 @@ import moose
 import numpy as np
 
 from moose_nerp.prototypes import logutil, util, spines
+from moose_nerp.prototypes.connect import stimulated_synapses
 
 log = logutil.Logger()
 NAME_PLAS='/plas'
@@ -15,6 +16,8 @@ NAME_CUM='Cum'
 NAME_DEPRESS='/dep'
 NAME_FACIL='/fac'
 NAME_STP='/stp'
+#default fraction of synapses without inputs that get plasticity, for heterosynaptic plasticity
+NONSTIM_FRACTION=0.1
 
 '''
 key expressions for short term plasticity
@@ -367,20 +370,46 @@ def plasticity(synchan,plas_params):
 
     return {'cum':plasCum,'plas':plas, 'syn': synchan}
 
-def addPlasticity(cell_pop,caplas_params):
+def _syn_name(synchan):
+    #same as util.syn_name, also for synchans planned by lazy syn_proto.add_synchans
+    comp=synchan.parent
+    if spines.NAME_HEAD in comp.name:
+        return comp.parent.name+'/'+comp.name
+    return comp.name
+
+def addPlasticity(cell_pop,caplas_params,connections=None,nonstim_fraction=NONSTIM_FRACTION):
+    '''calcium based plasticity of synchans of type caplas_params.Plas_syn.Name in each cell of cell_pop.
+    With connections (connect_list of the cells), only synchans receiving synapses and a random
+    nonstim_fraction of the others (for heterosynaptic plasticity) get plasticity, and each entry
+    has 'stim': whether the synchan receives synapses.  Without connections, all synchans do.'''
+    from moose_nerp.prototypes import syn_proto
     log.info("{} ", cell_pop)
     plascum={}
+    syntype=caplas_params.Plas_syn.Name
+    stimulated=None if connections is None else stimulated_synapses(connections,syntype)
 
     for cell in cell_pop:
 
         plascum[cell] = {}
-        allsyncomp_list = moose.wildcardFind(cell+'/##/'+caplas_params.Plas_syn.Name+'[ISA=SynChan]')
-
-        for synchan in allsyncomp_list:
+        #includes synchans planned by lazy syn_proto.add_synchans, created only if selected
+        allsyncomp_list = syn_proto.synchan_sites(cell,syntype)
+        if stimulated is None:
+            selected=[(synchan,None) for synchan in allsyncomp_list]
+        else:
+            stim=[synchan for synchan in allsyncomp_list if _syn_name(synchan) in stimulated.get(cell,())]
+            nonstim=[synchan for synchan in allsyncomp_list if _syn_name(synchan) not in stimulated.get(cell,())]
+            sample=np.random.choice(len(nonstim),int(np.round(nonstim_fraction*len(nonstim))),replace=False)
+            selected=[(synchan,True) for synchan in stim]+[(nonstim[i],False) for i in sorted(sample)]
+            log.debug('plasticity for {}: {} stimulated, {} of {} non-stimulated synapses', cell, len(stim), len(sample), len(nonstim))
+
+        for synchan,isstim in selected:
+            synchan=syn_proto.get_synchan(synchan.path)
             #if synapse exists
             if moose.exists(synchan.path+'/SH'):
                 log.debug("{} {} {}", cell, synchan.path, moose.element(synchan.path+'/SH'))
                 synname = util.syn_name(synchan.path, spines.NAME_HEAD)
                 plascum[cell][synname] = plasticity2(synchan, caplas_params.Plas2_syn)
+                if isstim is not None and plascum[cell][synname] is not None:
+                    plascum[cell][synname]['stim']=isstim
 
     return plascum
@@ -1,13 +1,12 @@
 import moose
 
-print ('moose version', moose.__version__)
-
 def print_elem_params(model, neur, param_sim):
     ''' neuron ->  output of neurons from cell_proto.neuronclasses(model)
         ntype -> 'D1' Provide neuron type to print moose compartment values for
         a single neuron type.
     '''
 
+    print ('moose version', moose.__version__)
     print('*#*#*#* Parameters for simulation of', neur)
     if param_sim.hsolve==1:
         comptype='ZombieCompartment'
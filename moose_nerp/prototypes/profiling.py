@@ -0,0 +1,229 @@
+"""\
+Phase level profiling of model building and simulation.
+
+When enabled (param_sim.profile, or --profile on the command line), each
+phase decorated with profiled, or run inside a phase block, records wall
+time, resident memory (current and peak) and the number of moose objects
+of each class, and of messages by class of their source, created during
+the phase.  Wall time does not include the time spent counting.  Phases called within other phases
+are recorded with names such as setupNeurons/assign_clocks.  write_report
+saves one record per phase to <prefix>_profile.json and <prefix>_profile.csv;
+aggregate combines reports of many runs, e.g. from a parameter sweep.
+
+When profiling is not enabled, the decorators add only a function call.
+"""
+from __future__ import print_function, division
+import os
+import csv
+import json
+import time
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: #windows
+    resource = None
+
+from moose_nerp.prototypes import logutil
+log = logutil.Logger()
+
+#moose classes counted after each phase: name in report, moose base class
+OBJECT_CLASSES = [('Compartment','CompartmentBase'),
+                  ('HHChannel','HHChannelBase'),
+                  ('SynChan','SynChanBase'),
+                  ('SynHandler','SynHandlerBase'),
+                  ('CaConc','CaConcBase'),
+                  ('DifShell','DifShellBase'),
+                  ('Function','Function'),
+                  ('Table','Table'),
+                  ('TimeTable','TimeTable'),
+                  ('SpikeGen','SpikeGen')]
+
+_active = None
+
+def current_rss_MB():
+    '''resident set size of this process, None if not available'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/1e6
+    except (IOError, OSError, ValueError):
+        return None
+
+def peak_rss_MB():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on mac
+    return peak/1e6 if os.uname()[0] == 'Darwin' else peak/1e3
+
+def count_objects(count_messages=True):
+    '''number of moose objects of each class in OBJECT_CLASSES, and number of outgoing messages,
+    in total and by class of the source element (messages_<class>)'''
+    import moose
+    counts = {name:len(moose.wildcardFind('/##[ISA={}]'.format(cls))) for name,cls in OBJECT_CLASSES}
+    if count_messages:
+        counts['messages'] = 0
+        for el in moose.wildcardFind('/##'):
+            num = len(el.msgOut)
+            if num:
+                key = 'messages_'+el.className
+                counts[key] = counts.get(key, 0)+num
+                counts['messages'] += num
+    return counts
+
+class Profile(object):
+    '''Records of all phases of one run. prefix: name of report files'''
+    def __init__(self, prefix, count_objects=True, count_messages=True):
+        self.prefix = prefix
+        self.count_objects = count_objects
+        self.count_messages = count_messages
+        self.records = []
+        self.stack = []
+        self.start_time = time.time()
+        #seconds spent counting objects, excluded from wall time of phases
+        self.overhead = 0
+
+    def _counts(self):
+        if not self.count_objects:
+            return {}
+        try:
+            return count_objects(self.count_messages)
+        except ImportError:
+            return {}
+
+    def _measure(self):
+        start = time.perf_counter()
+        measured = {'rss':current_rss_MB(), 'counts':self._counts()}
+        self.overhead += time.perf_counter()-start
+        return measured
+
+    def begin(self, name):
+        self.stack.append(name)
+        #counted before the phase starts, and after it ends (see end)
+        before = self._measure()
+        before['overhead'] = self.overhead
+        before['wall'] = time.perf_counter()
+        return before
+
+    def end(self, name, before):
+        #counting by phases within this one is not part of its wall time
+        wall = time.perf_counter()-before['wall']-(self.overhead-before.get('overhead', self.overhead))
+        after = self._measure()
+        if self.stack and self.stack[-1] == name:
+            path = '/'.join(self.stack)
+            self.stack.pop()
+        else: #profiling enabled during this phase
+            path = '/'.join(self.stack+[name])
+        counts = after['counts']
+        record = {'phase':path, 'wall_sec':wall, 'rss_MB':after['rss'],
+                  'rss_change_MB':None, 'peak_rss_MB':peak_rss_MB()}
+        if before['rss'] is not None and record['rss_MB'] is not None:
+            record['rss_change_MB'] = record['rss_MB']-before['rss']
+        for key,num in counts.items():
+            record['total_'+key] = num
+            record['new_'+key] = num-before['counts'].get(key, 0)
+        self.records.append(record)
+        log.info('phase {} took {:.3f} sec, rss={} MB', path, wall, record['rss_MB'])
+        return record
+
+    @contextmanager
+    def phase(self, name):
+        before = self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name, before)
+
+    def write_report(self, prefix=None):
+        prefix = prefix or self.prefix
+        fields = []
+        for record in self.records:
+            fields += [key for key in record if key not in fields]
+        with open(prefix+'_profile.json', 'w') as f:
+            json.dump({'run':prefix, 'start_time':self.start_time, 'phases':self.records}, f, indent=1)
+        with open(prefix+'_profile.csv', 'w') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+        return prefix+'_profile.json'
+
+def enable(prefix, count_objects=True, count_messages=True):
+    '''start recording phases of this process'''
+    global _active
+    if _active is None or _active.prefix != prefix:
+        _active = Profile(prefix, count_objects, count_messages)
+    return _active
+
+def disable():
+    global _active
+    _active = None
+
+def active():
+    return _active
+
+@contextmanager
+def phase(name):
+    '''with profiling.phase('run'): moose.start(simtime)'''
+    if _active is None:
+        yield
+        return
+    profile = _active
+    before = profile.begin(name)
+    try:
+        yield
+    finally:
+        profile.end(name, before)
+
+def profiled(name=None):
+    '''decorator recording each call of a function as a phase'''
+    def decorator(func):
+        phase_name = name or func.__name__
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                #profiling may be enabled by the function, e.g. setupOptions
+                if _active is not None:
+                    _active.end(phase_name, {'wall':start, 'rss':None, 'counts':{}})
+                return result
+            profile = _active
+            before = profile.begin(phase_name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.end(phase_name, before)
+        return functools.update_wrapper(wrapper, func)
+    return decorator
+
+def setup(param_sim):
+    '''enable profiling if requested in param_sim; profile=True uses param_sim.fname as prefix'''
+    prefix = getattr(param_sim, 'profile', None)
+    if not prefix:
+        return None
+    if prefix is True:
+        prefix = param_sim.fname
+    return enable(prefix)
+
+def write_report(prefix=None):
+    '''write report of active profile, if any'''
+    if _active is not None:
+        return _active.write_report(prefix)
+
+def aggregate(files, outfile=None):
+    '''combine json reports of many runs into one list of records with a run column,
+    optionally written to csv file outfile'''
+    rows = []
+    for fname in files:
+        with open(fname) as f:
+            report = json.load(f)
+        rows += [dict(run=report['run'], **record) for record in report['phases']]
+    if outfile is not None:
+        fields = []
+        for row in rows:
+            fields += [key for key in row if key not in fields]
+        with open(outfile, 'w') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
@@ -0,0 +1,270 @@
+"""\
+Declarative selection of what to record, resolved once after the network is built.
+
+A recording spec is a list of Record, each selecting neurons of one population,
+compartments or synapses of those neurons, the variables to record and the
+sample interval.  resolve picks the neurons, compartments and synapses (with
+np.random, so seed first) and create makes one Table per recorded variable of
+each element, at the smallest interval requested for it, so that large runs
+record what the analysis needs and no more.
+
+Variables:
+  spikes            spike times of the soma spike generator (one per neuron)
+  Vm, Im, Ca        compartment voltage, membrane current and calcium (CaConc or outer DifShell)
+  <chan>.<field>    field of a channel of the compartment, e.g. NaF.Ik or CaL13.Gk
+  Gk, Ik            synaptic conductance and current of synchans of type Record.synapse
+  weight, plas      weight of the first synapse and output of plasticity (plasticity.plasticity2)
+
+Compartments (Record.comps): 'soma' (default for compartment variables), 'all'
+(default for synapse variables), 'spines' (spine heads) or a list of names;
+optionally restricted to the dendritic subtree starting at compartment
+Record.branch and to distances from the soma between mindist and maxdist.
+Synapses: stim=True only those receiving inputs, False only those without, per_neuron
+is the maximum number of compartments or synapses per neuron.
+
+Example:
+    from moose_nerp.prototypes import recording
+    spec=[recording.Record('D1',['spikes']),
+          recording.Record('D1',['Vm','Ca'],neurons=5,comps='all',maxdist=100e-6,per_neuron=4,dt=1e-4),
+          recording.Record('D1',['Gk','weight','plas'],fraction=0.1,synapse='ampa',stim=True,per_neuron=10)]
+    model.recorders=recording.record(spec,population['pop'],model.param_cond.NAME_SOMA)
+    ...run...
+    recording.save('D1_rec',model.recorders)
+"""
+from __future__ import print_function, division
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+from moose_nerp.prototypes.util import NamedList
+#moose is imported inside functions, so that recording specs can be checked without moose
+
+log = logutil.Logger()
+
+Record=NamedList('Record','''population
+                            variables
+                            neurons=None
+                            fraction=None
+                            comps=None
+                            branch=None
+                            mindist=None
+                            maxdist=None
+                            synapse=None
+                            stim=None
+                            per_neuron=None
+                            dt=None
+                            label=None''')
+
+#one recorded variable of one element: message of element (or of synapse index of a SynHandler)
+Target=NamedList('Target','path msg index=None dt=None')
+
+CELL_VARIABLES={'spikes':'spikeOut'}
+COMP_VARIABLES={'Vm':'getVm','Im':'getIm','Ca':None}
+SYN_VARIABLES={'Gk':'getGk','Ik':'getIk','weight':'getWeight','plas':'getValue'}
+NAME_PLAS='plas'
+NAME_SH='SH'
+
+def label(record):
+    return record.label or record.population+'_'+'-'.join(record.variables)
+
+def check(spec):
+    '''raise ValueError for unknown variables or incomplete records'''
+    for record in spec:
+        for var in record.variables:
+            if var in SYN_VARIABLES and record.synapse is None:
+                raise ValueError('{}: synapse variable {} needs Record.synapse'.format(label(record),var))
+            if not (var in CELL_VARIABLES or var in COMP_VARIABLES or var in SYN_VARIABLES or '.' in var):
+                raise ValueError('{}: unknown variable {}'.format(label(record),var))
+        if record.neurons is not None and record.fraction is not None:
+            raise ValueError('{}: give either neurons or fraction'.format(label(record)))
+
+def sample(items,count=None,fraction=None):
+    '''random subset (in original order) of count items, or of fraction of the items, or all items'''
+    num=len(items)
+    if fraction is not None:
+        num=int(np.round(fraction*len(items)))
+    if count is not None:
+        num=min(count,num)
+    if num>=len(items):
+        return list(items)
+    return [items[i] for i in np.sort(np.random.choice(len(items),num,replace=False))]
+
+def _subtree(comp):
+    #dendritic compartments distal to comp (parent raxial to child axial, see spines.makeSpine)
+    from moose_nerp.prototypes.spines import NAME_NECK
+    subtree=set()
+    todo=[comp]
+    while todo:
+        comp=todo.pop()
+        subtree.add(comp.path)
+        todo.extend(c for c in comp.neighbors['raxial'] if NAME_NECK not in c.name and c.path not in subtree)
+    return subtree
+
+def _compartments(cell,record,name_soma):
+    import moose
+    from moose_nerp.prototypes import util
+    from moose_nerp.prototypes.spines import NAME_HEAD
+    soma=moose.element(cell+'/'+name_soma)
+    comps=record.comps
+    if comps is None:
+        whole=record.synapse is not None or record.branch or record.mindist is not None or record.maxdist is not None
+        comps='all' if whole else 'soma'
+    if isinstance(comps,str) and comps=='soma':
+        selected=[soma]
+    elif isinstance(comps,str) and comps in ('all','spines'):
+        selected=moose.wildcardFind(cell+'/#[TYPE=Compartment]')
+    else:
+        selected=[moose.element(cell+'/'+comp) for comp in comps]
+    if record.branch:
+        subtree=_subtree(moose.element(cell+'/'+record.branch))
+        selected=[comp for comp in selected if comp.path in subtree]
+    if isinstance(comps,str) and comps=='spines':
+        selected=[head for comp in selected for head in moose.wildcardFind(comp.path+'/#'+NAME_HEAD+'#[ISA=CompartmentBase]')]
+    if record.mindist is not None or record.maxdist is not None:
+        mindist=record.mindist or 0
+        maxdist=np.inf if record.maxdist is None else record.maxdist
+        selected=[comp for comp in selected
+                  if mindist<=util.get_dist_name(comp,(soma.x,soma.y,soma.z))[0]<=maxdist]
+    return selected
+
+def _stimulated(sh):
+    #synapses made by connect.synconn have an addSpike message (plasticity may add an unconnected one)
+    return any(len(sh.synapse[s].neighbors['addSpike']) for s in range(sh.synapse.num))
+
+def _synchans(cell,record,comps):
+    import moose
+    paths=set(comp.path for comp in comps)
+    synchans=[]
+    for synchan in moose.wildcardFind(cell+'/##/'+record.synapse+'[ISA=SynChan]'):
+        if synchan.parent.path not in paths or not moose.exists(synchan.path+'/'+NAME_SH):
+            continue
+        if record.stim is not None and _stimulated(moose.element(synchan.path+'/'+NAME_SH))!=record.stim:
+            continue
+        synchans.append(synchan)
+    return synchans
+
+def calcium(comp):
+    '''Target for calcium of compartment comp (pool found as in plasticity.plasticity2), None if no calcium'''
+    for child in comp.children:
+        if child.className in ('CaConc','ZombieCaConc'):
+            return Target(child.path,'getCa')
+        if child.className in ('DifShell','ZombieDifShell'):
+            return Target(child.path,'getC')
+    return None
+
+def resolve(spec,pop,name_soma):
+    '''select elements of populations pop (neuron type: list of neuron paths, e.g. create_network
+    population['pop']) for recording spec.  Returns {label: {variable: [Target]}}'''
+    import moose
+    check(spec)
+    selection={}
+    for record in spec:
+        rec=selection.setdefault(label(record),{})
+        for var in record.variables:
+            rec.setdefault(var,[])
+        for cell in sample(pop.get(record.population,[]),record.neurons,record.fraction):
+            cellvars=[var for var in record.variables if var in CELL_VARIABLES]
+            for var in cellvars:
+                rec[var].append(Target(cell+'/'+name_soma+'/spikegen',CELL_VARIABLES[var],dt=record.dt))
+            if len(cellvars)==len(record.variables):
+                continue
+            comps=_compartments(cell,record,name_soma)
+            if record.synapse is not None:
+                #synapse variables are recorded from synchans, compartment variables from their compartments
+                synchans=sample(_synchans(cell,record,comps),record.per_neuron)
+                comps=[]
+                for synchan in synchans:
+                    if synchan.parent not in comps:
+                        comps.append(synchan.parent)
+            else:
+                comps=sample(comps,record.per_neuron)
+            for var in record.variables:
+                if var in SYN_VARIABLES:
+                    for synchan in synchans:
+                        if var=='weight':
+                            rec[var].append(Target(synchan.path+'/'+NAME_SH,'getWeight',index=0,dt=record.dt))
+                        elif var=='plas':
+                            if moose.exists(synchan.path+'/'+NAME_PLAS):
+                                rec[var].append(Target(synchan.path+'/'+NAME_PLAS,'getValue',dt=record.dt))
+                        else:
+                            rec[var].append(Target(synchan.path,SYN_VARIABLES[var],dt=record.dt))
+                elif var=='Ca':
+                    for comp in comps:
+                        target=calcium(comp)
+                        if target is not None:
+                            rec[var].append(Target(target.path,target.msg,dt=record.dt))
+                elif var in COMP_VARIABLES:
+                    rec[var].extend(Target(comp.path,COMP_VARIABLES[var],dt=record.dt) for comp in comps)
+                elif var not in CELL_VARIABLES:
+                    chan,field=var.split('.',1)
+                    rec[var].extend(Target(comp.path+'/'+chan,'get'+field,dt=record.dt) for comp in comps
+                                    if moose.exists(comp.path+'/'+chan))
+    return selection
+
+def _key(target):
+    return (target.path.replace('[0]',''),target.msg,target.index)
+
+def merge(selection):
+    '''one target per recorded variable of each element, at the smallest sample interval requested.
+    dt None is the plot interval (clock of Tables), larger than any explicit dt'''
+    merged={}
+    for rec in selection.values():
+        for targets in rec.values():
+            for target in targets:
+                key=_key(target)
+                if key not in merged:
+                    merged[key]=target
+                elif target.dt is not None and (merged[key].dt is None or target.dt<merged[key].dt):
+                    merged[key]=target
+    return merged
+
+def _table_name(target):
+    name=target.path.replace('[0]','').strip('/').replace('/','_')
+    if target.index is not None:
+        name+='_{}'.format(target.index)
+    return name+'_'+target.msg.replace('get','',1)
+
+def create(selection):
+    '''Tables for targets of resolve, shared between records.  Sample intervals other than
+    the plot interval use free clock ticks counted down from the last one.
+    Returns {label: {variable: [Table]}}'''
+    import moose
+    from moose_nerp.prototypes.tables import DATA_NAME
+    from moose_nerp.prototypes.clocks import NUM_TICKS, FIRST_FREE_TICK
+    if not moose.exists(DATA_NAME):
+        moose.Neutral(DATA_NAME)
+    num_ticks=getattr(moose.element('/clock'),'numTicks',NUM_TICKS)
+    ticks={}
+    tables={}
+    for key,target in merge(selection).items():
+        tab=moose.Table(DATA_NAME+'/'+_table_name(target))
+        element=moose.element(target.path)
+        if target.index is not None:
+            element=element.synapse[target.index]
+        if target.msg=='spikeOut':
+            moose.connect(element,'spikeOut',tab,'spike')
+        else:
+            moose.connect(tab,'requestOut',element,target.msg)
+        if target.dt is not None:
+            if target.dt not in ticks:
+                ticks[target.dt]=num_ticks-1-len(ticks)
+                if ticks[target.dt]<FIRST_FREE_TICK:
+                    raise ValueError('too many different sample intervals: {}'.format(sorted(ticks)))
+                moose.setClock(ticks[target.dt],target.dt)
+            tab.tick=ticks[target.dt]
+        tables[key]=tab
+    log.info('recording {} variables, sample intervals {}',len(tables),sorted(ticks))
+    return {name:{var:[tables[_key(target)] for target in targets] for var,targets in rec.items()}
+            for name,rec in selection.items()}
+
+def record(spec,pop,name_soma):
+    '''resolve and create recorders for spec, call after the network is built, before reinit'''
+    return create(resolve(spec,pop,name_soma))
+
+def vectors(recorders):
+    '''{label: {variable: {table name: vector}}} of recorders'''
+    return {name:{var:{tab.name:np.array(tab.vector) for tab in tabs} for var,tabs in rec.items()}
+            for name,rec in recorders.items()}
+
+def save(fname,recorders):
+    '''write vectors of recorders, one entry per label; read with np.load(fname,allow_pickle=True)[label].item()'''
+    np.savez(fname,**vectors(recorders))
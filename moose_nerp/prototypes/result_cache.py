@@ -0,0 +1,264 @@
+"""\
+Content addressed cache of simulation results for parameter sweeps.
+
+The key of a simulation is a SHA-256 hash of everything that determines its
+results:
+  - the simulation function, its arguments (e.g. trial parameters or mod_dict) and seed
+  - the values of the param_* modules of the model and network packages
+    (including connect_dict of param_net), as modified before the call
+  - the contents of the time table files of TableSets in those modules, and of other input_files
+  - the git revision of moose_nerp, and a hash of uncommitted changes to its source
+Overrides applied inside the simulation function depend only on its arguments
+and the source, which are both part of the key.
+
+Each entry is a directory cache_dir/<key> with the arrays of the returned
+results (written by result_store, memory mapped when loaded), result.pkl with
+the remaining structure, and copies of output files written by the function.
+When the total size exceeds max_MB, least recently used entries are deleted.
+
+    cache = result_cache.ResultCache('bg_net/output/cache', max_MB=5000)
+    results = cache.map(pool.map, moose_main, params, modules=['moose_nerp.bg_net', 'moose_nerp.spn_1comp'])
+    results = result_store.load(results)
+
+Only params not found in the cache are simulated.  Functions that write files
+instead of returning results give a glob pattern of their outputs (see submit).
+"""
+from __future__ import print_function, division
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import importlib
+import subprocess
+import types
+import numpy as np
+
+from moose_nerp.prototypes import logutil, result_store, spike_trains
+log = logutil.Logger()
+
+RESULT_FILE = 'result.pkl'
+OUTPUT_DIR = 'outputs'
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#incomplete entries (e.g. of killed workers) older than this many seconds are deleted by evict
+STALE_SEC = 24*3600
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _file_hash(path):
+    if not os.path.exists(path):
+        return 'missing'
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def canonical(obj, files, _active=None):
+    '''JSON serializable description of obj, independent of memory addresses and dict order;
+    filenames of TableSets are added to files'''
+    from moose_nerp.prototypes.ttables import TableSet
+    _active = _active or set()
+    if obj is None or isinstance(obj, (bool, str, int, float)):
+        return obj
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return ['ndarray', [canonical(v, files, _active) for v in obj.ravel()], list(obj.shape)]
+        return ['ndarray', str(obj.dtype), list(obj.shape), _sha(np.ascontiguousarray(obj).tobytes())]
+    if isinstance(obj, types.ModuleType):
+        return ['module', obj.__name__]
+    if isinstance(obj, (types.FunctionType, types.BuiltinFunctionType, type)):
+        #code is part of the source revision
+        return ['callable', getattr(obj, '__module__', None), getattr(obj, '__qualname__', obj.__name__)]
+    if id(obj) in _active:
+        return ['cycle', type(obj).__name__]
+    _active = _active | {id(obj)}
+    if isinstance(obj, TableSet):
+        files.update(spike_trains.train_files(obj.filename))
+    if isinstance(obj, dict):
+        items = [(json.dumps(canonical(k, files, _active), sort_keys=True), canonical(v, files, _active))
+                 for k, v in obj.items()]
+        return ['dict', sorted(items, key=lambda kv: kv[0])]
+    if isinstance(obj, (set, frozenset)):
+        return ['set', sorted(json.dumps(canonical(v, files, _active), sort_keys=True) for v in obj)]
+    if isinstance(obj, (list, tuple)):
+        #includes NamedList parameter records
+        return [type(obj).__name__, [canonical(v, files, _active) for v in obj]]
+    if hasattr(obj, '__dict__'):
+        return [type(obj).__name__, canonical(vars(obj), files, _active)]
+    return [type(obj).__name__, re.sub(r' at 0x[0-9a-fA-F]+', '', repr(obj))]
+
+def module_state(name, files):
+    '''canonical values of package name and its param_* modules'''
+    importlib.import_module(name)
+    state = {}
+    for modname in sorted(m for m in list(sys.modules) if m == name or m.startswith(name+'.param_')):
+        mod = sys.modules[modname]
+        if mod is None:
+            continue
+        state[modname] = canonical({k: v for k, v in vars(mod).items()
+                                    if not k.startswith('_') and not isinstance(v, types.ModuleType)}, files)
+    return state
+
+_revision = None
+def source_revision():
+    '''git revision of moose_nerp plus hash of uncommitted changes, or hash of the source files without git'''
+    global _revision
+    if _revision is None:
+        def git(*args):
+            return subprocess.run(('git',)+args, cwd=PACKAGE_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  check=True, universal_newlines=True).stdout
+        try:
+            diff = git('diff', 'HEAD', '--', '*.py')
+            _revision = git('rev-parse', 'HEAD').strip()+('+'+_sha(diff.encode())[:16] if diff else '')
+        except (OSError, subprocess.CalledProcessError):
+            h = hashlib.sha256()
+            for path in sorted(glob.glob(os.path.join(PACKAGE_DIR, '**', '*.py'), recursive=True)):
+                h.update(_file_hash(path).encode())
+            _revision = 'src-'+h.hexdigest()
+    return _revision
+
+def config_key(func, args=(), kwargs=None, modules=(), input_files=(), seed=None):
+    '''hash of the complete configuration of one simulation'''
+    files = set(input_files)
+    config = {'func': canonical(func, files),
+              'args': canonical(list(args), files),
+              'kwargs': canonical(kwargs or {}, files),
+              'seed': canonical(seed, files),
+              'modules': {name: module_state(name, files) for name in modules},
+              'revision': source_revision()}
+    config['files'] = {os.path.normpath(f): _file_hash(f) for f in sorted(files)}
+    return _sha(json.dumps(config, sort_keys=True).encode())
+
+class CachedCall(object):
+    '''Runs func(*args, **kwargs) in a worker and stores results, and output files
+    matching a glob pattern, in the cache entry of key.  Picklable, for use with Pool.map'''
+    def __init__(self, func, cache_dir, min_size=result_store.MIN_SIZE):
+        self.func = func
+        self.cache_dir = cache_dir
+        self.min_size = min_size
+
+    def __call__(self, job):
+        key, args, kwargs, outputs = job
+        entry = os.path.join(self.cache_dir, key)
+        start = time.time()
+        value = result_store.store(self.func(*args, **kwargs), entry, 'r', self.min_size)
+        saved = []
+        for path in sorted(glob.glob(outputs, recursive=True)) if outputs else []:
+            #only files written by this simulation
+            if os.path.getmtime(path) >= start-1:
+                dest = os.path.join(entry, OUTPUT_DIR, str(len(saved)))
+                if not os.path.isdir(os.path.dirname(dest)):
+                    os.makedirs(os.path.dirname(dest))
+                shutil.copy2(path, dest)
+                saved.append(path)
+        if not os.path.isdir(entry):
+            os.makedirs(entry)
+        #result file is written last and atomically: entries without it are incomplete
+        tmp = os.path.join(entry, RESULT_FILE+'.{}'.format(os.getpid()))
+        with open(tmp, 'wb') as f:
+            pickle.dump({'value': value, 'files': saved}, f)
+        os.replace(tmp, os.path.join(entry, RESULT_FILE))
+        return value
+
+class ResultCache(object):
+    def __init__(self, cache_dir, max_MB=None, min_size=result_store.MIN_SIZE):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_MB*1e6 if max_MB else None
+        self.min_size = min_size
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, func, args=(), kwargs=None, modules=(), input_files=(), seed=None):
+        return config_key(func, args, kwargs, modules, input_files, seed)
+
+    def lookup(self, key):
+        '''(True, stored results) or (False, None); restores output files of the entry'''
+        path = os.path.join(self.cache_dir, key, RESULT_FILE)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        for i, dest in enumerate(entry['files']):
+            if os.path.dirname(dest) and not os.path.isdir(os.path.dirname(dest)):
+                os.makedirs(os.path.dirname(dest))
+            shutil.copy2(os.path.join(self.cache_dir, key, OUTPUT_DIR, str(i)), dest)
+        #modification time of result file records last use, for eviction
+        os.utime(path, None)
+        return True, entry['value']
+
+    def call(self, func):
+        return CachedCall(func, self.cache_dir, self.min_size)
+
+    def map(self, map_func, func, params, outputs=None, **key_args):
+        '''map_func(func, params), e.g. with Pool.map, simulating only params not in the cache;
+        outputs: optional function of p giving a glob pattern of files written by func(p)'''
+        keys = [self.key(func, (p,), None, **key_args) for p in params]
+        results = [None]*len(params)
+        missing = []
+        for i, key in enumerate(keys):
+            found, results[i] = self.lookup(key)
+            if not found:
+                missing.append(i)
+        log.info('{} of {} simulations found in cache {}', len(params)-len(missing), len(params), self.cache_dir)
+        if len(missing):
+            jobs = [(keys[i], (params[i],), {}, outputs(params[i]) if outputs else None) for i in missing]
+            for i, value in zip(missing, map_func(self.call(func), jobs)):
+                results[i] = value
+        #results of this call are returned as handles to their files, which must not be deleted
+        self.evict(keep=keys)
+        return results
+
+    def submit(self, pool, func, args=(), kwargs=None, outputs=None, **key_args):
+        '''pool.apply_async(func, args, kwargs) unless in the cache; returns the AsyncResult,
+        or None if the results (and output files matching glob pattern outputs) were restored'''
+        key = self.key(func, args, kwargs, **key_args)
+        found, _ = self.lookup(key)
+        if found:
+            return None
+        return pool.apply_async(self.call(func), ((key, tuple(args), kwargs or {}, outputs),))
+
+    def entries(self):
+        '''[(last use, bytes, key)] of complete entries, and keys of stale incomplete entries'''
+        complete, stale = [], []
+        now = time.time()
+        for key in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, key)
+            if not os.path.isdir(entry):
+                continue
+            result = os.path.join(entry, RESULT_FILE)
+            if os.path.exists(result):
+                size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(entry) for f in fs)
+                complete.append((os.path.getmtime(result), size, key))
+            elif now-os.path.getmtime(entry) > STALE_SEC:
+                stale.append(key)
+        return sorted(complete), stale
+
+    def evict(self, keep=()):
+        '''delete least recently used entries until total size is below max_MB, or only keep are left'''
+        complete, stale = self.entries()
+        for key in stale:
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+        if self.max_bytes is None:
+            return []
+        total = sum(size for _, size, _ in complete)
+        deleted = []
+        for _, size, key in complete:
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            total -= size
+            deleted.append(key)
+        if len(deleted):
+            log.info('deleted {} least recently used entries from cache {}', len(deleted), self.cache_dir)
+        return deleted
@@ -0,0 +1,323 @@
+"""\
+Index of sweep results in a single sqlite file, replacing parameters encoded
+in file names.
+
+Each run of a sweep records its parameters, the location, shape and dtype of
+each output array, and summary metrics (e.g. firing rate of each population).
+Arrays are .npy files written by result_store (memory mapped when accessed),
+small arrays stored in the index itself, or text files of tables.write_textfile.
+
+    index = result_index.ResultIndex('bg_net/output/results/index.sqlite')
+    runs = index.select('bg_net', ctxfreq='20', trial=('<', 5))
+    rates = runs.metric('rate/D1')
+    vm = runs[0]['vm/D1/0']            #only this array is read
+
+Selecting runs only reads the index; arrays are opened when a run is indexed
+by array name.  Several worker processes may add runs to the same index.
+Existing outputs with parameters in file names can be added with
+add_files and a parser such as parse_upstate_name.
+"""
+from __future__ import print_function, division
+import os
+import re
+import io
+import glob
+import json
+import time
+import sqlite3
+import numpy as np
+
+from moose_nerp.prototypes import logutil, result_store
+log = logutil.Logger()
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, sweep TEXT, name TEXT, params TEXT, created REAL);
+CREATE TABLE IF NOT EXISTS params (run INTEGER, name TEXT, num REAL, txt TEXT);
+CREATE TABLE IF NOT EXISTS arrays (run INTEGER, name TEXT, path TEXT, format TEXT, shape TEXT, dtype TEXT, data BLOB);
+CREATE TABLE IF NOT EXISTS metrics (run INTEGER, name TEXT, value REAL);
+CREATE INDEX IF NOT EXISTS params_name ON params (name, num, txt);
+CREATE INDEX IF NOT EXISTS runs_sweep ON runs (sweep);
+CREATE INDEX IF NOT EXISTS arrays_run ON arrays (run, name);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run, name);
+'''
+#one run per name of a sweep: adding a run again replaces it
+UNIQUE_RUNS = 'CREATE UNIQUE INDEX IF NOT EXISTS runs_name ON runs (sweep, name)'
+RUN_TABLES = ('params', 'arrays', 'metrics')
+OPERATORS = {'=', '!=', '<', '<=', '>', '>='}
+
+def flatten(obj, prefix=''):
+    '''{name: value} of the leaves of nested dicts, lists and tuples; names are keys joined by /'''
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, (list, tuple)):
+        items = enumerate(obj)
+    else:
+        return {prefix: obj}
+    out = {}
+    for key, value in items:
+        out.update(flatten(value, '{}/{}'.format(prefix, key) if prefix else str(key)))
+    return out
+
+def _param_value(value):
+    #numbers are compared numerically, everything else as text
+    if isinstance(value, (bool, np.bool_)):
+        return float(value), None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value), None
+    try:
+        return float(value), None
+    except (TypeError, ValueError):
+        return None, str(value)
+
+def _text_shape(path):
+    #rows and columns of a text table, without parsing numbers
+    rows, cols = 0, 0
+    with open(path) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            if rows == 0:
+                cols = len(line.split())
+            rows += 1
+    return [rows, cols]
+
+class Run(object):
+    '''One indexed run: params and metrics are read with the index, arrays when accessed'''
+    def __init__(self, index, run_id, sweep, name, params):
+        self.index = index
+        self.id = run_id
+        self.sweep = sweep
+        self.name = name
+        self.params = params
+        self._metrics = None
+
+    @property
+    def metrics(self):
+        if self._metrics is None:
+            rows = self.index.execute('SELECT name, value FROM metrics WHERE run=?', (self.id,))
+            self._metrics = dict(rows)
+        return self._metrics
+
+    def array_names(self):
+        return [row[0] for row in self.index.execute('SELECT name FROM arrays WHERE run=? ORDER BY rowid', (self.id,))]
+
+    def info(self, name):
+        '''(path, format, shape, dtype) of array name, without reading it'''
+        row = self.index.execute('SELECT path, format, shape, dtype FROM arrays WHERE run=? AND name=?',
+                                 (self.id, name)).fetchone()
+        if row is None:
+            raise KeyError('{} has no array {}'.format(self.name, name))
+        return row[0], row[1], tuple(json.loads(row[2])), row[3]
+
+    def __getitem__(self, name):
+        row = self.index.execute('SELECT path, format, data FROM arrays WHERE run=? AND name=?',
+                                 (self.id, name)).fetchone()
+        if row is None:
+            raise KeyError('{} has no array {}'.format(self.name, name))
+        path, fmt, data = row
+        if fmt == 'blob':
+            return np.load(io.BytesIO(data))
+        if fmt == 'txt':
+            return np.loadtxt(path)
+        if fmt == 'npz':
+            return np.load(path, allow_pickle=True)
+        return np.load(path, mmap_mode='r')
+
+    def __repr__(self):
+        return 'Run({}, {}, {})'.format(self.sweep, self.name, self.params)
+
+class Dataset(object):
+    '''Runs selected from an index; list-like'''
+    def __init__(self, runs):
+        self.runs = runs
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Dataset(self.runs[i])
+        return self.runs[i]
+
+    def param(self, name):
+        return np.array([run.params.get(name) for run in self.runs])
+
+    def metric(self, name):
+        return np.array([run.metrics.get(name, np.nan) for run in self.runs])
+
+    def arrays(self, name):
+        '''array name of each run, each opened only when the generator reaches it'''
+        return (run[name] for run in self.runs)
+
+    def where(self, func):
+        '''runs for which func(run) is true, e.g. lambda run: run.metrics['rate/D1'] > 5'''
+        return Dataset([run for run in self.runs if func(run)])
+
+class ResultIndex(object):
+    def __init__(self, path, timeout=60):
+        self.path = os.path.abspath(path)
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        #workers of a pool add runs concurrently: wait for the write lock instead of failing
+        self.db = sqlite3.connect(self.path, timeout=timeout)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        with self.db:
+            #indexes written before runs were unique keep the last run of each name
+            old = 'SELECT id FROM runs WHERE id NOT IN (SELECT MAX(id) FROM runs GROUP BY sweep, name)'
+            for table in RUN_TABLES:
+                self.db.execute('DELETE FROM {} WHERE run IN ({})'.format(table, old))
+            self.db.execute('DELETE FROM runs WHERE id IN ({})'.format(old))
+            self.db.execute(UNIQUE_RUNS)
+
+    def execute(self, sql, args=()):
+        return self.db.execute(sql, args)
+
+    def close(self):
+        self.db.close()
+
+    def add_run(self, sweep, params, arrays=None, metrics=None, name=None):
+        '''record one run, replacing a run of sweep with the same name;
+        arrays: {name: ArrayHandle, ndarray (stored in the index) or text file path}'''
+        name = name or '_'.join('{}{}'.format(k, v) for k, v in sorted(params.items()))
+        with self.db:
+            old = 'SELECT id FROM runs WHERE sweep=? AND name=?'
+            for table in RUN_TABLES:
+                self.db.execute('DELETE FROM {} WHERE run IN ({})'.format(table, old), (sweep, name))
+            self.db.execute('DELETE FROM runs WHERE sweep=? AND name=?', (sweep, name))
+            cur = self.db.execute('INSERT INTO runs (sweep, name, params, created) VALUES (?,?,?,?)',
+                                  (sweep, name, json.dumps(params, default=str), time.time()))
+            run_id = cur.lastrowid
+            self.db.executemany('INSERT INTO params VALUES (?,?,?,?)',
+                                [(run_id, k)+_param_value(v) for k, v in params.items()])
+            rows = []
+            for aname, value in (arrays or {}).items():
+                if isinstance(value, result_store.ArrayHandle):
+                    rows.append((run_id, aname, os.path.abspath(value.path), 'npy', json.dumps(list(value.shape)), str(value.dtype), None))
+                elif isinstance(value, np.ndarray):
+                    buf = io.BytesIO()
+                    np.save(buf, value)
+                    rows.append((run_id, aname, None, 'blob', json.dumps(list(value.shape)), str(value.dtype), buf.getvalue()))
+                elif value.endswith('.npz'):
+                    #archive of several arrays, opened lazily with np.load
+                    rows.append((run_id, aname, os.path.abspath(value), 'npz', '[]', 'npz', None))
+                elif value.endswith('.npy'):
+                    arr = np.load(value, mmap_mode='r')
+                    rows.append((run_id, aname, os.path.abspath(value), 'npy', json.dumps(list(arr.shape)), str(arr.dtype), None))
+                else:
+                    rows.append((run_id, aname, os.path.abspath(value), 'txt', json.dumps(_text_shape(value)), 'float64', None))
+            self.db.executemany('INSERT INTO arrays VALUES (?,?,?,?,?,?,?)', rows)
+            self.db.executemany('INSERT INTO metrics VALUES (?,?,?)',
+                                [(run_id, k, float(v)) for k, v in (metrics or {}).items()])
+        return run_id
+
+    def add_results(self, sweep, params, results, metrics=None, name=None):
+        '''record arrays of results returned by result_store.store (nested dicts and lists),
+        named by their keys joined by /; other values are not recorded'''
+        arrays = {k: v for k, v in flatten(results).items()
+                  if isinstance(v, result_store.ArrayHandle) or (isinstance(v, np.ndarray) and v.dtype != object)}
+        return self.add_run(sweep, params, arrays, metrics, name)
+
+    def add_files(self, sweep, pattern, parse, metrics=None):
+        '''record existing files matching glob pattern; parse(filename) returns (params, array name)
+        or None to skip; files with the same params are one run'''
+        runs = {}
+        for path in sorted(glob.glob(pattern)):
+            parsed = parse(os.path.basename(path))
+            if parsed is None:
+                continue
+            params, aname = parsed
+            runs.setdefault(json.dumps(params, sort_keys=True), (params, {}))[1][aname] = path
+        for params, arrays in runs.values():
+            self.add_run(sweep, params, arrays, metrics(arrays) if metrics else None)
+        log.info('indexed {} runs of {} files matching {}', len(runs), sum(len(a) for _, a in runs.values()), pattern)
+        return len(runs)
+
+    def sweeps(self):
+        return [row[0] for row in self.execute('SELECT DISTINCT sweep FROM runs')]
+
+    def select(self, sweep=None, **predicates):
+        '''runs with parameters matching predicates: value, (operator, value) or list of values'''
+        sql, args = ['SELECT id, sweep, name, params FROM runs WHERE 1'], []
+        if sweep is not None:
+            sql.append('AND sweep=?')
+            args.append(sweep)
+        for pname, pred in predicates.items():
+            if isinstance(pred, list):
+                values = [_param_value(v) for v in pred]
+                #an empty list matches no run
+                cond = ' OR '.join('(num=? OR txt=?)' for _ in values) or '0'
+                args += [pname]+[x for v in values for x in v]
+            else:
+                op, value = pred if isinstance(pred, tuple) else ('=', pred)
+                if op not in OPERATORS:
+                    raise ValueError('unknown operator {} for {}'.format(op, pname))
+                num, txt = _param_value(value)
+                cond = 'num {} ?'.format(op) if num is not None else 'txt {} ?'.format(op)
+                args += [pname, num if num is not None else txt]
+            sql.append('AND id IN (SELECT run FROM params WHERE name=? AND ({}))'.format(cond))
+        rows = self.execute(' '.join(sql)+' ORDER BY id', args).fetchall()
+        return Dataset([Run(self, run_id, sw, name, json.loads(params)) for run_id, sw, name, params in rows])
+
+class IndexedResult(result_store.StoredResult):
+    '''StoredResult that also records the run in the index at index_path:
+    params of the run are dict(zip(param_names, p)), metrics(results) gives summary metrics,
+    result_names name the elements of a tuple of results (e.g. vm, spike_time)'''
+    def __init__(self, func, result_dir, index_path, sweep, param_names, metrics=None, result_names=None,
+                 min_size=result_store.MIN_SIZE):
+        super(IndexedResult, self).__init__(func, result_dir, min_size)
+        self.index_path = index_path
+        self.sweep = sweep
+        self.param_names = param_names
+        self.metrics = metrics
+        self.result_names = result_names
+
+    def _name(self, p):
+        return '_'.join(str(x) for x in p).replace('/', '-').replace(' ', '')
+
+    def _add(self, index, p, stored, results):
+        named = dict(zip(self.result_names, stored)) if self.result_names else stored
+        index.add_results(self.sweep, dict(zip(self.param_names, p)), named,
+                          self.metrics(results) if self.metrics else None, name=self._name(p))
+
+    def __call__(self, p):
+        results = self.func(p)
+        stored = result_store.store(results, self.result_dir, self._name(p), self.min_size)
+        index = ResultIndex(self.index_path)
+        self._add(index, p, stored, results)
+        index.close()
+        return stored
+
+    def add(self, params, stored):
+        '''record runs of params whose results were stored elsewhere, e.g. by result_cache.map.
+        Arrays stay where they are: evicted cache entries are recorded again when the sweep is rerun'''
+        index = ResultIndex(self.index_path)
+        for p, st in zip(params, stored):
+            self._add(index, p, st, result_store.load(st))
+        index.close()
+
+################ parsers of file names of existing sweeps
+#model name and injection (nA, format .4g) are not separated in sim_upstate names, so models are listed
+UPSTATE_MODELS = ('D1PatchSample5', 'D1MatrixSample2')
+UPSTATE_NAME = r'param_set_(?P<param_set>\d+)__(?P<sim>.+?)__dispersed_freq_(?P<freq_dispersed>[^_]+)__(?P<model>{})(?P<inj>-?[\d.]+(e-?\d+)?)(?P<table>Vm|Ca|SpVm|SpCa)\.txt$'
+EP_NAME = re.compile(r'ep(?P<stimtype>AP|PSP)_(?P<presyn>.+?)_freq(?P<freq>[\d.]+)_plas(?P<plas>\d)_inj(?P<inj>[-\d.e]+)\.npz$')
+
+def parse_upstate_name(filename, models=UPSTATE_MODELS):
+    '''params and table name of sim_upstate text files, e.g.
+    param_set_1__upstate_plus_dispersed__dispersed_freq_375__D1PatchSample50Vm.txt'''
+    m = re.match(UPSTATE_NAME.format('|'.join(re.escape(model) for model in models)), filename)
+    if m is None:
+        return None
+    params = {k: m.group(k) for k in ('param_set', 'sim', 'freq_dispersed', 'model', 'inj')}
+    params['param_set'] = int(params['param_set'])
+    return params, m.group('table')
+
+def parse_ep_name(filename):
+    '''params of ep/multisim output files, e.g. epPSP_str_freq20_plas1_inj0.0.npz'''
+    m = EP_NAME.match(filename)
+    if m is None:
+        return None
+    return m.groupdict(), 'npz'
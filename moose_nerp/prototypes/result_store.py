@@ -0,0 +1,109 @@
+"""\
+Transport of simulation results from worker processes to the parent.
+
+Instead of returning vm, synaptic and plasticity vectors through Pool.map
+(which pickles every array through a pipe), a worker calls store() on its
+results: each large numpy array is written to a .npy file in result_dir
+and replaced by a small ArrayHandle.  The parent calls load() on the
+returned structure; arrays are opened as read-only memory maps, so data
+are only read from disk when accessed.
+
+Memory mapped files are used rather than shared memory segments, because
+workers started with maxtasksperchild=1 exit after each simulation, which
+would release their segments.
+
+The .npy files belong to the caller that chose result_dir: nothing here
+deletes them, since result_index and result_cache keep referring to them.
+A later run with the same parameters overwrites them; call remove() on the
+returned structure to delete them once the loaded arrays are no longer used.
+"""
+from __future__ import print_function, division
+import os
+import numpy as np
+
+#arrays with fewer elements are returned inline
+MIN_SIZE = 1000
+
+class ArrayHandle(object):
+    '''Reference to an array stored in a .npy file'''
+    def __init__(self, path, shape, dtype):
+        self.path = path
+        self.shape = shape
+        self.dtype = dtype
+
+    def load(self):
+        return np.load(self.path, mmap_mode='r')
+
+    def __repr__(self):
+        return 'ArrayHandle({}, shape={}, dtype={})'.format(self.path, self.shape, self.dtype)
+
+def _write(array, path):
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+    out[...] = array
+    out.flush()
+    del out
+    return ArrayHandle(path, array.shape, array.dtype)
+
+def _sequence(obj, items):
+    #namedtuples take their fields as arguments
+    if hasattr(obj, '_fields'):
+        return obj.__class__(*items)
+    return obj.__class__(items)
+
+def store(results, result_dir, prefix, min_size=MIN_SIZE):
+    '''Write all arrays in results (nested dicts, lists and tuples) with at least
+    min_size elements to result_dir, returns same structure with ArrayHandles'''
+    if not os.path.isdir(result_dir):
+        os.makedirs(result_dir)
+    count = [0]
+    def convert(obj):
+        if isinstance(obj, dict):
+            return obj.__class__((k, convert(v)) for k, v in obj.items())
+        if isinstance(obj, (list, tuple)):
+            return _sequence(obj, [convert(v) for v in obj])
+        if isinstance(obj, np.ndarray) and obj.dtype != object and obj.size >= min_size:
+            count[0] += 1
+            path = os.path.join(result_dir, '{}_{}.npy'.format(prefix, count[0]))
+            return _write(np.ascontiguousarray(obj), path)
+        return obj
+    return convert(results)
+
+def load(results):
+    '''Replace ArrayHandles in results by read-only memory mapped arrays'''
+    if isinstance(results, ArrayHandle):
+        return results.load()
+    if isinstance(results, dict):
+        return results.__class__((k, load(v)) for k, v in results.items())
+    if isinstance(results, (list, tuple)):
+        return _sequence(results, [load(v) for v in results])
+    return results
+
+def files(results):
+    '''All files referenced by ArrayHandles in results, e.g. to delete them'''
+    if isinstance(results, ArrayHandle):
+        return [results.path]
+    if isinstance(results, dict):
+        results = list(results.values())
+    if isinstance(results, (list, tuple)):
+        return [f for v in results for f in files(v)]
+    return []
+
+def remove(results):
+    '''Delete all files referenced by ArrayHandles in results'''
+    for path in files(results):
+        if os.path.exists(path):
+            os.remove(path)
+
+class StoredResult(object):
+    '''Wraps a simulation function so that a worker stores its results in
+    result_dir and returns only handles.  Picklable, for use with Pool.map.
+    Files are named after the parameters and kept until remove() is called'''
+    def __init__(self, func, result_dir, min_size=MIN_SIZE):
+        self.func = func
+        self.result_dir = result_dir
+        self.min_size = min_size
+
+    def __call__(self, p):
+        prefix = '_'.join(str(x) for x in p) if isinstance(p, (list, tuple)) else str(p)
+        prefix = prefix.replace('/', '-').replace(' ', '')
+        return store(self.func(p), self.result_dir, prefix, self.min_size)
@@ -459,7 +459,8 @@ if __name__ == '__main__':
 
     moose.reinit()
     moose.start(.4)
-    create_model_sim.neuron_graph.graphs(model, model.vmtab, False,.4)
+    from moose_nerp.graph import neuron_graph, plot_channel
+    neuron_graph.graphs(model, model.vmtab, False,.4)
     from matplotlib import pyplot as plt
     plt.ion()
     plt.show()
@@ -480,7 +481,7 @@ if __name__ == '__main__':
         plt.plot(cur.vector,label=cur.name.strip('_'))
     
     plt.legend()
-    create_model_sim.plot_channel.plot_gate_params(moose.element('/library/CaT32'),3)
+    plot_channel.plot_gate_params(moose.element('/library/CaT32'),3)
 
     
     for c,d in model.gatetables.items():
@@ -0,0 +1,294 @@
+"""\
+Generation and storage of input spike trains for TableSet time tables.
+
+Trains are generated for all trains at once, as flat arrays of (train, time):
+inhomogeneous Poisson trains by thinning, with the rate given as a function
+of time (constant, oscillation, ramp, pulse), and renewal trains with
+lognormal ISIs.  Pairwise correlation of Poisson trains comes from shared
+source trains: every train of a group (e.g. the trains of one neuron) takes
+each spike of the group's source with probability q, and all trains share a
+global source, so that the correlation of spike counts is corr within a
+group and corr_between between groups, while every train remains Poisson
+with the requested rate.
+
+    trains = spike_trains.poisson(10000, spike_trains.oscillation(10, 7, 0.7), simtime=2, corr=0.1, seed=1)
+    spike_trains.save('bg_net/Ctx10000_osc_freq7_osc0.7', trains)
+
+save writes <name>.times.npy (all spike times, train after train) and
+<name>.offsets.npy (start of each train); load opens them as memory maps,
+so that TableSet reads trains without unpickling, or returns the spikeTime
+object array of <name>.npz files made elsewhere.
+
+    python -m moose_nerp.prototypes.spike_trains osc bg_net/Ctx10000_osc_freq7_osc0.7 --num 10000 --rate 10 --freq 7 --depth 0.7 --simtime 2
+"""
+from __future__ import print_function, division
+import os
+import numpy as np
+
+from moose_nerp.prototypes import logutil
+log = logutil.Logger()
+
+#spike pairs evaluated at once when trains take spikes of their source
+CHUNK = 10**7
+
+class SpikeTrains(object):
+    '''spike trains as all spike times (sorted within each train) and offsets of each train'''
+    def __init__(self, times, offsets):
+        self.times = times
+        self.offsets = offsets
+
+    @classmethod
+    def from_spikes(cls, train, times, num):
+        '''from spike times and their train numbers, in any order'''
+        order = np.lexsort((times, train))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(train, minlength=num))])
+        return cls(np.asarray(times, dtype=float)[order], offsets)
+
+    @classmethod
+    def from_list(cls, trains):
+        '''from a sequence of spike time arrays, e.g. the spikeTime object array of .npz input files'''
+        return cls.from_spikes(np.repeat(np.arange(len(trains)), [len(t) for t in trains]),
+                               np.concatenate([np.asarray(t, dtype=float) for t in trains] or [np.zeros(0)]),
+                               len(trains))
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, i):
+        return self.times[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def train_numbers(self):
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def rates(self, simtime):
+        return np.diff(self.offsets)/simtime
+
+################ rate functions of time, vectorized
+class constant(object):
+    def __init__(self, rate):
+        self.rate = rate
+
+    def __call__(self, t):
+        return np.full(np.shape(t), float(self.rate))
+
+    def max(self):
+        return self.rate
+
+class oscillation(object):
+    '''rate*(1+depth*sin(2*pi*freq*t))'''
+    def __init__(self, rate, freq, depth):
+        self.rate, self.freq, self.depth = rate, freq, depth
+
+    def __call__(self, t):
+        return self.rate*(1+self.depth*np.sin(2*np.pi*self.freq*np.asarray(t)))
+
+    def max(self):
+        return self.rate*(1+abs(self.depth))
+
+class ramp(object):
+    '''rate, increasing linearly to peak from start to start+dur, then back to rate'''
+    def __init__(self, rate, peak, start, dur):
+        self.rate, self.peak, self.start, self.dur = rate, peak, start, dur
+
+    def __call__(self, t):
+        frac = (np.asarray(t)-self.start)/self.dur
+        return np.where((frac >= 0) & (frac < 1), self.rate+(self.peak-self.rate)*frac, self.rate)
+
+    def max(self):
+        return max(self.rate, self.peak)
+
+class pulse(object):
+    '''peak from start to start+dur, repeated every period if given, otherwise rate'''
+    def __init__(self, rate, peak, start, dur, period=None):
+        self.rate, self.peak, self.start, self.dur, self.period = rate, peak, start, dur, period
+
+    def __call__(self, t):
+        t = np.asarray(t)-self.start
+        if self.period:
+            on = (t >= 0) & (np.mod(t, self.period) < self.dur)
+        else:
+            on = (t >= 0) & (t < self.dur)
+        return np.where(on, self.peak, self.rate)
+
+    def max(self):
+        return max(self.rate, self.peak)
+
+def _poisson_spikes(num, rate, simtime, rng):
+    #train numbers and times of num independent inhomogeneous Poisson trains, by thinning
+    rmax = rate.max()
+    counts = rng.poisson(rmax*simtime, size=num)
+    train = np.repeat(np.arange(num), counts)
+    times = rng.uniform(0, simtime, size=len(train))
+    keep = rng.uniform(size=len(times))*rmax < rate(times)
+    return train[keep], times[keep]
+
+def _take(members, source, prob, jitter, simtime, rng):
+    #each of members takes each spike of source with probability prob, jittered
+    train, times = [], []
+    step = max(1, CHUNK//max(len(source), 1))
+    for start in range(0, len(members), step):
+        chunk = members[start:start+step]
+        idx, spike = np.nonzero(rng.uniform(size=(len(chunk), len(source))) < prob)
+        train.append(chunk[idx])
+        times.append(source[spike])
+    train, times = np.concatenate(train), np.concatenate(times)
+    if jitter:
+        times = np.abs(times+rng.normal(0, jitter, size=len(times)))
+        keep = times < simtime
+        train, times = train[keep], times[keep]
+    return train, times
+
+def poisson(num, rate, simtime, corr=0, corr_between=0, groups=None, jitter=0, seed=None):
+    '''num Poisson trains with rate(t) (a number or rate function) during simtime.
+    corr: correlation of spike counts between trains of a group, corr_between: between groups;
+    groups: group of each train (default all trains in one group); jitter: SD (sec) of shared spike times'''
+    rng = np.random.RandomState(seed)
+    rate = rate if callable(rate) else constant(rate)
+    if not 0 <= corr_between <= corr <= 1:
+        raise ValueError('need 0 <= corr_between <= corr <= 1, not {}, {}'.format(corr_between, corr))
+    groups = np.zeros(num, dtype=int) if groups is None else np.asarray(groups)
+    parts = []
+    if corr_between > 0:
+        #global source: rate corr_between*rate(t), all spikes go to all trains
+        _, source = _poisson_spikes(1, _scaled(rate, corr_between), simtime, rng)
+        parts.append(_take(np.arange(num), source, 1, jitter, simtime, rng))
+    q = (corr-corr_between)/(1-corr_between) if corr_between < 1 else 0
+    if q > 0:
+        #group source of rate (1-corr_between)*rate(t)/q, thinned by each train with probability q
+        for g in np.unique(groups):
+            _, source = _poisson_spikes(1, _scaled(rate, (1-corr_between)/q), simtime, rng)
+            parts.append(_take(np.where(groups == g)[0], source, q, jitter, simtime, rng))
+    elif corr_between < 1:
+        parts.append(_poisson_spikes(num, _scaled(rate, 1-corr_between), simtime, rng))
+    train = np.concatenate([p[0] for p in parts])
+    times = np.concatenate([p[1] for p in parts])
+    return SpikeTrains.from_spikes(train, times, num)
+
+class _scaled(object):
+    def __init__(self, rate, factor):
+        self.rate, self.factor = rate, factor
+
+    def __call__(self, t):
+        return self.factor*self.rate(t)
+
+    def max(self):
+        return self.factor*self.rate.max()
+
+def lognormal(num, rate, simtime, cv=1.0, rate_cv=0, seed=None):
+    '''num renewal trains with lognormal ISIs of mean 1/rate and coefficient of variation cv;
+    rate_cv: the rates of trains are lognormal with mean rate and this coefficient of variation'''
+    rng = np.random.RandomState(seed)
+    rates = np.full(num, float(rate))
+    if rate_cv:
+        s2 = np.log(1+rate_cv**2)
+        rates = rate*np.exp(rng.normal(-s2/2, np.sqrt(s2), size=num))
+    sigma = np.sqrt(np.log(1+cv**2))
+    mu = -np.log(rates)-sigma**2/2
+    #enough ISIs for nearly all trains; trains that are still short get more
+    k = int(np.ceil(simtime*np.max(rates)*1.2+5*np.sqrt(simtime*np.max(rates))+5))
+    isi = np.exp(mu[:, None]+sigma*rng.normal(size=(num, k)))
+    #stationary start: the first spike is at a random point in the first ISI
+    isi[:, 0] *= rng.uniform(size=num)
+    times = np.cumsum(isi, axis=1)
+    while np.any(times[:, -1] < simtime):
+        short = times[:, -1] < simtime
+        more = times[short, -1:]+np.cumsum(np.exp(mu[short, None]+sigma*rng.normal(size=(np.sum(short), k))), axis=1)
+        times = np.hstack([times, np.full((num, k), np.inf)])
+        times[short, -k:] = more
+    train, spike = np.nonzero(times < simtime)
+    return SpikeTrains.from_spikes(train, times[train, spike], num)
+
+def truncate(trains, maxtime):
+    '''trains without spikes later than maxtime'''
+    train, times = trains.train_numbers(), np.asarray(trains.times)
+    keep = times <= maxtime
+    return SpikeTrains(times[keep], np.concatenate([[0], np.cumsum(np.bincount(train[keep], minlength=len(trains)))]))
+
+def shuffle_isis(trains, maxtime=None, rng=np.random):
+    '''trains with the ISIs (from 0) of each train randomly permuted, after dropping spikes later than maxtime'''
+    if maxtime is not None:
+        trains = truncate(trains, maxtime)
+    train, times, offsets = trains.train_numbers(), np.asarray(trains.times), trains.offsets
+    first = np.zeros(len(times), dtype=bool)
+    first[offsets[:-1][offsets[:-1] < len(times)]] = True
+    isi = np.where(first, times, times-np.concatenate([[0], times[:-1]]))
+    isi = isi[np.lexsort((rng.uniform(size=len(isi)), train))]
+    total = np.cumsum(isi)
+    start = np.concatenate([[0], total])[offsets[:-1]]
+    return SpikeTrains(total-np.repeat(start, np.diff(offsets)), offsets)
+
+################ storage
+def store_files(filename):
+    return filename+'.times.npy', filename+'.offsets.npy'
+
+def save(filename, trains):
+    '''write trains (SpikeTrains or list of arrays) as memory mappable spike store'''
+    if not isinstance(trains, SpikeTrains):
+        trains = SpikeTrains.from_list(trains)
+    times_file, offsets_file = store_files(filename)
+    np.save(offsets_file, np.asarray(trains.offsets, dtype=np.int64))
+    np.save(times_file, np.asarray(trains.times, dtype=float))
+    log.info('{}: {} trains, {} spikes', filename, len(trains), len(trains.times))
+
+def train_files(filename):
+    '''files read by load(filename): spike store if it exists, otherwise filename.npz'''
+    files = store_files(filename)
+    if all(os.path.exists(f) for f in files):
+        return list(files)
+    return [filename+'.npz']
+
+def load(filename):
+    '''SpikeTrains of spike store filename (memory mapped), or of spikeTime of filename.npz'''
+    times_file, offsets_file = store_files(filename)
+    if os.path.exists(offsets_file):
+        return SpikeTrains(np.load(times_file, mmap_mode='r'), np.load(offsets_file))
+    with np.load(filename+'.npz', encoding='latin1', allow_pickle=True) as spike_file:
+        return SpikeTrains.from_list(spike_file['spikeTime'])
+
+def num_trains(filename):
+    '''number of trains, without reading spike times'''
+    offsets_file = store_files(filename)[1]
+    if os.path.exists(offsets_file):
+        return len(np.load(offsets_file, mmap_mode='r'))-1
+    with np.load(filename+'.npz', encoding='latin1', allow_pickle=True) as spike_file:
+        return len(spike_file['spikeTime'])
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='generate input spike trains for TableSet')
+    parser.add_argument('kind', choices=['poisson', 'osc', 'ramp', 'pulse', 'lognorm'])
+    parser.add_argument('filename', help='output, without extension')
+    parser.add_argument('--num', type=int, required=True)
+    parser.add_argument('--simtime', type=float, required=True)
+    parser.add_argument('--rate', type=float, required=True, help='mean (osc, lognorm) or baseline rate (ramp, pulse)')
+    parser.add_argument('--freq', type=float, help='oscillation frequency')
+    parser.add_argument('--depth', type=float, default=0.5, help='oscillation depth')
+    parser.add_argument('--peak', type=float, help='peak rate of ramp or pulse')
+    parser.add_argument('--start', type=float, default=0)
+    parser.add_argument('--dur', type=float, help='ramp or pulse duration')
+    parser.add_argument('--period', type=float, help='pulse period')
+    parser.add_argument('--cv', type=float, default=1.0, help='ISI coefficient of variation of lognorm trains')
+    parser.add_argument('--rate_cv', type=float, default=0, help='variation of rates of lognorm trains')
+    parser.add_argument('--corr', type=float, default=0)
+    parser.add_argument('--corr_between', type=float, default=0)
+    parser.add_argument('--group_size', type=int, help='consecutive trains in a correlated group, e.g. syn_per_tt')
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(args)
+    if args.kind == 'lognorm':
+        trains = lognormal(args.num, args.rate, args.simtime, args.cv, args.rate_cv, args.seed)
+    else:
+        rate = {'poisson': lambda: constant(args.rate),
+                'osc': lambda: oscillation(args.rate, args.freq, args.depth),
+                'ramp': lambda: ramp(args.rate, args.peak, args.start, args.dur),
+                'pulse': lambda: pulse(args.rate, args.peak, args.start, args.dur, args.period)}[args.kind]()
+        groups = np.arange(args.num)//args.group_size if args.group_size else None
+        trains = poisson(args.num, rate, args.simtime, args.corr, args.corr_between, groups, args.jitter, args.seed)
+    save(args.filename, trains)
+    return trains
+
+if __name__ == '__main__':
+    main()
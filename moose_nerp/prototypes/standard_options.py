@@ -59,6 +59,15 @@ def standard_options(parser=None,
     param_sim_parser.add_argument('--save', nargs='?', metavar='FILE',
                         help='Write voltage and calcium (if enabled) to (HDF5) file. use single character for auto naming',
                         const='d1d2.h5')
+    param_sim_parser.add_argument('--warm-start', type=parse_boolean, nargs='?',
+                        help='Start repeated simulations from cached steady state',
+                        const=True)
+    param_sim_parser.add_argument('--warm-start-time', type=float,
+                        metavar='TIME',
+                        help='Settling time for warm start, default is injection delay')
+    param_sim_parser.add_argument('--profile', nargs='?', metavar='PREFIX',
+                        help='Write time, memory and moose objects of each phase to PREFIX_profile.json and .csv; no PREFIX uses fname',
+                        const=True)
 
     #arguments/parameters to control what model details to include
     model_parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter, add_help=True)
@@ -1,5 +1,12 @@
 """\
 Function definitions for making channels.
+
+With model.lazy_synchans=True, add_synchans only plans the synapse sites of a
+prototype; the SynChan, its SimpleSynHandler and (for NMDA) its calcium coupling
+are created by connect when the first synapse lands there, so that network
+neurons hold only the synchans that receive input.  Synapses must be connected
+before the hsolver is created (as in create_network).  For models built with all
+synchans, prune_synchans deletes those without synapses before reinit.
 """
 
 from __future__ import print_function, division
@@ -44,6 +51,12 @@ SpikePlasParams =  NamedList('SpikePlasParams',
 
 ShortTermPlasParams=NamedList('ShortTermPlasParams','''depress=None facil=None''')
 
+#planned synchan, returned by synchan_sites in place of a synchan that does not exist yet
+PlannedSynChan=NamedList('PlannedSynChan','path parent')
+#sites of lazily created synchans: prototype name -> (model, module, set of (compartment path relative to neuron, synapse type))
+SynSites=NamedList('SynSites','model module sites')
+synapse_sites={}
+
 def SpineSynChans(model):
     return sorted(key for key,val in model.SYNAPSE_TYPES.items()
                   if val.spinic and model.spineYN)
@@ -111,30 +124,45 @@ def addoneSynChan(chanpath,syncomp,gbar,calYN,GbarVar,module=None):
     moose.connect(sh, 'activationOut', synchan, 'activation')
     return synchan
 
+def _strip(path):
+    return path.replace('[0]','')
+
 def add_synchans(model, container,module=None):
+    '''create synchans of each type in each compartment (or spine head) of container,
+    or with model.lazy_synchans only record them as sites, returning empty lists'''
     synchans=[]
     #2D array to store all the synapses.  Rows=num synapse types, columns=num comps
     #at the end they are concatenated into a dictionary
     for key in model.SYNAPSE_TYPES:
         synchans.append([])
     allkeys = sorted(model.SYNAPSE_TYPES)
+    lazy=getattr(model,'lazy_synchans',False)
+    name=moose.element(container).name
+    synapse_sites.pop(name,None)
+    if lazy:
+        cellpath=_strip(moose.element(container).path)
+        sites=synapse_sites[name]=SynSites(model,module,set())
+
+    def add(key,comp,Gbar,Gbarvar):
+        if lazy:
+            sites.sites.add((_strip(comp.path)[len(cellpath)+1:],key))
+        else:
+            synchans[allkeys.index(key)].append(addoneSynChan(key,comp,Gbar, model.calYN, Gbarvar,module))
 
     comp_list = moose.wildcardFind(container + '/#[TYPE=Compartment]')
     for comp in comp_list:
         #create each type of synchan in each compartment.  Add to 2D array
         for key in DendSynChans(model):
-            keynum = allkeys.index(key)
             Gbar = model.SYNAPSE_TYPES[key].Gbar
             Gbarvar=model.SYNAPSE_TYPES[key].var
-            synchans[keynum].append(addoneSynChan(key,comp,Gbar, model.calYN, Gbarvar,module))
+            add(key,comp,Gbar,Gbarvar)
         
         for key in SpineSynChans(model):
-            keynum = allkeys.index(key)
             Gbar = model.SYNAPSE_TYPES[key].Gbar
             Gbarvar=model.SYNAPSE_TYPES[key].var
             spcomps = [spcomp for spcomp in moose.wildcardFind(comp.path + '/#[ISA=Compartment]') if NAME_HEAD in spcomp.path]
             for spcomp in spcomps:
-                synchans[keynum].append(addoneSynChan(key,spcomp,Gbar, model.calYN, Gbarvar,module))
+                add(key,spcomp,Gbar,Gbarvar)
             if len(spcomps) == 0 and model.SYNAPSE_TYPES[key].spinic<2: #spinic = 2 prevents synapses on dendrite even if no spine in that compartment
                 #print('SPcomps is empty',spcomps,'adding synapses to dendrite for',comp.path,'for synapses of type',key,'in comp',comp.path)
                 distance_mapped_spineDensity = {(model.SpineParams.spineStart,model.SpineParams.spineEnd):model.SpineParams.spineDensity}
@@ -148,9 +176,66 @@ def add_synchans(model, container,module=None):
                         density=distance_mapping(distance_mapped_spineDensity,comp)
                     numSpines = int(np.round(density*comp.length))
                     if numSpines > 0:
-                        synchans[keynum].append(addoneSynChan(key,comp,Gbar, model.calYN, Gbarvar,module))
+                        add(key,comp,Gbar,Gbarvar)
 
     allsynchans={key:synchans[keynum]
                  for keynum, key in enumerate(sorted(model.SYNAPSE_TYPES))}
 
     return allsynchans
+
+def _planned(chanpath):
+    #neuron whose prototype planned a synchan at chanpath: SynSites and compartment path relative to neuron
+    comppath,key=chanpath.rsplit('/',1)
+    if not moose.exists(comppath):
+        return None,None
+    cell=moose.element(comppath)
+    while cell.path!='/':
+        cell=cell.parent
+        #neurons of a network are copies of the prototype named <prototype>_<number>
+        sites=synapse_sites.get(cell.name,synapse_sites.get(cell.name.rsplit('_',1)[0]))
+        rel=comppath[len(_strip(cell.path))+1:]
+        if sites is not None and (rel,key) in sites.sites:
+            return sites,moose.element(comppath)
+    return None,None
+
+def synchan_sites(cellpath,syntype):
+    '''synchans of type syntype in cellpath, existing ones and those planned by lazy add_synchans.
+    Planned ones are PlannedSynChan with the path of the synchan and the compartment as parent'''
+    existing=moose.wildcardFind(cellpath+'/##/'+syntype+'[ISA=SynChan]')
+    cell=moose.element(cellpath)
+    sites=synapse_sites.get(cell.name,synapse_sites.get(cell.name.rsplit('_',1)[0]))
+    if sites is None:
+        return existing
+    cellpath=_strip(cell.path)
+    made=set(_strip(synchan.path) for synchan in existing)
+    planned=[PlannedSynChan(cellpath+'/'+rel+'/'+key,moose.element(cellpath+'/'+rel))
+             for rel,key in sorted(sites.sites) if key==syntype and cellpath+'/'+rel+'/'+key not in made]
+    return existing+planned
+
+def get_synchan(chanpath):
+    '''synchan at chanpath, created (with its SynHandler and calcium coupling) if planned
+    by lazy add_synchans.  None if it neither exists nor was planned'''
+    if moose.exists(chanpath):
+        return moose.element(chanpath)
+    sites,comp=_planned(_strip(chanpath))
+    if sites is None:
+        return None
+    key=chanpath.rsplit('/',1)[1]
+    params=sites.model.SYNAPSE_TYPES[key]
+    synchan=addoneSynChan(key,comp,params.Gbar,sites.model.calYN,params.var,sites.module)
+    if sites.model.calYN and params.NMDA:
+        from moose_nerp.prototypes import calcium
+        calcium.connectNMDAchan(sites.model,comp,synchan)
+    return synchan
+
+def prune_synchans(container):
+    '''delete synchans of container whose SynHandler has no synapses, before reinit;
+    returns number of synchans deleted'''
+    pruned=0
+    for synchan in moose.wildcardFind(container+'/##[ISA=SynChan]'):
+        shpath=synchan.path+'/SH'
+        if moose.exists(shpath) and moose.element(shpath).synapse.num==0:
+            moose.delete(synchan)
+            pruned+=1
+    log.info('pruned {} synchans without synapses from {}',pruned,container)
+    return pruned
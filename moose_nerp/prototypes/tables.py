@@ -11,7 +11,7 @@ DATA_NAME='/data'
 HDF5WRITER_NAME='/hdf5'
 DEFAULT_HDF5_COMPARTMENTS = 'soma',
 
-from . import logutil
+from . import logutil, profiling
 log = logutil.Logger()
 
 def vm_table_path(neuron, spine=None, comp=0):
@@ -184,6 +184,7 @@ def create_plas_tabs(synchan,table_name,tabset,plas_type):
     return
 
 
+@profiling.profiled()
 def syn_plastabs(connections, model,plas=[]):
     synapse_msg=model.param_sim.plot_synapse_message
     if not moose.exists(DATA_NAME):
@@ -241,6 +242,11 @@ def nonstimplastabs(plas, fraction=1, name_ampa = 'ampa'):
                    for comppath, dict2 in dict1.items())
 
     for plasdict in plasdictgen:
+        #plasticity.addPlasticity with connections records whether synapse is stimulated
+        if 'stim' in plasdict:
+            if not plasdict['stim']:
+                nonstimplas.append(plasdict['syn'])
+            continue
         sh = plasdict['syn'].children[[i for i,c in enumerate(plasdict['syn'].children) if  'SynHandler' in c.className][0]][0]
         if all( len(sh.synapse[s].neighbors['addSpike'])==0 for s in range(sh.numSynapses) ):
             #print('~~~~~~~~~ No addSpike messages to {}, adding to nonstimplas dict.format(sh.path)')
@@ -1,7 +1,8 @@
 #ttables.py
 #object to associate name of time tables with filename containing data
 import numpy as np
-import moose 
+from moose_nerp.prototypes import logutil, spike_trains
+log = logutil.Logger()
 
 class TableSet(object):
     ALL = []
@@ -16,23 +17,26 @@ class TableSet(object):
             self.ALL.append(self)
 
     def create(self):
+        import moose #not needed to read param_net
         path="/input"
         if not moose.exists('/input'):
             moose.Neutral('/input')
-        spike_file = np.load(self.filename+'.npz', encoding='latin1',allow_pickle=True)
-        spike_times = spike_file['spikeTime']
-        self.numtt = len(spike_times)
-        print('creating', self, self.tablename, self.filename, 'AVAILABLE trains: ', self.numtt)
+        #spike store (memory mapped) written by spike_trains, or pickled spikeTime array of .npz file
+        self.trains = spike_trains.load(self.filename)
+        self.numtt = len(self.trains)
+        log.info('creating {} {} AVAILABLE trains: {}', self.tablename, self.filename, self.numtt)
         self.stimtab=[]
-        for ii,stimtimes in enumerate(spike_times):
+        progress=logutil.ProgressReporter(log,'time tables '+self.tablename,self.numtt)
+        for ii,stimtimes in enumerate(self.trains):
             self.stimtab.append([moose.TimeTable('{}/{}_TimTab{}'.format(path, self.tablename, ii)),self.syn_per_tt])
             self.stimtab[ii][0].vector=stimtimes
             self.stimtab[ii][0].tick=7
-        print(self.tablename, 'complete', len(self.stimtab), 'tables created')
+            progress.update()
+        progress.done()
 
     @classmethod
     def create_all(cls):
         for obj in cls.ALL:
             obj.create()
-        print('tables created')
+        log.info('{} time table sets created', len(cls.ALL))
 
@@ -6,10 +6,11 @@ from collections import OrderedDict as _OrderedDict
 from operator import itemgetter as _itemgetter, eq as _eq
 import numpy as _np
 import functools
-import moose
 from subprocess import check_output
 
+#moose is imported inside functions, so that parameter files can be read without moose
 def syn_name(synpath,headname):
+    import moose
     if headname in synpath:
         #try to strip out name of cell from branch name
         headpath=moose.element(synpath).parent.path
@@ -47,6 +48,7 @@ def get_dist_name(comp,soma_loc=[0,0,0]):
     return dist,name
 
 def move_neuron(dx,dy,dz,neurpath):
+    import moose
     for comp in moose.wildcardFind(neurpath+'/##[ISA=Compartment]'):
         comp.x=comp.x+dx
         comp.x0=comp.x0+dx
@@ -89,6 +91,7 @@ def dist_dependent_cond_equation(cmin, cmax, dhalf, slope):
 """
 def distance_mapping(mapping, where):
     #where is a location, either a compartment or string or moose.vec
+    import moose
     if isinstance(where, (moose.Compartment, moose.ZombieCompartment)):
         comp=where
     elif isinstance(where,moose.vec):
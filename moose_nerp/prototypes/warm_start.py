@@ -0,0 +1,188 @@
+# -*- coding:utf-8 -*-
+"""\
+Steady-state warm start for repeated simulations.
+
+Most simulations spend the first 0.2-0.3 s (injection_delay or start_time)
+settling to rest before the stimulus arrives.  With warm start the model is
+settled once, the state variables are snapshotted and cached on disk, keyed
+by a hash of the model configuration.  Subsequent runs with the same
+configuration restore the snapshot after moose.reinit(), shift all stimuli
+earlier by the settling time and simulate only simtime - settle_time.
+
+After the run, tables are realigned to time 0: the samples of the settling
+interval are filled with the steady state values recorded at its end, and
+spike times are shifted by the settling time, so that output files and graphs
+are the same length and timing as without warm start.  Output written by
+a Streamer during the run cannot be realigned, so warm start refuses to
+run when a Streamer exists.
+
+Enable with param_sim.warm_start=True (or --warm-start on command line);
+param_sim.warm_start_time sets the settling time (default injection_delay),
+param_sim.warm_start_dir sets the cache directory.
+"""
+from __future__ import print_function, division
+import os
+import hashlib
+import contextlib
+import numpy as np
+import moose
+
+from moose_nerp.prototypes import logutil
+log = logutil.Logger()
+
+CACHE_DIR = 'warm_start_cache'
+#snapshots already loaded in this process, keyed by config_key
+_loaded = {}
+
+#state variables saved for each class of element
+STATE_FIELDS = {'CompartmentBase': ('Vm',),
+                'HHChannelBase': ('X', 'Y', 'Z'),
+                'HHChannel2D': ('X', 'Y', 'Z'),
+                'CaConcBase': ('Ca',),
+                'DifShellBase': ('C',),
+                'DifBufferBase': ('bFree', 'bBound')}
+
+#parameters that determine the resting state, used to key the cache
+CONFIG_FIELDS = {'CompartmentBase': ('Rm', 'Cm', 'Em', 'Ra', 'initVm'),
+                 'HHChannelBase': ('Gbar', 'Ek', 'Xpower', 'Ypower', 'Zpower'),
+                 'HHChannel2D': ('Gbar', 'Ek'),
+                 'CaConcBase': ('CaBasal', 'B', 'tau', 'thick'),
+                 'DifShellBase': ('Ceq', 'D', 'volume'),
+                 'DifBufferBase': ('bTot', 'kf', 'kb'),
+                 'SynChan': ('Gbar', 'Ek')}
+
+def _elements(classname):
+    #exclude prototypes in /library; these are not simulated
+    return [el for el in moose.wildcardFind('/##[ISA={}]'.format(classname))
+            if not el.path.startswith('/library')]
+
+def config_key(model, settle_time):
+    '''hash of all parameters that determine the state at end of settling'''
+    h = hashlib.sha1()
+    param_sim = model.param_sim
+    h.update(repr((model.__name__, settle_time, param_sim.simdt,
+                   param_sim.hsolve)).encode())
+    for classname, fields in sorted(CONFIG_FIELDS.items()):
+        for el in _elements(classname):
+            h.update(el.path.encode())
+            h.update(np.array([getattr(el, f) for f in fields], dtype=float).tobytes())
+    return h.hexdigest()
+
+def snapshot():
+    '''Returns dict of state arrays: one array of paths and one of values per
+    class; each value row holds the fields listed in STATE_FIELDS'''
+    state = {}
+    for classname, fields in STATE_FIELDS.items():
+        elements = _elements(classname)
+        state[classname+'_paths'] = np.array([el.path for el in elements])
+        state[classname] = np.array([[getattr(el, f) for f in fields] for el in elements],
+                                    dtype=float).reshape(len(elements), len(fields))
+    return state
+
+def restore(state):
+    '''Writes state variables back to elements; call after moose.reinit()'''
+    for classname, fields in STATE_FIELDS.items():
+        for path, values in zip(state[classname+'_paths'], state[classname]):
+            el = moose.element(str(path))
+            for f, val in zip(fields, values):
+                setattr(el, f, val)
+
+def stimulus_onset():
+    '''Earliest time at which a PulseGen or TimeTable delivers input'''
+    onsets = [pg.firstDelay for pg in moose.wildcardFind('/##[TYPE=PulseGen]')
+              if pg.firstLevel != 0]
+    onsets += [tt.vector[0] for tt in moose.wildcardFind('/##[TYPE=TimeTable]')
+               if len(tt.vector)]
+    return min(onsets) if len(onsets) else np.inf
+
+@contextlib.contextmanager
+def shifted_stimuli(offset):
+    '''Moves all PulseGen and TimeTable events earlier by offset,
+    restores the original timing on exit'''
+    pulsegens = moose.wildcardFind('/##[TYPE=PulseGen]')
+    timetables = moose.wildcardFind('/##[TYPE=TimeTable]')
+    delays = [pg.firstDelay for pg in pulsegens]
+    vectors = [np.array(tt.vector) for tt in timetables]
+    for pg, delay in zip(pulsegens, delays):
+        pg.firstDelay = max(delay - offset, 0)
+    for tt, vec in zip(timetables, vectors):
+        tt.vector = vec[vec >= offset] - offset
+    try:
+        yield
+    finally:
+        for pg, delay in zip(pulsegens, delays):
+            pg.firstDelay = delay
+        for tt, vec in zip(timetables, vectors):
+            tt.vector = vec
+
+def settle_time(model):
+    param_sim = model.param_sim
+    settle = getattr(param_sim, 'warm_start_time', None)
+    if settle is None:
+        settle = getattr(param_sim, 'injection_delay', 0)
+    onset = stimulus_onset()
+    if onset < settle:
+        log.warning('stimulus onset {} before warm start time {}, settling only to onset',
+                    onset, settle)
+        settle = onset
+    return settle
+
+def prepare(model, settle=None):
+    '''Loads the snapshot for this model configuration, or settles the model
+    and saves one.  Returns settling time and state dict.'''
+    if settle is None:
+        settle = settle_time(model)
+    cache_dir = getattr(model.param_sim, 'warm_start_dir', None) or CACHE_DIR
+    key = config_key(model, settle)
+    fname = os.path.join(cache_dir, key + '.npz')
+    if key in _loaded:
+        state = _loaded[key]
+    elif os.path.exists(fname):
+        log.info('warm start: loading {}', fname)
+        with np.load(fname) as data:
+            state = dict(data)
+        _loaded[key] = state
+    else:
+        log.info('warm start: settling for {} sec', settle)
+        moose.reinit()
+        moose.start(settle)
+        state = snapshot()
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        np.savez(fname, **state)
+        _loaded[key] = state
+    return settle, state
+
+def realign(offset):
+    '''Prepends offset worth of the first sample to each recording Table and
+    adds offset to spike times, so tables start at time 0'''
+    tick_dt = moose.element('/clock').tickDt
+    for tab in _elements('Table'):
+        #tick < 0: table is not recorded
+        if tab.tick < 0:
+            continue
+        vec = np.array(tab.vector)
+        if len(tab.neighbors['spike']):
+            tab.vector = vec + offset
+        elif len(vec):
+            num = int(np.round(offset/tick_dt[tab.tick]))
+            tab.vector = np.concatenate((np.full(num, vec[0]), vec))
+
+def run(model, simtime):
+    '''Replacement for moose.reinit(); moose.start(simtime) that starts from
+    the cached steady state, simulates simtime - settling time and realigns tables'''
+    streamers = moose.wildcardFind('/##[TYPE=Streamer]')
+    if len(streamers):
+        raise ValueError('warm start cannot realign output of Streamer {}; '
+                         'set param_sim.warm_start=False or useStreamer=False'.format(streamers[0].path))
+    settle, state = prepare(model)
+    if settle <= 0 or settle >= simtime:
+        moose.reinit()
+        moose.start(simtime)
+        return 0
+    moose.reinit()
+    restore(state)
+    with shifted_stimuli(settle):
+        moose.start(simtime - settle)
+    realign(settle)
+    return settle
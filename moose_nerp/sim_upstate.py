@@ -59,24 +59,28 @@ import importlib
 import numpy as np
 
 
+#range of conductance and synaptic multipliers of random and adaptive parameter sets
+VAR_RANGE = {
+    "KaS": [0, 4],
+    "NMDA": [0, 4],
+    "CaR": [0, 20],
+    "AMPA": [0.1, 1],
+    "CaL12": [0, 4],
+    "CaL13": [0, 4],
+    "CaT32": [0, 4],
+    "CaT33": [0, 4],
+    "Kir": [0, 4],
+    "KaF": [0, 4],
+}
+#upstate amplitude (V) of the region of interest of adaptive sampling
+UPSTATE_TARGET = {"upstate_amp": (15e-3, 35e-3)}
+
 def rand_mod_dict():
     mod_dict = {"D1MatrixSample2": {}, "D1PatchSample5": {}}
 
-    var_range = {
-        "KaS": [0, 4],
-        "NMDA": [0, 4],
-        "CaR": [0, 20],
-        "AMPA": [0.1, 1],
-        "CaL12": [0, 4],
-        "CaL13": [0, 4],
-        "CaT32": [0, 4],
-        "CaT33": [0, 4],
-        "Kir": [0, 4],
-        "KaF": [0, 4],
-    }
     for mod in mod_dict:
-        for var in var_range:
-            mod_dict[mod][var] = np.random.uniform(*var_range[var])
+        for var in VAR_RANGE:
+            mod_dict[mod][var] = np.random.uniform(*VAR_RANGE[var])
 
     return mod_dict
 
@@ -338,11 +342,18 @@ def upstate_main(
         #from IPython import embed; embed()
 
     simtime = 1.5  # 1.5
-    moose.reinit()
-    moose.start(simtime)
+    if getattr(model.param_sim, "warm_start", False):
+        # settle once, then start later runs from the cached rest state
+        from moose_nerp.prototypes import warm_start
+
+        warm_start.run(model, simtime)
+    else:
+        moose.reinit()
+        moose.start(simtime)
 
     if do_plots:
-        create_model_sim.neuron_graph.graphs(model, model.vmtab, False, simtime)
+        from moose_nerp.graph import neuron_graph
+        neuron_graph.graphs(model, model.vmtab, False, simtime)
         from matplotlib import pyplot as plt
 
         ax = plt.gca()
@@ -481,6 +492,33 @@ def mpi_main(mod_dict, sims):
             #        break
             #MPI.COMM_WORLD.Abort()
 
+def vm_features(vmfile):
+    # upstate amplitude and duration at the soma (first table of the Vm file), number of spikes
+    vm = np.loadtxt(vmfile)
+    t, soma = vm[:, 0], vm[:, 1]
+    baseline = np.median(soma[: max(len(soma) // 10, 1)])
+    amp = np.max(soma) - baseline
+    above = soma > baseline + amp / 2
+    spikes = np.sum((soma[1:] > 0) & (soma[:-1] <= 0))
+    return {"upstate_amp": amp, "upstate_dur": np.sum(above) * (t[1] - t[0]), "spikes": spikes}
+
+
+def upstate_features(mod_dict, model="D1PatchSample5", clustered_seed=135):
+    # one upstate_only simulation of model with conductances of mod_dict, for adaptive_sampler
+    import glob
+    import os
+    import uuid
+
+    filename = "adaptive_{}_{}".format(model, uuid.uuid4().hex[:12])
+    upstate_main(model, mod_dict, num_dispersed=0, block_naf=True, num_clustered=14,
+                 clustered_seed=clustered_seed, filename=filename)
+    files = glob.glob(filename + "*Vm.txt")
+    features = vm_features(files[0])
+    for f in glob.glob(filename + "*.txt"):
+        os.remove(f)
+    return features
+
+
 def specify_sims(sim_type,clustered_seed,dispersed_seed,single_epsp_seed):
     if sim_type=='rheobase_only':
         sims = [
@@ -584,15 +622,27 @@ if __name__ == "__main__":
 
     elif len(args) > 1 and args[1] == "--mp":
         results = []
+        runs = []
         from multiprocessing import Pool
+        #--cache DIR [MB]: only simulations not already in the result cache are run
+        cache = None
+        if "--cache" in args:
+            from moose_nerp.prototypes import result_cache
+            i = args.index("--cache")
+            cache = result_cache.ResultCache(args[i + 1], float(args[i + 2]) if len(args) > i + 2 else None)
 
         with Pool(16, maxtasksperchild=1) as p:
-            param_set_list = [rand_mod_dict() for i in range(10000)]
-
+            import os
             import pickle
 
-            with open("params.pickle", "wb") as f:
-                pickle.dump(param_set_list, f)
+            if cache is not None and os.path.exists("params.pickle"):
+                #re-run of a sweep: same parameter sets, so that unchanged simulations are found in the cache
+                with open("params.pickle", "rb") as f:
+                    param_set_list = pickle.load(f)
+            else:
+                param_set_list = [rand_mod_dict() for i in range(10000)]
+                with open("params.pickle", "wb") as f:
+                    pickle.dump(param_set_list, f)
 
             #print(param_set_list)
             for i, param_set in enumerate(param_set_list):
@@ -613,10 +663,43 @@ if __name__ == "__main__":
                         kwds = {k: v for k, v in sim["kwds"].items()}
                         kwds["filename"] = filename
                         # r = p.apply_async(upstate_main, args=(key, mod_dict),kwds={'num_dispersed':0})
-                        r = p.apply_async(sim["f"], args=(key, param_set), kwds=kwds)
-                        results.append(r)
+                        if cache is not None:
+                            #None if text files of this parameter set and sim were restored from the cache
+                            r = cache.submit(p, sim["f"], (key, param_set), kwds, outputs=filename+"*.txt",
+                                             modules=["moose_nerp."+key])
+                        else:
+                            r = p.apply_async(sim["f"], args=(key, param_set), kwds=kwds)
+                        if r is not None:
+                            results.append(r)
+                        run_params = {"param_set": i, "sim": sim["name"], "model": key,
+                                      "freq_dispersed": sim["kwds"].get("freq_dispersed")}
+                        run_params.update(param_set.get(key, {}))
+                        runs.append((run_params, filename))
             for res in results:
                 res.wait()
+            if cache is not None:
+                cache.evict()
+        #parameters and text files of each simulation, queried with result_index.ResultIndex("upstate_index.sqlite").select(...)
+        from moose_nerp.prototypes import result_index
+        import glob
+        index = result_index.ResultIndex("upstate_index.sqlite")
+        for run_params, filename in runs:
+            files = {path[len(filename):-len(".txt")]: path for path in glob.glob(filename + "*.txt")}
+            index.add_run("upstate", run_params, files, name=filename)
+        index.close()
+    elif len(args) > 1 and args[1] == "--adaptive":
+        # --adaptive [num_batches]: upstate simulations at parameters proposed by a surrogate model,
+        # concentrated where upstate amplitude is in UPSTATE_TARGET, instead of 10000 random sets
+        from multiprocessing import Pool
+        from moose_nerp.prototypes import adaptive_sampler
+
+        model = "D1PatchSample5"
+        space = adaptive_sampler.ParamSpace({model + "/" + var: r for var, r in VAR_RANGE.items()})
+        sampler = adaptive_sampler.AdaptiveSampler(space, ["upstate_amp", "upstate_dur"], target=UPSTATE_TARGET, seed=42)
+        with Pool(16, maxtasksperchild=1) as p:
+            sampler.run(upstate_features, p.map, num_init=64, batch=32,
+                        num_batches=int(args[2]) if len(args) > 2 else 10)
+        sampler.save("adaptive_upstate.npz")
     else:
         mpi_main(mod_dict, sims)
         print('done?')
@@ -11,6 +11,9 @@ from .param_net import (netname,
 ###########plotting control 
 plot_netvm=1
 plots_per_neur=2
+#list of prototypes.recording.Record for large runs, e.g.
+#[Record('D1',['spikes']), Record('D1',['Vm'],neurons=5,comps='all',maxdist=100e-6,per_neuron=3,dt=1e-4)]
+recording_spec=None
 #number of neurons per neuron type for current injection
 #set to np.inf to inject entire population, set to 0 for no injection
 num_inject=0
@@ -31,7 +31,9 @@ from moose_nerp.prototypes import (create_model_sim,
                                    create_network,
                                    tables,
                                    net_output,
+                                   recording,
                                    logutil,
+                                   profiling,
                                    util,
                                    standard_options)
 #from moose_nerp import d1opt as model
@@ -99,10 +101,12 @@ if net.single:
     create_model_sim.setupOutput(model)
 else:   #population of neurons
     model.spiketab,model.vmtab,model.plastab,model.catab=net_output.SpikeTables(model, population['pop'], net.plot_netvm, plas, net.plots_per_neur)
+    if net.recording_spec:
+        model.recorders=recording.record(net.recording_spec,population['pop'],model.param_cond.NAME_SOMA)
     #simpath used to set-up simulation dt and hsolver
     simpath=[net.netname]
 
-clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA)
+clocks.assign_clocks(simpath, param_sim.simdt, param_sim.plotdt, param_sim.hsolve,model.param_cond.NAME_SOMA,clock_dt=clocks.clock_dt(param_sim, net))
 # Fix calculation of B parameter in CaConc if using hsolve and simple calcium dynamics
 ######### Need to use CaPlasticityParams.BufferCapacityDensity from EACH neuron_module
 if model.param_sim.hsolve and model.calYN:
@@ -138,8 +142,10 @@ def run_simulation(injection_current, simtime, pg,continue_sim = False):
     print(u'◢◤◢◤◢◤◢◤ injection_current = {} ◢◤◢◤◢◤◢◤'.format(injection_current))
     pg.firstLevel = injection_current
     if not continue_sim:
-        moose.reinit()
-    moose.start(simtime)
+        with profiling.phase('reinit'):
+            moose.reinit()
+    with profiling.phase('run'):
+        moose.start(simtime)
 
 continue_sim = False
 traces, names = [], []
@@ -163,6 +169,9 @@ for inj in param_sim.injection_current:
         if model.synYN and param_sim.plot_synapse and not param_sim.useStreamer:
             net_graph.syn_graph(connections, model.syntab, param_sim)
         net_output.writeOutput(model, net.outfile+str(inj),model.spiketab,model.vmtab,population)
+        if net.recording_spec:
+            recording.save(net.outfile+'_rec'+str(inj),model.recorders)
+profiling.write_report()
 
 if net.single:
     neuron_graph.SingleGraphSet(traces, names, param_sim.simtime)
@@ -0,0 +1,231 @@
+"""\
+Benchmark cases: each function builds and runs one model (or analysis
+pipeline) with fixed random seeds and returns a flat dictionary of outputs
+that are compared with golden outputs by test_benchmarks.py.
+
+Output keys contain the kind of output, which sets the tolerance used:
+  .../vm/...      Vm trace (V)
+  .../spikes/...  spike times (s) of all cells, sorted; .../nspikes/... number per cell
+  anything else   compared with a small relative tolerance
+
+Moose cases are run by run_case in a fresh process, so that moose objects
+of one case do not affect the next and peak memory is that of one case.
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import importlib
+import numpy as np
+
+SEED = 20211
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANAL_DIR = os.path.join(PACKAGE_DIR, 'anal')
+
+def _seed():
+    import moose
+    np.random.seed(SEED)
+    moose.seed(SEED)
+
+def _tables(prefix, vmtab=None, spiketab=None):
+    '''flat output dictionary from Vm tables and spike tables, each a dict of lists by neuron type'''
+    out = {}
+    for ntype, tabs in (vmtab or {}).items():
+        for i, tab in enumerate(tabs):
+            out['{}/vm/{}_{}'.format(prefix, ntype, i)] = np.array(tab.vector)
+    for ntype, tabs in (spiketab or {}).items():
+        trains = [np.array(tab.vector) for tab in tabs]
+        out['{}/nspikes/{}'.format(prefix, ntype)] = np.array([len(st) for st in trains])
+        out['{}/spikes/{}'.format(prefix, ntype)] = np.sort(np.concatenate(trains)) if len(trains) else np.zeros(0)
+    return out
+
+def _walk_tables(prefix, tabs):
+    #vectors of all tables in nested dicts and lists, e.g. plasticity tables of syn_plastabs
+    out = {}
+    if hasattr(tabs, 'vector'):
+        out[prefix] = np.array(tabs.vector)
+    elif isinstance(tabs, dict):
+        for key, value in tabs.items():
+            out.update(_walk_tables('{}/{}'.format(prefix, key), value))
+    elif isinstance(tabs, (list, tuple)):
+        for i, value in enumerate(tabs):
+            out.update(_walk_tables('{}/{}'.format(prefix, i), value))
+    return out
+
+def _by_type(model, tabs):
+    #graphtables and spiketables return lists ordered as model.neurons
+    return {ntype: [tab] for ntype, tab in zip(model.neurons.keys(), tabs)}
+
+def single_neuron(modelname='cells.d1d2', spines=False, calcium=False, simtime=0.3, inj=0.3e-9):
+    '''one neuron of each type in model, current injection at soma'''
+    from moose_nerp.prototypes import create_model_sim
+    model = importlib.import_module('moose_nerp.'+modelname)
+    model.spineYN = spines
+    model.calYN = calcium
+    model.synYN = False
+    model.plasYN = False
+    _seed()
+    create_model_sim.setupOptions(model, simtime=simtime, plot_vm=False, plot_channels=False,
+                                  save=False, save_txt=False, stim_paradigm='inject')
+    create_model_sim.setupAll(model)
+    create_model_sim.runOneSim(model, simtime=simtime, injection_current=inj)
+    return _tables('soma', {ntype: tabs[0:1] for ntype, tabs in model.vmtab.items()},
+                   _by_type(model, model.spiketab))
+
+def clustered_spines(modelname='D1PatchSample5', parent='570_3', num_inputs=16, simtime=0.2):
+    '''explicit spines on one branch, time tables stimulating a cluster of distal spines'''
+    from moose_nerp.prototypes import create_model_sim
+    from moose_nerp.prototypes import spatiotemporalInputMapping as stim
+    model = importlib.import_module('moose_nerp.'+modelname)
+    model.spineYN = True
+    model.calYN = True
+    model.synYN = True
+    model.plasYN = False
+    model.SpineParams.explicitSpineDensity = 1e6
+    model.SpineParams.spineParent = parent
+    _seed()
+    create_model_sim.setupOptions(model, simtime=simtime, plot_vm=False, plot_channels=False,
+                                  save=False, save_txt=False, stim_paradigm='inject')
+    create_model_sim.setupAll(model)
+    inputs = stim.exampleClusteredDistal(model, nInputs=num_inputs, seed=SEED)
+    stim.createTimeTables(inputs, model, n_per_syn=1, start_time=0.05, freq=500.0)
+    create_model_sim.runOneSim(model, simtime=simtime, injection_current=0)
+    out = _tables('soma', {ntype: tabs[0:1] for ntype, tabs in model.vmtab.items()},
+                  _by_type(model, model.spiketab))
+    for i, tab in enumerate(model.spinevmtab[0] if len(model.spinevmtab) else []):
+        out['spine/vm/{}'.format(i)] = np.array(tab.vector)
+    return out
+
+def _check_ttables(net):
+    from moose_nerp.prototypes.ttables import TableSet
+    missing = [tt.filename for tt in TableSet.ALL if not os.path.exists(tt.filename+'.npz')]
+    if len(missing):
+        raise FileNotFoundError('time table files not found: {}'.format(missing))
+
+def network(netname='spn1_net', modelname='cells.spn_1comp', neuron_modules=['cells.FSI01Aug2014'],
+            grid_max=None, single=False, plasticity=False, simtime=0.2, hsolve=True, clock_dt=None,
+            synchans='all'):
+    '''build and run network; grid_max sets extent of x and y of the grid,
+    hsolve=False uses exponential Euler for all neurons, clock_dt: multi-rate clocks,
+    synchans: 'all' in every compartment, 'lazy' only where synapses land, 'prune' unconnected ones'''
+    import moose
+    from moose_nerp.prototypes import (create_model_sim, create_network, clocks, calcium,
+                                       inject_func, net_output, tables, multi_module)
+    model = importlib.import_module('moose_nerp.'+modelname)
+    net = importlib.import_module('moose_nerp.'+netname)
+    _check_ttables(net)
+    model.synYN = True
+    model.plasYN = plasticity
+    model.calYN = plasticity or model.calYN
+    model.lazy_synchans = synchans == 'lazy'
+    net.single = single
+    net.param_net.prune_synchans = synchans == 'prune'
+    if grid_max is not None:
+        for axis in (0, 1):
+            net.param_net.grid[axis]['xyzmax'] = grid_max
+    _seed()
+    create_model_sim.setupOptions(model, simtime=simtime, plot_vm=False, plot_channels=False,
+                                  save=False, save_txt=False, stim_paradigm='inject')
+    param_sim = model.param_sim
+    param_sim.injection_current = [0]
+    param_sim.hsolve = hsolve
+    param_sim.clock_dt = clock_dt
+    create_model_sim.setupNeurons(model, network=not single)
+    buf_cap = {neur: model.param_ca_plas.BufferCapacityDensity for neur in model.neurons.keys()}
+    if len(neuron_modules) and not single:
+        buf_cap = multi_module.multi_modules(neuron_modules, model, buf_cap)
+    population, [connections, conn_summary], plas = create_network.create_network(model, net, model.neurons)
+    model.inject_pop = inject_func.inject_pop(population['pop'], 0)
+    create_model_sim.setupStim(model)
+    if single:
+        create_model_sim.setupOutput(model)
+        model.syntab, model.plastab, model.stp_tab = tables.syn_plastabs(connections, model)
+    else:
+        model.spiketab, model.vmtab, model.plastab, model.catab = net_output.SpikeTables(
+            model, population['pop'], True, plas, net.plots_per_neur)
+        clocks.assign_clocks([net.netname], param_sim.simdt, param_sim.plotdt, param_sim.hsolve, model.param_cond.NAME_SOMA,
+                             clock_dt=clock_dt)
+        if param_sim.hsolve and model.calYN:
+            calcium.fix_calcium(model.neurons.keys(), model, buf_cap)
+    num_synchans = len(moose.wildcardFind('/##[ISA=SynChan]'))
+    create_model_sim.runOneSim(model, simtime=simtime, injection_current=0)
+    if single:
+        out = _tables('soma', {ntype: tabs[0:1] for ntype, tabs in model.vmtab.items()},
+                      _by_type(model, model.spiketab))
+    else:
+        out = _tables('net', model.vmtab, model.spiketab)
+        for ntype, summary in conn_summary.items():
+            for syn, pres in summary['intra'].items():
+                for pre, conns in pres.items():
+                    out['conn/{}/{}/{}'.format(ntype, syn, pre)] = np.array(conns, dtype=float)
+            for syn, shortage in summary['shortage'].items():
+                out['shortage/{}/{}'.format(ntype, syn)] = np.array(list(shortage.values()), dtype=float)
+    if synchans != 'all':
+        out['objects/synchans'] = num_synchans
+    out.update(_walk_tables('plas', model.plastab))
+    return out
+
+def bg_net(simtime=0.2):
+    '''multi-population basal ganglia network of bg_net.multisim, with fixed seed'''
+    from moose_nerp.bg_net import multisim
+    spike_time, isis, params, conn_summary = multisim.moose_main(
+        (False, '20', '28', 0, 0, 3, 4, '11', simtime, 0), seed=SEED)
+    out = {}
+    for ntype, trains in spike_time.items():
+        out['net/nspikes/{}'.format(ntype)] = np.array([len(st) for st in trains])
+        out['net/spikes/{}'.format(ntype)] = np.sort(np.concatenate(trains)) if len(trains) else np.zeros(0)
+    for ntype, summary in conn_summary.items():
+        for syn, pres in summary['intra'].items():
+            for pre, conns in pres.items():
+                out['conn/{}/{}/{}'.format(ntype, syn, pre)] = np.array(conns, dtype=float)
+    return out
+
+################ analysis pipelines, no moose
+def _synthetic_trains(rng, num_trains, rate, simtime):
+    return [np.sort(rng.uniform(0, simtime, rng.poisson(rate*simtime))) for _ in range(num_trains)]
+
+def anal_pipelines(num_trains=100, rate=10.0, simtime=5.0, dt=1e-4):
+    '''spike triggered average, binning, ISI and synchrony measures of anal/ on synthetic trains'''
+    if ANAL_DIR not in sys.path:
+        sys.path.insert(0, ANAL_DIR)
+    import sta_utils, bin_utils, synchrony
+    rng = np.random.RandomState(SEED)
+    trains = _synthetic_trains(rng, num_trains, rate, simtime)
+    signal = np.cumsum(rng.normal(0, 1e-3, int(simtime/dt)))
+    out = {}
+    out['sta'] = sta_utils.calc_sta_many(trains[0:20], [-200, 0], signal, dt)
+    bins = np.column_stack((np.arange(0, simtime, 0.05), np.arange(0, simtime, 0.05)+0.1))
+    spikes = bin_utils.sorted_spikes(trains)
+    out['bin_counts'] = bin_utils.bin_counts(spikes, bins)
+    out['isi_mean'] = np.array([np.mean(isi) if len(isi) else np.nan for isi in bin_utils.isi_in_bins(trains[0], bins)])
+    out['latency'] = bin_utils.next_spike_latency(trains[1], np.arange(0, simtime, 0.25), 0.2)
+    binned = synchrony.bin_trains(trains, simtime, 1e-3)
+    ccg = synchrony.cross_correlograms(binned[0::2], binned[1::2], maxlag=50)
+    out['ccg'] = ccg
+    out['shift_predictor'] = synchrony.shift_predictor(binned[0::2], binned[1::2], maxlag=50, same_trial_ccg=ccg)
+    out['corrcoef'] = synchrony.corrcoef(binned[0:20])
+    freqs, psd, pop_psd = synchrony.population_spectrum(binned, 1e-3, maxfreq=100)
+    out['pop_psd'] = pop_psd
+    return out
+
+################ run one case in a fresh process
+def run_case(case, kwargs, profile_prefix=None):
+    '''run case (function name) with kwargs from the package directory, returns outputs,
+    wall time, peak memory and profile records of phases'''
+    from moose_nerp.prototypes import profiling
+    os.chdir(PACKAGE_DIR)
+    if PACKAGE_DIR not in sys.path:
+        sys.path.insert(0, PACKAGE_DIR)
+    profile = profiling.enable(profile_prefix) if profile_prefix else None
+    start = time.perf_counter()
+    outputs = globals()[case](**kwargs)
+    wall = time.perf_counter()-start
+    if profile is not None:
+        profile.write_report()
+    return {'outputs': outputs, 'wall_sec': wall, 'peak_rss_MB': profiling.peak_rss_MB(),
+            'phases': profile.records if profile is not None else []}
+
+def run_in_process(case, kwargs, profile_prefix=None):
+    import multiprocessing
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(run_case, (case, kwargs, profile_prefix))
@@ -0,0 +1,102 @@
+"""\
+Options for the benchmark suite (test_benchmarks.py):
+  --benchmark          run the benchmarks, which are skipped otherwise
+  --update-golden      write current outputs as golden outputs instead of comparing
+  --benchmark-dir DIR  write time, memory and phase profiles of each benchmark to DIR
+"""
+import os
+import json
+import numpy as np
+import pytest
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+#tolerances for comparison with golden outputs
+VM_ATOL = 1e-4     #V
+SPIKE_ATOL = 2e-4  #s
+RTOL = 1e-6
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', default=False,
+                     help='run benchmarks, comparing outputs with golden outputs')
+    parser.addoption('--update-golden', action='store_true', default=False,
+                     help='save outputs of benchmarks as golden outputs')
+    parser.addoption('--benchmark-dir', default=None,
+                     help='directory for time, memory and profile records of benchmarks')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: slow simulation compared with golden outputs, run with --benchmark')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark') or config.getoption('--update-golden'):
+        return
+    skip = pytest.mark.skip(reason='benchmark, run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+def compare_outputs(outputs, golden):
+    '''list of differences between outputs and golden outputs, empty if within tolerance'''
+    errors = ['missing output {}'.format(key) for key in golden if key not in outputs]
+    errors += ['new output {}'.format(key) for key in outputs if key not in golden]
+    for key in sorted(set(outputs) & set(golden)):
+        new, old = np.asarray(outputs[key]), np.asarray(golden[key])
+        if new.shape != old.shape:
+            errors.append('{}: shape {} != golden {}'.format(key, new.shape, old.shape))
+            continue
+        if '/vm/' in key:
+            ok, tol = np.allclose(new, old, rtol=0, atol=VM_ATOL, equal_nan=True), VM_ATOL
+        elif '/spikes/' in key:
+            ok, tol = np.allclose(new, old, rtol=0, atol=SPIKE_ATOL), SPIKE_ATOL
+        elif '/nspikes/' in key:
+            ok, tol = np.array_equal(new, old), 0
+        else:
+            ok, tol = np.allclose(new, old, rtol=RTOL, atol=1e-12, equal_nan=True), RTOL
+        if not ok:
+            diff = np.nanmax(np.abs(new-old)) if new.size else 0
+            errors.append('{}: max difference {:.3g}, tolerance {}'.format(key, diff, tol))
+    return errors
+
+class Benchmark(object):
+    def __init__(self, config, name):
+        self.name = name
+        self.update = config.getoption('--update-golden')
+        self.record_dir = config.getoption('--benchmark-dir')
+        self.golden_file = os.path.join(GOLDEN_DIR, name+'.npz')
+
+    @property
+    def profile_prefix(self):
+        if self.record_dir is None:
+            return None
+        return os.path.join(os.path.abspath(self.record_dir), self.name)
+
+    def record(self, result, name=None):
+        '''append time and memory of result to benchmarks.jsonl of --benchmark-dir'''
+        if self.record_dir is None:
+            return
+        if not os.path.isdir(self.record_dir):
+            os.makedirs(self.record_dir)
+        with open(os.path.join(self.record_dir, 'benchmarks.jsonl'), 'a') as f:
+            f.write(json.dumps({'benchmark': name or self.name, 'wall_sec': result['wall_sec'],
+                                'peak_rss_MB': result['peak_rss_MB']})+'\n')
+
+    def check(self, result):
+        '''compare outputs of run_case with golden outputs and record time and memory'''
+        self.record(result)
+        outputs = result['outputs']
+        if self.update:
+            if not os.path.isdir(GOLDEN_DIR):
+                os.makedirs(GOLDEN_DIR)
+            np.savez_compressed(self.golden_file, **outputs)
+            return
+        if not os.path.exists(self.golden_file):
+            #time and memory are recorded above; outputs are compared once golden output is made with moose
+            pytest.skip('no golden output {}, run with --update-golden on the reference version'.format(self.golden_file))
+        with np.load(self.golden_file) as golden:
+            errors = compare_outputs(outputs, dict(golden))
+        assert not errors, '\n'.join(errors)
+
+@pytest.fixture
+def bench(request):
+    name = request.node.name.replace('[', '_').replace(']', '').replace('/', '-')
+    return Benchmark(request.config, name)
@@ -0,0 +1,42 @@
+import numpy as np
+from moose_nerp.prototypes import adaptive_sampler
+
+def peak(params):
+    #feature with a small region of interest around (KaS, CaR) = (3, 5)
+    p = params['model']
+    return {'amp': np.exp(-((p['KaS']-3)**2+((p['CaR']-5)/5)**2)/0.5)}
+
+def failing(params):
+    if params['model']['KaS'] > 2:
+        raise RuntimeError('simulation crashed')
+    return peak(params)
+
+SPACE = {'model/KaS': (0, 4), 'model/CaR': (0, 20)}
+
+def test_param_space():
+    space = adaptive_sampler.ParamSpace(dict(SPACE, n_clusters=(1, 30)), integers=['n_clusters'])
+    u = space.latin_hypercube(10, np.random.RandomState(0))
+    #one point in each tenth of every parameter
+    assert all(sorted((u[:, j]*10).astype(int)) == list(range(10)) for j in range(3))
+    params = space.from_unit(u[0])
+    assert isinstance(params['n_clusters'], int)
+    np.testing.assert_allclose(space.to_unit(space.from_unit([0.5, 0.25, 0]))[:2], [0.5, 0.25])
+    assert adaptive_sampler.nested({'model/KaS': 1, 'seed': 2}) == {'model': {'KaS': 1}, 'seed': 2}
+
+def test_adaptive_beats_uniform():
+    space = adaptive_sampler.ParamSpace(SPACE)
+    sampler = adaptive_sampler.AdaptiveSampler(space, ['amp'], target={'amp': (0.5, 1.0)}, seed=1)
+    sampler.run(peak, num_init=20, batch=10, num_batches=4)
+    assert len(sampler.U) == 60
+    rng = np.random.RandomState(1)
+    uniform = [peak(adaptive_sampler.nested(space.from_unit(u)))['amp'] for u in rng.uniform(size=(60, 2))]
+    assert np.sum(sampler.in_target()) >= 3*max(np.sum(np.array(uniform) >= 0.5), 1)
+
+def test_failed_simulations_are_skipped(tmp_path):
+    space = adaptive_sampler.ParamSpace(SPACE)
+    sampler = adaptive_sampler.AdaptiveSampler(space, ['amp'], seed=2)
+    sampler.run(failing, num_init=10, batch=5, num_batches=1)
+    assert np.any(np.isnan(sampler.Y)) and len(sampler.Y) == 15
+    sampler.save(str(tmp_path/'adaptive.npz'))
+    saved = np.load(str(tmp_path/'adaptive.npz'))
+    assert saved['values'].shape == (15, 2) and list(saved['batch']).count(1) == 5
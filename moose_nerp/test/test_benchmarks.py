@@ -0,0 +1,121 @@
+"""\
+Benchmarks of the hot paths: single neurons, clustered spines, networks of several
+sizes, plasticity and the anal/ pipelines.  Outputs (spike times, Vm traces,
+connection statistics) must match golden outputs in test/golden; a benchmark without
+golden output only records time and memory and is skipped.  Golden outputs of the
+simulations are made with moose on the version that is the reference (--update-golden);
+test_anal_pipelines.npz was made with the loop implementations that anal/sta_utils,
+bin_utils and synchrony replaced.
+
+    python -m pytest moose_nerp/test/test_benchmarks.py --benchmark --benchmark-dir bench
+    python -m pytest moose_nerp/test/test_benchmarks.py --update-golden  #after intended changes
+"""
+import numpy as np
+import pytest
+import benchmark_cases
+
+def run(bench, case, **kwargs):
+    pytest.importorskip('moose')
+    try:
+        result = benchmark_cases.run_in_process(case, kwargs, bench.profile_prefix)
+    except FileNotFoundError as e:
+        pytest.skip(str(e))
+    bench.check(result)
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("spines", [False, True])
+@pytest.mark.parametrize("calcium", [False, True])
+def test_single_neuron(bench, spines, calcium):
+    run(bench, 'single_neuron', modelname='cells.d1d2', spines=spines, calcium=calcium)
+
+@pytest.mark.benchmark
+def test_clustered_spines(bench):
+    run(bench, 'clustered_spines', modelname='D1PatchSample5')
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("grid_max", [50e-6, 100e-6, 200e-6])
+def test_spn1_net(bench, grid_max):
+    run(bench, 'network', netname='spn1_net', modelname='cells.spn_1comp',
+        neuron_modules=['cells.FSI01Aug2014'], grid_max=grid_max)
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("grid_max", [50e-6, 100e-6])
+def test_str_net(bench, grid_max):
+    run(bench, 'network', netname='str_net', modelname='D1MatrixSample2',
+        neuron_modules=[], grid_max=grid_max)
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("hsolve", [False, True])
+def test_str_net_solver(bench, hsolve):
+    #run time of multi-compartment network with one HSolve per neuron vs exponential Euler
+    run(bench, 'network', netname='str_net', modelname='D1MatrixSample2',
+        neuron_modules=[], grid_max=100e-6, hsolve=hsolve)
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("synchans", ['lazy', 'prune'])
+def test_str_net_synchans(bench, synchans):
+    #objects and run time with synchans only where synapses land, compare wall_sec with test_str_net_solver[True]
+    run(bench, 'network', netname='str_net', modelname='D1MatrixSample2',
+        neuron_modules=[], grid_max=100e-6, synchans=synchans)
+
+@pytest.mark.benchmark
+def test_multirate_clocks(bench):
+    #single compartment neurons, time tables and spike generators at 5x simdt,
+    #validated against the uniform dt run instead of golden outputs
+    pytest.importorskip('moose')
+    kwargs = dict(netname='spn1_net', modelname='cells.spn_1comp', neuron_modules=['cells.FSI01Aug2014'],
+                  grid_max=100e-6, simtime=0.5)
+    multirate = {'D1':5e-5, 'D2':5e-5, 'TimeTable':5e-5, 'SpikeGen':5e-5}
+    try:
+        uniform = benchmark_cases.run_in_process('network', kwargs)
+        fast = benchmark_cases.run_in_process('network', dict(kwargs, clock_dt=multirate))
+    except FileNotFoundError as e:
+        pytest.skip(str(e))
+    bench.record(uniform, bench.name+'_uniform')
+    bench.record(fast)
+    for key, counts in uniform['outputs'].items():
+        if '/nspikes/' in key:
+            rate, fast_rate = np.mean(counts), np.mean(fast['outputs'][key])
+            assert abs(fast_rate-rate) <= max(0.1*rate, 1), '{}: {} spikes per cell, uniform dt {}'.format(key, fast_rate, rate)
+    assert fast['wall_sec'] < uniform['wall_sec']
+
+@pytest.mark.benchmark
+def test_bg_net(bench):
+    run(bench, 'bg_net')
+
+@pytest.mark.benchmark
+def test_bg_net_partitioned(bench, monkeypatch):
+    #bg_net divided among 1 and 2 processes exchanging spikes; firing rates of each population
+    #must agree (partition processes cannot run in the pool of run_in_process)
+    pytest.importorskip('moose')
+    from moose_nerp.prototypes import partition
+    from moose_nerp.bg_net import multisim
+    monkeypatch.chdir(benchmark_cases.PACKAGE_DIR)
+    simtime = 0.2
+    trial = (False, '20', '28', 0, 0, 3, 4, '11', simtime, 0)
+    try:
+        report, results = partition.scaling(multisim.build_network, (trial,), partitions=(1, 2),
+                                            simtime=simtime, seed=benchmark_cases.SEED)
+    except RuntimeError as e:
+        if 'FileNotFoundError' in str(e):
+            pytest.skip(str(e))
+        raise
+    for n, res in report.items():
+        bench.record({'wall_sec': res['run_sec'], 'peak_rss_MB': np.nan}, '{}_{}'.format(bench.name, n))
+    for ntype, stats in partition.compare(results[1], results[2], simtime).items():
+        assert abs(stats['partitioned_rate']-stats['rate']) <= max(0.1*stats['rate'], 1/simtime), \
+            '{}: {} Hz partitioned, {} Hz single process'.format(ntype, stats['partitioned_rate'], stats['rate'])
+
+@pytest.mark.benchmark
+def test_plasticity(bench):
+    run(bench, 'network', netname='str_net', modelname='D1PatchSample5',
+        neuron_modules=[], single=True, plasticity=True, simtime=0.3)
+
+@pytest.mark.benchmark
+def test_anal_pipelines(bench):
+    import time
+    from moose_nerp.prototypes import profiling
+    start = time.perf_counter()
+    outputs = benchmark_cases.anal_pipelines()
+    bench.check({'outputs': outputs, 'wall_sec': time.perf_counter()-start,
+                 'peak_rss_MB': profiling.peak_rss_MB()})
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from moose_nerp.prototypes import chan_clamp, gate_tables
+
+@pytest.fixture(scope='module')
+def model():
+    return gate_tables.load_channel_params('d1opt')
+
+def test_traces_match_integration(model):
+    #exact exponential relaxation within steps equals forward Euler with a small time step
+    kin = chan_clamp.ChannelKinetics(model, 'KaS', 50e-6)
+    protocol = chan_clamp.activation(steps=[-40e-3, 0, 20e-3], dur=0.05)
+    dt = 1e-4
+    t, V, opened = kin.open_fraction(protocol, dt)
+    fine = 1e-6
+    _, Vfine = chan_clamp.waveforms(protocol, fine)
+    states = [kin.rates(gate, Vfine[:, 0])[0] for gate in kin.gates]
+    result = np.ones(Vfine.shape)
+    for g, gate in enumerate(kin.gates):
+        x = np.empty(Vfine.shape)
+        inf, tau = kin.rates(gate, Vfine)
+        for i in range(Vfine.shape[1]):
+            states[g] = states[g]+fine*(inf[:, i]-states[g])/tau[:, i]
+            x[:, i] = states[g]
+        result *= x**gate[1]
+    np.testing.assert_allclose(opened, result[:, int(dt/fine)-1::int(dt/fine)], rtol=1e-2, atol=1e-4)
+
+def test_all_channels_at_once(model):
+    curves = chan_clamp.characterize(model, dt=2e-4)
+    assert set(curves) == set(model.Channels)
+    v, g = curves['NaF']['activation']
+    assert np.nanargmax(g) > np.argmin(np.abs(v+0.06))
+    #sodium current is inward, potassium outward at 0 mV
+    assert np.interp(0, *curves['NaF']['iv']) < 0 < np.interp(0, *curves['KaF']['iv'])
+    pre, h = curves['NaF']['inactivation']
+    assert h[0] > 0.9 and h[-1] < 0.1
+    assert -0.07 < chan_clamp.half_activation(pre, h) < -0.03
+    assert set(curves['KaS']['tau']) == {'X', 'Y'}
+    assert 'Erev' not in chan_clamp.report(curves)
+
+def test_calcium_dependent_channels(model):
+    low = chan_clamp.characterize(model, ca=50e-6, channels=['SKCa', 'BKCa'], dt=5e-4)
+    high = chan_clamp.characterize(model, ca=5e-3, channels=['SKCa', 'BKCa'], dt=5e-4)
+    for chan in ('SKCa', 'BKCa'):
+        assert np.interp(0, *high[chan]['iv']) > np.interp(0, *low[chan]['iv'])
@@ -0,0 +1,16 @@
+from moose_nerp.prototypes import connect
+
+def test_stimulated_synapses():
+    #connect_list as made by connect_neurons: time table connections {postbranch: time table},
+    #neuron connections precell_to_postbranch, postbranch of spine heads is dendrite/head
+    connections = {'/D1_net/D1_0': {'postsoma_loc': (0, 0, 0),
+                                    'ampa': {'extern1': {'secdend11/1head': '/input/CtxSPN_TimTab3', 'soma': '/input/CtxSPN_TimTab8'},
+                                             '/D1_net/D1_1_to_tertdend2/0head': {'presoma_loc': (1, 0, 0), 'dist': 1.0}},
+                                    'gaba': {'/FSI_net/FSI_0_to_soma': {'presoma_loc': (2, 0, 0), 'dist': 2.0}}},
+                   '/D1_net/D1_1': {'postsoma_loc': (1, 0, 0), 'gaba': {}}}
+    stimulated = connect.stimulated_synapses(connections, 'ampa')
+    assert stimulated == {'/D1_net/D1_0': {'secdend11/1head', 'soma', 'tertdend2/0head'}, '/D1_net/D1_1': set()}
+    assert connect.stimulated_synapses(connections, 'gaba')['/D1_net/D1_0'] == {'soma'}
+    #connect_list of timetable_input (single neurons)
+    single = {'/D1': {'ampa': {'extern1': {'primdend1': '/input/CtxSPN_TimTab0', 'secdend3/0head': '/input/CtxSPN_TimTab1'}}}}
+    assert connect.stimulated_synapses(single, 'ampa') == {'/D1': {'primdend1', 'secdend3/0head'}}
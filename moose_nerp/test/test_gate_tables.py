@@ -0,0 +1,24 @@
+import numpy as np
+from moose_nerp.prototypes import gate_tables, chan_proto
+
+def test_candidate_divs():
+    assert gate_tables.candidate_divs(3401) == [54, 107, 213, 426, 851, 1701, 3401]
+
+def test_sigmoid_tables_match_chan_proto():
+    model = gate_tables.load_channel_params('D1PatchSample5')
+    params = model.Channels.NaF.X
+    v = np.linspace(model.VMIN, model.VMAX, model.VDIVS)
+    A, B = gate_tables.voltage_gate_tables(params, v)
+    refA, refB = chan_proto.sigmoid_gate_tables(params, v)
+    assert np.allclose(A, refA) and np.allclose(B, refB)
+    #smooth gate: error falls with table size
+    errors = [gate_tables.gate_error('V', params, d, model.VMIN, model.VMAX, model.VDIVS) for d in (107, 851, 3401)]
+    assert errors[0] > errors[1] > errors[2]
+
+def test_scan_within_budget():
+    model = gate_tables.load_channel_params('ep')
+    result = gate_tables.scan(model, budget=1e-2)
+    vdivs, cadivs = result['recommended']
+    assert vdivs <= model.VDIVS and cadivs <= model.CADIVS
+    assert result['vdivs_error'][vdivs] <= 1e-2 and result['cadivs_error'][cadivs] <= 1e-2
+    assert result['recommended_memory']['library_bytes'] <= result['current_memory']['library_bytes']
@@ -0,0 +1,50 @@
+import numpy as np
+from moose_nerp.prototypes import impedance
+
+RM, CM = 1e9, 1e-11
+
+def chain(n, ra=1e7):
+    return impedance.Cable(['/cell/c{}'.format(i) for i in range(n)], np.full(n, 1/RM), np.full(n, CM),
+                           np.arange(n)-1, np.full(n, ra))
+
+def test_single_compartment():
+    cable = chain(1)
+    freqs = np.array([0, 10, 100])
+    np.testing.assert_allclose(cable.input_impedance(freqs), RM/(1+2j*np.pi*freqs*RM*CM))
+    np.testing.assert_allclose(cable.time_constants(), [RM*CM])
+    np.testing.assert_allclose(cable.scaled(RM=2).input_resistance(), 2*RM)
+
+def test_branched_cable_matches_dense_solve():
+    #soma with two branches of 3 compartments
+    parent = [-1, 0, 1, 2, 0, 4, 5]
+    n = len(parent)
+    rng = np.random.RandomState(0)
+    cable = impedance.Cable(range(n), rng.uniform(1e-10, 1e-9, n), rng.uniform(1e-12, 1e-11, n),
+                            parent, rng.uniform(1e6, 1e8, n))
+    f = 20.
+    Y = np.diag(cable.gm+2j*np.pi*f*cable.cm)
+    for i, p in enumerate(parent):
+        if p >= 0:
+            g = 1/cable.ra[i]
+            Y[[i, p], [i, p]] += g
+            Y[i, p] -= g
+            Y[p, i] -= g
+    Z = cable.impedance([0, f])
+    np.testing.assert_allclose(Z[1], np.linalg.inv(Y))
+    #reciprocity and attenuation of transfer from the tip of a branch to the soma
+    np.testing.assert_allclose(Z[:, 3, 0], Z[:, 0, 3])
+    assert abs(cable.transfer_impedance(f, 3)[0]) < abs(cable.input_impedance(f, 3)[0])
+    assert cable.root == 0
+
+def test_linearized_channels():
+    cable = chain(3)
+    assert cable.index('c2') == 2
+    cable.chan_comp, cable.chan_name, cable.chan_g = np.array([0, 2]), ['Kir', 'KaS'], np.array([1e-9, 2e-9])
+    #a restoring gate gives resonance: impedance is low at low frequencies
+    cable.term_chan, cable.term_amp, cable.term_tau = np.array([1]), np.array([5e-9]), np.array([0.05])
+    rin = cable.input_resistance()
+    assert rin < chain(3).input_resistance()
+    freqs = np.linspace(0, 20, 81)
+    fres, zmax = cable.resonance(freqs)
+    assert fres > 0 and zmax > rin
+    assert cable.scaled(gbar={'KaS': 0}).resonance(freqs)[0] == 0
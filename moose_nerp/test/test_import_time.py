@@ -0,0 +1,78 @@
+"""\
+Modules imported by simulation workers must not load plotting or heavy analysis
+packages, and must import within a time budget (excluding moose itself).
+Each check runs in a fresh interpreter, so that modules already imported by
+pytest do not hide slow imports.
+"""
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['matplotlib', 'moose_nerp.graph', 'neo', 'elephant', 'quantities', 'pandas', 'seaborn']
+#seconds, excluding the time to import moose, numpy and scipy
+IMPORT_BUDGET = 1.0
+
+SCRIPT = '''
+import sys, time, json
+sys.path.insert(0, {anal!r})
+start = time.perf_counter()
+{baseline}
+base = time.perf_counter()
+{imports}
+end = time.perf_counter()
+print(json.dumps({{'time': end-base, 'modules': sorted(sys.modules)}}))
+'''
+
+def import_in_subprocess(modules, baseline=''):
+    imports = '\n'.join('import '+module for module in modules)
+    script = SCRIPT.format(anal=os.path.join(PACKAGE_DIR, 'anal'), baseline=baseline, imports=imports)
+    out = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(PACKAGE_DIR),
+                         stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def heavy_modules(loaded):
+    return [m for m in loaded if any(m == h or m.startswith(h+'.') for h in HEAVY)]
+
+def test_headless_anal_imports():
+    result = import_in_subprocess(['plas_sim_anal_utils', 'sta_utils', 'bin_utils',
+                                   'moose_nerp.prototypes.net_planner',
+                                   'moose_nerp.prototypes.profiling',
+                                   'moose_nerp.prototypes.result_store',
+                                   'moose_nerp.prototypes.result_cache',
+                                   'moose_nerp.prototypes.result_index',
+                                   'moose_nerp.prototypes.model_fit',
+                                   'moose_nerp.prototypes.impedance',
+                                   'moose_nerp.prototypes.chan_clamp',
+                                   'moose_nerp.prototypes.spike_trains',
+                                   'moose_nerp.prototypes.recording'],
+                                  baseline='import numpy, scipy.signal')
+    assert heavy_modules(result['modules']) == []
+    assert result['time'] < IMPORT_BUDGET
+
+def test_headless_simulation_imports():
+    pytest.importorskip('moose')
+    result = import_in_subprocess(['moose_nerp.prototypes.create_model_sim',
+                                   'moose_nerp.prototypes.create_network',
+                                   'moose_nerp.prototypes.net_output',
+                                   'moose_nerp.prototypes.net_sim_graph',
+                                   'moose_nerp.prototypes.multi_module'],
+                                  baseline='import moose')
+    assert heavy_modules(result['modules']) == []
+    assert result['time'] < IMPORT_BUDGET
+
+def test_headless_run_imports():
+    #runAll is called by sweep workers: a run without graphs must not import plotting modules
+    pytest.importorskip('moose')
+    run = """
+from moose_nerp.prototypes import create_model_sim
+from moose_nerp.cells import d1d2 as model
+model.synYN = model.plasYN = model.spineYN = model.calYN = False
+create_model_sim.setupOptions(model, simtime=0.01, plot_vm=False, plot_current=False, plot_channels=False,
+                              save=False, save_txt=False, stim_paradigm='inject')
+create_model_sim.setupAll(model)
+create_model_sim.runAll(model)"""
+    result = import_in_subprocess([], baseline='import moose'+run)
+    assert heavy_modules(result['modules']) == []
@@ -0,0 +1,24 @@
+import logging
+from moose_nerp.prototypes import logutil
+
+def test_logger_name():
+    assert logutil.Logger().logger.name == __name__
+
+def test_lazy_not_evaluated_when_disabled():
+    log = logutil.Logger('test_logutil.lazy')
+    log.logger.setLevel(logging.WARNING)
+    calls = []
+    log.debug('{}', logutil.lazy(lambda: calls.append(1)))
+    assert calls == []
+    assert str(logutil.Message('{:.1f} {}', (logutil.lazy(lambda: 2.25), 'x'))) == '2.2 x'
+
+def test_progress_rate_limited(caplog):
+    log = logutil.Logger('test_logutil.progress')
+    log.logger.setLevel(logging.INFO)
+    progress = logutil.ProgressReporter(log, 'loop', 1000, interval=60)
+    with caplog.at_level(logging.INFO, logger='test_logutil.progress'):
+        for i in range(1000):
+            progress.update()
+        progress.done()
+    assert len(caplog.records) == 1
+    assert 'loop done: 1000/1000' in caplog.records[0].getMessage()
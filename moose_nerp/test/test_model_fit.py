@@ -0,0 +1,69 @@
+import numpy as np
+from moose_nerp.prototypes import model_fit
+
+FREE = [('Condset.D1.KaS.prox', 0, 500), ('Channels.KaS.X.vshift', -10e-3, 10e-3)]
+BEST = np.array([300, 2e-3])
+
+class Quadratic(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, values):
+        self.calls += 1
+        return np.sum(((values-BEST)/[100, 5e-3])**2), {'calls': self.calls}
+
+def make_fit():
+    target = model_fit.Target([1e-10], [{'spikes': 3}], delay=0.1, width=0.4)
+    return model_fit.Fit('d1opt', 'D1', FREE, target)
+
+def test_trace_features():
+    t = np.arange(0, 0.6, 1e-4)
+    vm = np.where(t < 0.1, -0.08, -0.06)
+    for spike in (0.15, 0.25, 0.35):
+        vm[(t >= spike) & (t < spike+1e-3)] = 0.02
+    feats = model_fit.trace_features(t, vm, delay=0.1, width=0.4)
+    assert feats['spikes'] == 3
+    np.testing.assert_allclose([feats['rest'], feats['steady'], feats['latency'], feats['isi']],
+                               [-0.08, 0.02, 0.05, 0.1], atol=2e-4)
+    target = model_fit.Target.from_traces([1e-10], t, [vm], 0.1, 0.4, features=['spikes', 'latency'])
+    err, _ = target.error(t, [np.full(len(t), -0.08)])
+    #no spikes: 3 spikes too few and missing latency
+    assert err == 9+model_fit.MISSING_ERROR
+
+def test_optimize_finds_minimum(monkeypatch):
+    fit = make_fit()
+    assert not fit.hsolve
+    monkeypatch.setattr(model_fit, '_evaluator', Quadratic())
+    result = model_fit.optimize(fit, popsize=12, generations=40, seed=0, map_func=map)
+    np.testing.assert_allclose([result['params'][p[0]] for p in FREE], BEST, rtol=0.05)
+    assert result['history'][-1][0] <= result['history'][0][0]
+
+def test_checkpoint_resume(monkeypatch, tmp_path):
+    fit = make_fit()
+    whole = Quadratic()
+    monkeypatch.setattr(model_fit, '_evaluator', whole)
+    expected = model_fit.optimize(fit, popsize=10, generations=6, seed=3, map_func=map)
+    checkpoint = str(tmp_path/'fit.pkl')
+    first = Quadratic()
+    monkeypatch.setattr(model_fit, '_evaluator', first)
+    model_fit.optimize(fit, popsize=10, generations=3, seed=3, checkpoint=checkpoint, map_func=map)
+    second = Quadratic()
+    monkeypatch.setattr(model_fit, '_evaluator', second)
+    resumed = model_fit.optimize(fit, popsize=10, generations=6, seed=3, checkpoint=checkpoint, map_func=map)
+    assert resumed['fitness'] == expected['fitness'] and resumed['params'] == expected['params']
+    #the initial population and first 3 generations are not simulated again
+    assert first.calls+second.calls == whole.calls
+
+class Chan(object):
+    def __init__(self, Gbar):
+        self.Gbar = Gbar
+
+def test_update_scales_from_built_gbar():
+    fit = model_fit.Fit('d1opt', 'D1', FREE[:1], make_fit().target)
+    evaluator = model_fit.Evaluator.__new__(model_fit.Evaluator)
+    evaluator.fit = fit
+    chans = [Chan(1e-9), Chan(3e-9)]
+    evaluator.gbar = {'Condset.D1.KaS.prox': (100, [(c, c.Gbar) for c in chans])}
+    for value in (0, 250):
+        evaluator.update([value])
+    np.testing.assert_allclose([c.Gbar for c in chans], [2.5e-9, 7.5e-9])
@@ -0,0 +1,84 @@
+import collections
+import types
+import numpy as np
+from moose_nerp.prototypes import connect, net_planner, spike_trains
+
+Tables = collections.namedtuple('Tables', 'tablename filename syn_per_tt')
+
+def network(postsyn_fraction):
+    rng = np.random.RandomState(0)
+    dist = rng.uniform(0, 300e-6, 400)
+    slots = rng.randint(1, 4, 400)
+    summaries = {'D1': {'synchans': {'ampa': {'dist': dist, 'slots': slots.astype(float)}},
+                        'objects': {'Compartment': 200, 'SynChan': 800, 'SimpleSynHandler': 800},
+                        'messages': 3000}}
+    ctx = connect.ext_connect(synapse='ampa', pre=Tables('Ctx', 'ctx', 2), post='D1',
+                              dend_loc=connect.dend_location(mindist=0, maxdist=200e-6, postsyn_fraction=postsyn_fraction))
+    grid = {0: {'xyzmin': 0, 'xyzmax': 100e-6, 'inc': 25e-6}, 1: {'xyzmin': 0, 'xyzmax': 100e-6, 'inc': 25e-6},
+            2: {'xyzmin': 0, 'xyzmax': 0, 'inc': 0}}
+    netparams = types.SimpleNamespace(grid=grid, pop_dict={'D1': types.SimpleNamespace(percent=1.0)},
+                                      connect_dict={'D1': {'ampa': {'extern1': ctx}}})
+    return netparams, summaries, dist, slots
+
+def test_occupied_synchans():
+    netparams, summaries, dist, slots = network(0.1)
+    plan = net_planner.plan_network(netparams, summaries, check_files=False, partners={'ampa': 'nmda'})
+    #connect.connect_timetable: synapses chosen without replacement among slots in range
+    rng = np.random.RandomState(1)
+    chan = np.repeat(np.arange(len(slots)), slots)
+    prob = np.repeat(np.where(dist <= 200e-6, 0.1, 0), slots)
+    num = int(np.round(prob.sum()))
+    occupied = [len(np.unique(rng.choice(chan, num, replace=False, p=prob/prob.sum()))) for _ in range(200)]
+    assert abs(plan['synchans']['D1']['ampa']-np.mean(occupied)) < 0.03*np.mean(occupied)
+    assert plan['synchans']['D1']['nmda'] == plan['synchans']['D1']['ampa']
+
+def test_lazy_resources():
+    netparams, summaries, dist, slots = network(0.1)
+    full = net_planner.plan_network(netparams, summaries, 0.1, 1e-5, check_files=False)
+    lazy = net_planner.plan_network(netparams, summaries, 0.1, 1e-5, check_files=False, lazy=True, partners={'ampa': 'nmda'})
+    cells = full['neurons']['D1']
+    assert full['objects']['SynChan'] == 800*cells
+    np.testing.assert_allclose(lazy['objects']['SynChan'], 2*lazy['synchans']['D1']['ampa']*cells)
+    assert lazy['objects']['Compartment'] == full['objects']['Compartment']
+    savings = net_planner.synchan_savings(netparams, summaries, 0.1, 1e-5, partners={'ampa': 'nmda'})
+    assert savings['SynChan'] == (full['objects']['SynChan'], lazy['objects']['SynChan'])
+    assert savings['runtime'][1] < savings['runtime'][0] and savings['memory'][1] < savings['memory'][0]
+
+def test_feasible_problems(tmp_path):
+    netparams, summaries, dist, slots = network(1.0)
+    tables = Tables('Ctx', str(tmp_path/'ctx'), 2)
+    netparams.connect_dict['D1']['ampa']['extern1'].pre = tables
+    netparams.connect_dict['D1']['gaba'] = {'D1': connect.connect(synapse='gaba', pre='D1', post='D1', probability=0.5)}
+    ok, problems = net_planner.feasible(netparams, summaries)
+    assert not ok
+    assert 'no slot summary for D1/gaba' in problems
+    assert 'time table file {}.npz not found'.format(tables.filename) in problems
+    spike_trains.save(tables.filename, [np.array([0.1, 0.2])]*3)
+    ok, problems = net_planner.feasible(netparams, summaries, max_memory=1)
+    assert any(problem.startswith('Ctx: ') and 'trains needed, 3 in' in problem for problem in problems)
+    assert any(problem.startswith('memory ') for problem in problems)
+
+def test_combined_network():
+    grid = lambda start, num: {0: {'xyzmin': start, 'xyzmax': start+num*10, 'inc': 10},
+                               1: {'xyzmin': 0, 'xyzmax': num*10, 'inc': 10},
+                               2: {'xyzmin': 0, 'xyzmax': 0, 'inc': 0}}
+    ctx = Tables('Ctx', 'ctx', 2)
+    stn = Tables('STN', 'stn', 2)
+    extern = connect.ext_connect(synapse='ampa', pre=ctx, post='B')
+    net_a = types.SimpleNamespace(grid=grid(0, 4), pop_dict={'A': types.SimpleNamespace(percent=1.0)}, single=True,
+                                  connect_dict={'A': {'ampa': {'extern': connect.ext_connect(synapse='ampa', pre=ctx, post='A')}}})
+    net_b = types.SimpleNamespace(grid=grid(1000, 2), pop_dict={'B': types.SimpleNamespace(percent=1.0)}, single=True,
+                                  connect_dict={'B': {'ampa': {'extern': extern, 'extern1': extern}}})
+    gaba = connect.connect(synapse='gaba', pre='A', post='B', probability=0.5)
+    param_net = types.SimpleNamespace(merge_connect=True, connect_dict={'B': {'gaba': {'A': gaba}}},
+                                      change_weight={'B': {'gaba': {'A': ('weight', 2)}}}, change_prob={},
+                                      connect_delete={'B': {'ampa': ['extern']}}, ttable_replace={'A': {'ampa': {'extern': stn}}})
+    netparams = net_planner.combined_network(param_net, [net_a, net_b])
+    assert set(netparams.connect_dict['B']['ampa']) == {'extern1'}
+    assert netparams.connect_dict['B']['gaba']['A'].weight == 2 and gaba.weight == 1
+    assert netparams.connect_dict['A']['ampa']['extern'].pre is stn
+    assert param_net.connect_dict == {'B': {'gaba': {'A': gaba}}} and set(net_b.connect_dict['B']['ampa']) == {'extern', 'extern1'}
+    counts, positions, fraction = net_planner.populations(netparams)
+    assert counts == {'A': 16, 'B': 4}
+    #pre-synaptic cells of the other network, none at the same position
+    assert net_planner.expected_presyn(gaba, positions['B'], fraction['A'], positions['A']) == 8
@@ -0,0 +1,81 @@
+import queue
+import types
+import threading
+import importlib
+import numpy as np
+import pytest
+from moose_nerp.prototypes import partition
+from moose_nerp.prototypes.connect import SynapseRecord
+
+POP = {'D1': ['/D1_net/D1_0', '/D1_net/D1_1', '/D1_net/D1_2'], 'FSI': ['/FSI_net/FSI_0']}
+
+def test_assign_partitions_balances_cost():
+    cost = {'/D1_net/D1_0': 10, '/D1_net/D1_1': 10, '/D1_net/D1_2': 10, '/FSI_net/FSI_0': 30}
+    owner = partition.assign_partitions(POP, 2, cost)
+    load = [sum(cost[n] for n, r in owner.items() if r == rank) for rank in (0, 1)]
+    assert load == [30, 30]
+    assert owner == partition.assign_partitions(POP, 2, cost)
+
+def test_partition_proxies_and_exports():
+    owner = {'/D1_net/D1_0': 0, '/D1_net/D1_1': 1, '/D1_net/D1_2': 1, '/FSI_net/FSI_0': 0}
+    records = [SynapseRecord('/FSI_net/FSI_0/soma/spikegen', '/D1_net/D1_1/soma/gaba/SH', 0, 2e-3, False),
+               SynapseRecord('/D1_net/D1_2/soma/spikegen', '/D1_net/D1_0/soma/gaba/SH', 0, 1e-3, True),
+               SynapseRecord('/input/ctx_TimTab3', '/D1_net/D1_0/soma/ampa/SH', 0, 0, False),
+               SynapseRecord('/input/ctx_TimTab4', '/D1_net/D1_1/soma/ampa/SH', 0, 0, False)]
+    part = partition.Partition(0, owner, records, 1e-3)
+    assert set(part.proxy_records) == {'/D1_net/D1_2'}
+    assert part.exports == {'/FSI_net/FSI_0': {1}}
+    assert part.used_inputs == {'/input/ctx_TimTab3'}
+    with pytest.raises(ValueError):
+        partition.Partition(0, owner, records, 1.5e-3)
+
+def test_epoch_length():
+    records = [SynapseRecord('/FSI_net/FSI_0/soma/spikegen', '/D1_net/D1_1/soma/gaba/SH', 0, 2e-3, False),
+               SynapseRecord('/D1_net/D1_2/soma/spikegen', '/D1_net/D1_0/soma/gaba/SH', 0, 1.5e-3, True),
+               SynapseRecord('/input/ctx_TimTab3', '/D1_net/D1_0/soma/ampa/SH', 0, 0, False)]
+    neurons = [neur for neurs in POP.values() for neur in neurs]
+    #time tables do not take part in the exchange
+    assert partition.epoch_length(records, neurons, types.SimpleNamespace(mindelay={})) == 1.5e-3
+    assert partition.epoch_length(records[2:], neurons, types.SimpleNamespace(mindelay={'D1': 1e-3, 'D2': None})) == 1e-3
+    assert partition.epoch_length(records[2:], neurons, types.SimpleNamespace(mindelay={})) == np.inf
+    records[1].delay = 0
+    with pytest.raises(ValueError):
+        partition.epoch_length(records, neurons)
+
+def test_epoch_length_bg_net():
+    #parameters of bg_net import syn_proto, which needs moose
+    pytest.importorskip('moose')
+    from moose_nerp import bg_net
+    from moose_nerp.bg_net import multisim
+    from moose_nerp.prototypes import connect
+    #create_network merges the mindelay of the networks of bg_net into bg_net.mindelay, which is empty
+    mindelay = dict(bg_net.mindelay)
+    for name in multisim.NET_MODULES:
+        mindelay = connect.merge(mindelay, dict(importlib.import_module(name).mindelay))
+    assert partition.epoch_length([], [], types.SimpleNamespace(mindelay=mindelay)) == 1e-3
+
+def test_queue_exchange_out_of_order():
+    inboxes = [queue.Queue() for _ in range(3)]
+    exchanges = [partition.QueueExchange(rank, inboxes) for rank in range(3)]
+    received = {}
+    def worker(rank):
+        received[rank] = [exchanges[rank].exchange(epoch, {r: {'n{}'.format(rank): [epoch]} for r in range(3)})
+                          for epoch in range(5)]
+    threads = [threading.Thread(target=worker, args=(rank,)) for rank in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for rank in range(3):
+        for epoch, spikes in enumerate(received[rank]):
+            assert spikes == {'n{}'.format(r): [epoch] for r in range(3) if r != rank}
+
+def test_run_requires_seed():
+    with pytest.raises(ValueError):
+        partition.run(None, (), num_partitions=2)
+
+def test_queue_exchange_abort():
+    inboxes = [queue.Queue() for _ in range(2)]
+    inboxes[0].put((partition.ABORT, 1, None))
+    with pytest.raises(RuntimeError):
+        partition.QueueExchange(0, inboxes).exchange(0, {1: {'n0': [0]}})
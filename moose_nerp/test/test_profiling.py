@@ -0,0 +1,19 @@
+import time
+from moose_nerp.prototypes import profiling
+
+class SlowCounts(profiling.Profile):
+    #counting takes time, as wildcardFind over a large network
+    def _counts(self):
+        time.sleep(0.05)
+        return {'SynChan': len(self.records)}
+
+def test_counting_excluded_from_wall_time(tmp_path):
+    profile = SlowCounts(str(tmp_path/'run'))
+    with profile.phase('outer'):
+        for _ in range(3):
+            with profile.phase('inner'):
+                pass
+    inner, outer = profile.records[0], profile.records[-1]
+    assert [record['phase'] for record in profile.records] == ['outer/inner']*3+['outer']
+    assert inner['wall_sec'] < 0.02 and outer['wall_sec'] < 0.02
+    assert outer['new_SynChan'] == 3 and inner['total_SynChan'] == 0
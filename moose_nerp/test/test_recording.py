@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from moose_nerp.prototypes import recording
+from moose_nerp.prototypes.recording import Record, Target
+
+def test_check_spec():
+    recording.check([Record('D1', ['spikes', 'Vm', 'NaF.Ik']), Record('D1', ['Gk', 'weight'], synapse='ampa')])
+    with pytest.raises(ValueError):
+        recording.check([Record('D1', ['Gk'])])
+    with pytest.raises(ValueError):
+        recording.check([Record('D1', ['Vmm'])])
+    with pytest.raises(ValueError):
+        recording.check([Record('D1', ['Vm'], neurons=2, fraction=0.5)])
+
+def test_sample():
+    np.random.seed(0)
+    cells = ['/net/D1_{}'.format(i) for i in range(40)]
+    assert recording.sample(cells) == cells
+    some = recording.sample(cells, fraction=0.25)
+    assert len(some) == 10 and len(set(some)) == 10 and some == sorted(some, key=cells.index)
+    assert len(recording.sample(cells, 3, fraction=0.25)) == 3
+    assert recording.sample(cells[:2], 5) == cells[:2]
+
+def test_merge_targets():
+    selection = {'coarse': {'Vm': [Target('/net/D1_0[0]/soma[0]', 'getVm'), Target('/net/D1_1/soma', 'getVm')]},
+                 'fine': {'Vm': [Target('/net/D1_0/soma', 'getVm', dt=1e-4)],
+                          'weight': [Target('/net/D1_0/570_3/ampa/SH', 'getWeight', index=0, dt=1e-3)]},
+                 'finer': {'Vm': [Target('/net/D1_0/soma', 'getVm', dt=5e-5)]}}
+    merged = recording.merge(selection)
+    assert len(merged) == 3
+    assert merged[('/net/D1_0/soma', 'getVm', None)].dt == 5e-5
+    assert merged[('/net/D1_1/soma', 'getVm', None)].dt is None
+    names = set(recording._table_name(target) for target in merged.values())
+    assert names == {'net_D1_0_soma_Vm', 'net_D1_1_soma_Vm', 'net_D1_0_570_3_ampa_SH_0_Weight'}
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import numpy as np
+import pytest
+from moose_nerp.prototypes import result_cache, result_store
+
+CALLS = []
+
+def simulate(p, outdir=None):
+    CALLS.append(p)
+    if outdir is not None:
+        with open(os.path.join(outdir, 'out_{}.txt'.format(p)), 'w') as f:
+            f.write(str(p))
+    return {'vm': np.arange(2000)*p, 'p': p}
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    #model package with one parameter module and a time table input file
+    pkg = tmp_path/'cachepkg'
+    pkg.mkdir()
+    (pkg/'__init__.py').write_text('from . import param_net\n')
+    (pkg/'param_net.py').write_text('from moose_nerp.prototypes.ttables import TableSet\n'
+                                     'gbar = {"KaF": 1.0}\n'
+                                     'tt_Ctx = TableSet("CtxExtern", %r, 1)\n' % str(tmp_path/'ctx'))
+    np.savez(str(tmp_path/'ctx.npz'), np.arange(5))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import cachepkg
+    yield cachepkg
+    for name in ['cachepkg', 'cachepkg.param_net']:
+        sys.modules.pop(name, None)
+
+def test_key_depends_on_parameters_and_inputs(package, tmp_path):
+    key = result_cache.config_key(simulate, (1,), modules=['cachepkg'])
+    assert key == result_cache.config_key(simulate, (1,), modules=['cachepkg'])
+    assert key != result_cache.config_key(simulate, (2,), modules=['cachepkg'])
+    assert key != result_cache.config_key(simulate, (1,), modules=['cachepkg'], seed=3)
+    package.param_net.gbar['KaF'] = 2.0
+    changed = result_cache.config_key(simulate, (1,), modules=['cachepkg'])
+    assert changed != key
+    np.savez(str(tmp_path/'ctx.npz'), np.arange(6))
+    assert result_cache.config_key(simulate, (1,), modules=['cachepkg']) != changed
+
+def test_map_simulates_only_missing(package, tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path/'cache'))
+    del CALLS[:]
+    first = cache.map(map, simulate, [1, 2], modules=['cachepkg'])
+    assert CALLS == [1, 2]
+    assert isinstance(first[0]['vm'], result_store.ArrayHandle)
+    second = result_store.load(cache.map(map, simulate, [1, 2, 3], modules=['cachepkg']))
+    assert CALLS == [1, 2, 3]
+    assert [r['p'] for r in second] == [1, 2, 3]
+    np.testing.assert_array_equal(second[1]['vm'], np.arange(2000)*2)
+
+def test_output_files_restored(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path/'cache'))
+    outdir = str(tmp_path)
+    kwargs = {'outdir': outdir}
+    key = cache.key(simulate, (4,), kwargs)
+    cache.call(simulate)((key, (4,), kwargs, os.path.join(outdir, 'out_4*.txt')))
+    os.remove(os.path.join(outdir, 'out_4.txt'))
+    found, value = cache.lookup(key)
+    assert found and value['p'] == 4
+    with open(os.path.join(outdir, 'out_4.txt')) as f:
+        assert f.read() == '4'
+
+def test_evict_least_recently_used(tmp_path):
+    #each entry holds one 16 kB array
+    cache = result_cache.ResultCache(str(tmp_path/'cache'), max_MB=0.04)
+    keys = [cache.key(simulate, (p,)) for p in (1, 2, 3)]
+    for p, key in zip((1, 2, 3), keys):
+        cache.call(simulate)((key, (p,), {}, None))
+        time.sleep(0.05)
+    assert cache.lookup(keys[0])[0]
+    assert cache.evict() == [keys[1]]
+    assert cache.lookup(keys[0])[0] and cache.lookup(keys[2])[0]
+    assert not cache.lookup(keys[1])[0]
+
+def test_map_keeps_own_results(tmp_path):
+    #a sweep larger than max_MB: returned handles must still point to files
+    cache = result_cache.ResultCache(str(tmp_path/'cache'), max_MB=0.02)
+    old = cache.key(simulate, (9,))
+    cache.call(simulate)((old, (9,), {}, None))
+    results = result_store.load(cache.map(map, simulate, [1, 2, 3]))
+    assert [result['vm'][1] for result in results] == [1, 2, 3]
+    assert not cache.lookup(old)[0]
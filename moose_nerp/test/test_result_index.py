@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+from moose_nerp.prototypes import result_index, result_store
+
+@pytest.fixture
+def index(tmp_path):
+    index = result_index.ResultIndex(str(tmp_path/'index.sqlite'))
+    for trial in range(6):
+        for freq in ('10', '20'):
+            results = {'vm': {'D1': [np.full(2000, trial, dtype=float)]}, 'spikes': np.arange(3)}
+            stored = result_store.store(results, str(tmp_path/'arrays'), 'f{}_t{}'.format(freq, trial))
+            index.add_results('bg_net', {'ctxfreq': freq, 'trial': trial, 'model': 'spn_1comp'}, stored,
+                              metrics={'rate/D1': trial*float(freq)})
+    yield index
+    index.close()
+
+def test_select_by_predicates(index):
+    runs = index.select('bg_net', ctxfreq='20', trial=('<', 3))
+    assert len(runs) == 3
+    assert list(runs.param('trial')) == [0, 1, 2]
+    np.testing.assert_array_equal(runs.metric('rate/D1'), [0, 20, 40])
+    assert len(index.select('bg_net', trial=[1, 4], model='spn_1comp')) == 4
+    assert len(index.select('bg_net', trial=[])) == 0
+    assert len(index.select('ep')) == 0
+    with pytest.raises(ValueError):
+        index.select('bg_net', trial=('~', 3))
+
+def test_arrays_opened_on_access(index, tmp_path):
+    run = index.select('bg_net', ctxfreq='10', trial=5)[0]
+    path, fmt, shape, dtype = run.info('vm/D1/0')
+    assert (fmt, shape, dtype) == ('npy', (2000,), 'float64')
+    #arrays of other runs may be missing: they are never read
+    for other in index.select('bg_net', trial=('!=', 5)):
+        os.remove(other.info('vm/D1/0')[0])
+    vm = run['vm/D1/0']
+    assert isinstance(vm, np.memmap) and vm[0] == 5
+    np.testing.assert_array_equal(run['spikes'], np.arange(3))
+
+def test_add_files_parses_names(tmp_path):
+    names = ['param_set_1__upstate_plus_dispersed__dispersed_freq_375__D1PatchSample50Vm.txt',
+             'param_set_1__upstate_plus_dispersed__dispersed_freq_375__D1PatchSample50Ca.txt',
+             'param_set_2__rheobase_only__dispersed_freq_None__D1MatrixSample20.3Vm.txt']
+    for name in names:
+        np.savetxt(str(tmp_path/name), np.ones((10, 3)), header='time Vm')
+    index = result_index.ResultIndex(str(tmp_path/'index.sqlite'))
+    assert index.add_files('upstate', str(tmp_path/'param_set_*.txt'), result_index.parse_upstate_name) == 2
+    run = index.select('upstate', model='D1PatchSample5', freq_dispersed=375)[0]
+    assert run.params['inj'] == '0' and sorted(run.array_names()) == ['Ca', 'Vm']
+    assert run.info('Vm')[2] == (10, 3)
+    assert index.select('upstate', inj=0.3)[0]['Vm'].shape == (10, 3)
+    index.close()
+
+def test_add_run_again_replaces(index, tmp_path):
+    index.add_run('bg_net', {'ctxfreq': '20', 'trial': 2, 'model': 'spn_1comp'}, metrics={'rate/D1': 1.0})
+    runs = index.select('bg_net', ctxfreq='20', trial=2)
+    assert len(runs) == 1 and runs.metric('rate/D1')[0] == 1.0 and runs[0].array_names() == []
+    assert len(index.select('bg_net')) == 12
+
+def test_indexed_result_add_stored(tmp_path):
+    indexed = result_index.IndexedResult(None, str(tmp_path), str(tmp_path/'index.sqlite'), 'ep', ('freq', 'syn'),
+                                         lambda results: {'n': len(results[1])}, ('vm', 'spikes'))
+    params = [(20, 'str'), (40, 'str')]
+    stored = [result_store.store((np.zeros(2000), np.arange(f)), str(tmp_path/'cache'), str(f)) for f, _ in params]
+    for _ in range(2):
+        indexed.add(params, stored)
+    runs = result_index.ResultIndex(str(tmp_path/'index.sqlite')).select('ep', syn='str')
+    assert list(runs.param('freq')) == [20, 40] and list(runs.metric('n')) == [20, 40]
+    assert runs[1].info('vm')[1] == 'npy'
@@ -0,0 +1,21 @@
+import os
+import numpy as np
+from moose_nerp.prototypes import result_store
+
+def test_store_namedtuple(tmp_path):
+    from collections import namedtuple
+    P = namedtuple('P', 'a b')
+    stored = result_store.store(P(np.arange(5.), 1), str(tmp_path), 'nt', min_size=2)
+    assert isinstance(stored, P) and isinstance(stored.a, result_store.ArrayHandle)
+    loaded = result_store.load(stored)
+    assert isinstance(loaded, P) and loaded.b == 1
+    np.testing.assert_array_equal(loaded.a, np.arange(5.))
+
+def test_remove(tmp_path):
+    stored = result_store.store({'vm': np.arange(2000.), 'n': 3}, str(tmp_path), 'r')
+    paths = result_store.files(stored)
+    assert len(paths) == 1 and os.path.exists(paths[0])
+    result_store.remove(stored)
+    assert not os.path.exists(paths[0])
+    #already removed files are skipped
+    result_store.remove(stored)
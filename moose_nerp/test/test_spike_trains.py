@@ -0,0 +1,58 @@
+import numpy as np
+from moose_nerp.prototypes import spike_trains
+
+def counts(trains, binsize, simtime):
+    bins = np.arange(0, simtime+binsize/2, binsize)
+    return np.array([np.histogram(t, bins)[0] for t in trains])
+
+def mean_corr(c):
+    cc = np.corrcoef(c)
+    return np.mean(cc[np.triu_indices(len(cc), 1)])
+
+def test_oscillating_rate():
+    trains = spike_trains.poisson(2000, spike_trains.oscillation(10, 5, 0.8), simtime=2, seed=0)
+    assert abs(np.mean(trains.rates(2))-10) < 0.3
+    phase = np.mod(np.asarray(trains.times)*5, 1)
+    #rate is 18 Hz at phase 0.25 and 2 Hz at phase 0.75
+    peak, trough = np.sum(np.abs(phase-0.25) < 0.05), np.sum(np.abs(phase-0.75) < 0.05)
+    assert 6 < peak/trough < 12
+
+def test_correlation_within_and_between_groups():
+    groups = np.arange(200)//20
+    trains = spike_trains.poisson(200, 20, simtime=20, corr=0.3, corr_between=0.1, groups=groups, seed=1)
+    assert abs(np.mean(trains.rates(20))-20) < 1
+    c = counts(trains, 0.01, 20)
+    within = mean_corr(c[groups == 0])
+    between = mean_corr(c[::20])
+    assert abs(within-0.3) < 0.05 and abs(between-0.1) < 0.05
+    #trains of a pulse are Poisson: Fano factor 1
+    pulse = spike_trains.poisson(500, spike_trains.pulse(5, 50, 0.5, 0.2), simtime=1, seed=2)
+    n = np.diff(pulse.offsets)
+    assert abs(np.mean(n)-(5*0.8+50*0.2)) < 0.5 and abs(np.var(n)/np.mean(n)-1) < 0.2
+
+def test_lognormal_trains():
+    trains = spike_trains.lognormal(300, 30, simtime=10, cv=1.5, seed=3)
+    isi = np.concatenate([np.diff(t) for t in trains])
+    assert abs(np.mean(trains.rates(10))-30) < 1.5
+    assert abs(np.std(isi)/np.mean(isi)-1.5) < 0.15
+    varied = spike_trains.lognormal(300, 30, simtime=10, rate_cv=0.5, seed=3)
+    assert 0.4 < np.std(varied.rates(10))/30 < 0.6
+
+def test_store_and_shuffle(tmp_path):
+    trains = spike_trains.poisson(50, spike_trains.ramp(5, 40, 0.5, 1), simtime=3, seed=4)
+    fname = str(tmp_path/'Ctx50_ramp')
+    spike_trains.save(fname, trains)
+    loaded = spike_trains.load(fname)
+    assert isinstance(loaded.times, np.memmap) and len(loaded) == 50 == spike_trains.num_trains(fname)
+    np.testing.assert_array_equal(loaded[7], trains[7])
+    assert spike_trains.train_files(fname) == [fname+'.times.npy', fname+'.offsets.npy']
+    #pickled object arrays made elsewhere are read too
+    legacy = str(tmp_path/'legacy')
+    np.savez(legacy, spikeTime=np.array([np.array([0.1, 0.5]), np.array([0.2])], dtype=object))
+    assert [list(t) for t in spike_trains.load(legacy)] == [[0.1, 0.5], [0.2]]
+    assert spike_trains.num_trains(legacy) == 2
+    shuffled = spike_trains.shuffle_isis(loaded, maxtime=2, rng=np.random.RandomState(0))
+    for before, after in zip(loaded, shuffled):
+        before = before[before <= 2]
+        np.testing.assert_allclose(sorted(np.diff(after, prepend=0)), sorted(np.diff(before, prepend=0)))
+        assert len(after) == 0 or abs(after[-1]-before[-1]) < 1e-9